@@ -0,0 +1,309 @@
+"""End-to-end ingestion and QA benchmark against local stand-ins.
+
+    docker run -d -p 7687:7687 -e NEO4J_AUTH=neo4j/benchmark neo4j:5
+    NEO4J_URI=bolt://localhost:7687 NEO4J_USERNAME=neo4j NEO4J_PASSWORD=benchmark \
+        python -m benchmarks.end_to_end --pages 20
+    python -m benchmarks.end_to_end --pages 20 --compare benchmarks/results/<earlier>.json
+
+Runs the real pipeline components stage by stage (PDF parse, split,
+extract, write, embed, Cypher generation, query execution) and then the
+streaming pipeline end to end. Groq is replaced by `FakeGraphExtractor`
+(extraction) and `FakeChatModel` (Cypher and answers), and OpenAI by
+`DeterministicFakeEmbedding`, each with a fixed latency, so the numbers move
+only when our code or its dependencies do. Without a reachable Neo4j the
+graph stages are skipped. Results are written as JSON; `--compare` reports
+throughput and p50 changes against an earlier result and exits non-zero on
+a regression beyond `--tolerance`.
+
+The database is wiped before the run, so never point this at a real graph.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from importlib import metadata
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+from benchmarks.pdfs import clinical_pdf
+from biographrag import config
+from biographrag.chunking import make_splitter
+from biographrag.embeddings import EmbeddingStore, EntityEmbedder
+from biographrag.extraction import ChunkExtractor, RateLimiter
+from biographrag.fakes import FakeChatModel, FakeGraphExtractor
+from biographrag.ingest import DocumentHasher, IncrementalIngestor, chunk_document
+from biographrag.pipeline import StreamingIngestion, iter_chunk_texts
+from biographrag.schema import SchemaService, empty_schema, merge
+from biographrag.writer import batches
+
+QUESTIONS = [
+    "What medications does the patient take?",
+    "What diseases does the patient have?",
+    "What symptoms does the patient have?",
+    "Which doctor is treating the patient?",
+    "What tests did the patient undergo?",
+    "What procedures were performed?",
+    "Is the patient enrolled in any clinical trials?",
+    "Which drugs was the patient prescribed?",
+]
+PACKAGES = ["langchain", "langchain-core", "langchain-community", "langchain-experimental",
+            "neo4j", "pypdf"]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class Stage:
+    """Per-operation latencies plus wall time and item count for one stage."""
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.latencies = []
+        self.items = 0
+        self.wall = 0.0
+
+    def record(self, seconds, items=1):
+        self.latencies.append(seconds)
+        self.items += items
+
+    @contextmanager
+    def op(self, items=1):
+        started = time.perf_counter()
+        yield
+        self.record(time.perf_counter() - started, items)
+
+    @contextmanager
+    def wall_clock(self):
+        started = time.perf_counter()
+        yield
+        self.wall += time.perf_counter() - started
+
+    def summary(self):
+        wall = self.wall or sum(self.latencies)
+        return {
+            "unit": self.unit,
+            "ops": len(self.latencies),
+            "items": self.items,
+            "seconds": wall,
+            "throughput": self.items / wall if wall else 0.0,
+            **{f"p{int(q * 100)}_ms": percentile(self.latencies, q) * 1000 for q in (0.5, 0.9, 0.99)},
+            "max_ms": max(self.latencies, default=0.0) * 1000,
+        }
+
+
+class Timed:
+    """Wraps a transformer or embeddings model, recording each call into a stage."""
+
+    def __init__(self, inner, stage, method):
+        self.inner = inner
+        self.stage = stage
+        self.method = method
+
+    def __getattr__(self, name):
+        attribute = getattr(self.inner, name)
+        if name != self.method:
+            return attribute
+
+        def timed(items, *args, **kwargs):
+            with self.stage.op(len(items) if isinstance(items, list) else 1):
+                return attribute(items, *args, **kwargs)
+        return timed
+
+
+def connect_graph():
+    from langchain_community.graphs import Neo4jGraph
+
+    try:
+        graph = Neo4jGraph(url=os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+                           username=os.getenv("NEO4J_USERNAME", "neo4j"),
+                           password=os.getenv("NEO4J_PASSWORD", "benchmark"),
+                           refresh_schema=False)
+        graph.query("RETURN 1")
+        return graph
+    except Exception as e:
+        print(f"Neo4j unavailable, skipping graph stages: {e}", file=sys.stderr)
+        return None
+
+
+def run(args, workdir):
+    stages = {name: Stage(name, unit) for name, unit in [
+        ("parse", "pages"), ("split", "pages"), ("extract", "chunks"), ("write", "chunks"),
+        ("embed", "texts"), ("cypher_generation", "questions"), ("query", "queries"),
+        ("pipeline", "pages")]}
+    pdf = clinical_pdf(os.path.join(workdir, "benchmark.pdf"), args.pages, args.seed)
+    splitter = make_splitter(args.chunking)
+
+    pages = []
+    loader = iter(PyPDFLoader(pdf).lazy_load())
+    with stages["parse"].wall_clock():
+        while True:
+            started = time.perf_counter()
+            page = next(loader, None)
+            if page is None:
+                break
+            stages["parse"].record(time.perf_counter() - started)
+            pages.append(page)
+
+    hasher = DocumentHasher("benchmark")
+    documents = []
+    with stages["split"].wall_clock():
+        for page in pages:
+            with stages["split"].op():
+                texts = list(iter_chunk_texts([page], splitter))
+            for text, context in texts:
+                documents.append(chunk_document(text, hasher.chunk_id(text), "benchmark",
+                                                len(documents), "benchmark.pdf", context=context))
+
+    fake = FakeGraphExtractor(latency=args.llm_latency, jitter=0, seed=args.seed)
+    extractor = ChunkExtractor(Timed(fake, stages["extract"], "process_response"),
+                               concurrency=args.concurrency, limiter=RateLimiter(0, 0))
+    with stages["extract"].wall_clock():
+        graph_documents = extractor.run(documents)
+
+    graph = None if args.no_graph else connect_graph()
+    if graph is not None:
+        graph.query("MATCH (n) DETACH DELETE n")
+        ingestor = IncrementalIngestor(graph)
+        ingestor.ensure_indexes()
+        delta = empty_schema()
+        with stages["write"].wall_clock():
+            for batch in batches(graph_documents, config.STREAM_WRITE_EVERY):
+                with stages["write"].op(len(batch)):
+                    ingestor.write(batch, "benchmark")
+                merge(delta, ingestor.writer.schema_delta)
+
+        embeddings = Timed(DeterministicFakeEmbedding(size=args.dimensions), stages["embed"],
+                           "embed_documents")
+        store = EmbeddingStore(path=os.path.join(workdir, "embeddings.sqlite"), model="fake")
+        with stages["embed"].wall_clock():
+            EntityEmbedder(graph, embeddings, store=store).run()
+        store.close()
+
+        schema = SchemaService(graph).load()
+        schema.update(delta)
+        qa = cypher_chain(graph, schema, args.llm_latency)
+        with stages["cypher_generation"].wall_clock():
+            cyphers = []
+            for question in QUESTIONS * args.question_repeats:
+                with stages["cypher_generation"].op():
+                    cyphers.append(qa.generate_cypher(question))
+        with stages["query"].wall_clock():
+            for cypher in cyphers:
+                with stages["query"].op():
+                    graph.query(cypher)
+        qa.close()
+
+        ingestion = StreamingIngestion(
+            IncrementalIngestor(graph),
+            ChunkExtractor(FakeGraphExtractor(latency=args.llm_latency, jitter=0, seed=args.seed),
+                           concurrency=args.concurrency, limiter=RateLimiter(0, 0)),
+            splitter=make_splitter(args.chunking))
+        with stages["pipeline"].wall_clock(), stages["pipeline"].op(len(pages)):
+            ingestion.run(pdf, "benchmark-streaming", "benchmark-streaming.pdf")
+
+    return {name: stage.summary() for name, stage in stages.items() if stage.latencies}
+
+
+def cypher_chain(graph, schema, latency):
+    from langchain_community.chains.graph_qa.cypher import GraphCypherQAChain
+
+    from biographrag.qa import CypherCache, GraphQA
+
+    schema.apply(graph)
+    chain = GraphCypherQAChain.from_llm(llm=FakeChatModel(latency=latency), graph=graph,
+                                        allow_dangerous_requests=True, top_k=10)
+    # threshold=1 and a throwaway path: every question pays for generation
+    cache = CypherCache("benchmark", path=os.path.join(tempfile.mkdtemp(), "cypher.sqlite"),
+                        threshold=1)
+    return GraphQA(chain, cache, schema)
+
+
+def versions():
+    found = {"python": platform.python_version()}
+    for package in PACKAGES:
+        try:
+            found[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            pass
+    return found
+
+
+def compare(current, baseline, tolerance):
+    """Print per-stage changes; True if any stage regressed beyond `tolerance`."""
+    regressed = False
+    print(f"\n{'stage':<18} {'throughput':>12} {'change':>8} {'p50 ms':>9} {'change':>8}")
+    for name, stage in current["stages"].items():
+        old = baseline["stages"].get(name)
+        if old is None:
+            continue
+        throughput = stage["throughput"] / old["throughput"] - 1 if old["throughput"] else 0.0
+        p50 = stage["p50_ms"] / old["p50_ms"] - 1 if old["p50_ms"] else 0.0
+        flag = throughput < -tolerance or p50 > tolerance
+        regressed |= flag
+        print(f"{name:<18} {stage['throughput']:>12.1f} {throughput:>+8.0%} "
+              f"{stage['p50_ms']:>9.2f} {p50:>+8.0%}{'  REGRESSION' if flag else ''}")
+    if baseline.get("params") != current["params"]:
+        print(f"\nparameters differ: {baseline.get('params')} -> {current['params']}")
+    if baseline.get("versions") != current["versions"]:
+        print(f"\nversions changed: {baseline.get('versions')} -> {current['versions']}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunking", default=config.CHUNKING_MODE, choices=["recursive", "token_budget"])
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--concurrency", type=int, default=config.EXTRACTION_CONCURRENCY)
+    parser.add_argument("--dimensions", type=int, default=1536, help="fake embedding size")
+    parser.add_argument("--question-repeats", type=int, default=5)
+    parser.add_argument("--no-graph", action="store_true", help="skip the stages that need Neo4j")
+    parser.add_argument("--output", help="result file (default benchmarks/results/end_to_end-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative throughput drop / p50 increase")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        stages = run(args, workdir)
+    result = {
+        "benchmark": "end_to_end",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "tolerance")},
+        "versions": versions(),
+        "stages": stages,
+    }
+
+    print(f"{'stage':<18} {'unit':<10} {'items':>7} {'seconds':>9} {'per sec':>9} "
+          f"{'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+    for name, s in stages.items():
+        print(f"{name:<18} {s['unit']:<10} {s['items']:>7} {s['seconds']:>9.2f} {s['throughput']:>9.1f} "
+              f"{s['p50_ms']:>9.2f} {s['p90_ms']:>9.2f} {s['p99_ms']:>9.2f}")
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"end_to_end-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nsaved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(result, json.load(f), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
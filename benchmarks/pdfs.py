@@ -0,0 +1,49 @@
+"""Minimal PDF writer for benchmark fixtures (Helvetica text, no dependencies)."""
+import textwrap
+
+from benchmarks.chunking_benchmark import sample_pages
+
+
+def escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages):
+    """PDF bytes with one page per list of text lines."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for i, lines in enumerate(pages):
+        number = 4 + 2 * i
+        kids.append(f"{number} 0 R")
+        stream = ("BT /F1 10 Tf 40 800 Td 12 TL "
+                  + " ".join(f"({escape(line)}) '" for line in lines) + " ET").encode("latin-1")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {number + 1} 0 R >>".encode())
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def clinical_pdf(path, pages, seed=0):
+    """Write `pages` pages of the synthetic clinical notes to `path`."""
+    rendered = []
+    for page in sample_pages(pages, seed):
+        lines = []
+        for paragraph in page.page_content.split("\n"):
+            # Trailing spaces survive extraction, so lines rejoin into sentences
+            lines += [line + " " for line in textwrap.wrap(paragraph, 100)] or [""]
+        rendered.append(lines)
+    with open(path, "wb") as f:
+        f.write(make_pdf(rendered))
+    return path
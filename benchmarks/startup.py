@@ -0,0 +1,115 @@
+"""Streamlit app start-up and rerun latency.
+
+    python -m benchmarks.startup
+    git show <rev>:main.py > /tmp/main_before.py
+    python -m benchmarks.startup --app /tmp/main_before.py --compare benchmarks/results/<earlier>.json
+
+Measures the app script three ways, each in fresh interpreters where it
+matters:
+
+- import: `import main` in a new process (the cost before the first render);
+- cold_view: a new process running the page once under Streamlit's
+  `AppTest`, the first view after a server start;
+- rerun / interaction: further runs of that page in one process, plain and
+  after toggling a widget, what every click costs.
+
+The credentials are dummies and nothing is uploaded, so only the page shell
+is measured: no Neo4j, Groq or OpenAI connection is made (an app version
+that connects on page load will fail to and stop early). Results are saved
+as JSON; `--compare` prints the change against an earlier result.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.end_to_end import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DUMMY_ENV = {"OPENAI_API_KEY": "benchmark", "GROQ_API_KEY": "benchmark",
+             "NEO4J_URI": "bolt://localhost:1", "NEO4J_USERNAME": "neo4j", "NEO4J_PASSWORD": "benchmark"}
+
+VIEW = """
+import sys, time
+from streamlit.testing.v1 import AppTest
+started = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+print(time.perf_counter() - started)
+"""
+
+
+def child(code, *args):
+    """Seconds a fresh interpreter spends on `code` (it prints them) or, without output, in total."""
+    env = {**os.environ, **DUMMY_ENV, "PYTHONPATH": ROOT}
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", code, *args], env=env, cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout.strip()
+    return float(out.splitlines()[-1]) if out else time.perf_counter() - started
+
+
+def summary(seconds):
+    return {"runs": len(seconds), "p50_ms": 1000 * percentile(seconds, 0.5),
+            "p90_ms": 1000 * percentile(seconds, 0.9), "max_ms": 1000 * max(seconds)}
+
+
+def reruns(app_path, repeats):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ.update(DUMMY_ENV)
+    app = AppTest.from_file(app_path, default_timeout=120).run()
+    plain, interaction = [], []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        app.run()
+        plain.append(time.perf_counter() - started)
+        if app.checkbox:
+            started = time.perf_counter()
+            app.checkbox[0].set_value(not app.checkbox[0].value).run()
+            interaction.append(time.perf_counter() - started)
+    return plain, interaction
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=os.path.join(ROOT, "main.py"))
+    parser.add_argument("--cold-repeats", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", help="result file (default benchmarks/results/startup-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+    app_path = os.path.abspath(args.app)
+    module_dir, module = os.path.split(os.path.splitext(app_path)[0])
+
+    imports = [child(f"import sys; sys.path.insert(0, {module_dir!r}); import {module}")
+               for _ in range(args.cold_repeats)]
+    views = [child(VIEW, app_path) for _ in range(args.cold_repeats)]
+    plain, interaction = reruns(app_path, args.repeats)
+    stages = {"import": summary(imports), "cold_view": summary(views), "rerun": summary(plain)}
+    if interaction:
+        stages["interaction"] = summary(interaction)
+    result = {"benchmark": "startup", "app": os.path.relpath(app_path, ROOT),
+              "created": datetime.now().isoformat(timespec="seconds"), "stages": stages}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["stages"]
+    print(f"{'stage':<12} {'p50 ms':>9} {'p90 ms':>9} {'max ms':>9}" + (f" {'change':>8}" if baseline else ""))
+    for name, s in stages.items():
+        line = f"{name:<12} {s['p50_ms']:>9.1f} {s['p90_ms']:>9.1f} {s['max_ms']:>9.1f}"
+        if baseline and name in baseline and baseline[name]["p50_ms"]:
+            line += f" {s['p50_ms'] / baseline[name]['p50_ms'] - 1:>+8.0%}"
+        print(line)
+
+    output = args.output or os.path.join("benchmarks", "results", f"startup-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nsaved {output}")
+
+
+if __name__ == "__main__":
+    main()
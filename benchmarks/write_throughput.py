@@ -0,0 +1,76 @@
+"""Graph write throughput against a local Neo4j container.
+
+    docker run -d -p 7687:7687 -e NEO4J_AUTH=neo4j/benchmark \
+        -e NEO4J_PLUGINS='["apoc"]' neo4j:5
+    NEO4J_URI=bolt://localhost:7687 NEO4J_USERNAME=neo4j NEO4J_PASSWORD=benchmark \
+        python -m benchmarks.write_throughput --chunks 2000 --baseline
+
+The database is wiped before each run, so never point this at a real graph.
+"""
+import argparse
+import random
+import time
+
+from langchain_community.graphs import Neo4jGraph
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+from langchain_core.documents import Document
+
+from biographrag import config
+from biographrag.fakes import PATIENT_RELATIONS
+from biographrag.writer import BulkGraphWriter
+
+
+def synthetic_documents(chunks, entities_per_chunk, vocabulary, seed=0):
+    """Graph documents shaped like real extractions: one patient, a few linked entities."""
+    rng = random.Random(seed)
+    labels = list(PATIENT_RELATIONS)
+    documents = []
+    for i in range(chunks):
+        source = Document(page_content=f"synthetic chunk {i}", metadata={"id": f"chunk-{i}"})
+        patient = Node(id=f"Patient {rng.randrange(vocabulary // 10 or 1)}", type="Patient")
+        nodes = [patient]
+        relationships = []
+        for _ in range(entities_per_chunk):
+            label = rng.choice(labels)
+            node = Node(id=f"{label} {rng.randrange(vocabulary)}", type=label,
+                        properties={"value": str(rng.random())})
+            nodes.append(node)
+            relationships.append(Relationship(source=patient, target=node, type=PATIENT_RELATIONS[label]))
+        documents.append(GraphDocument(nodes=nodes, relationships=relationships, source=source))
+    return documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--entities-per-chunk", type=int, default=5)
+    parser.add_argument("--vocabulary", type=int, default=5000, help="distinct entity ids per label")
+    parser.add_argument("--batch-size", type=int, default=config.WRITE_BATCH_SIZE)
+    parser.add_argument("--baseline", action="store_true",
+                        help="also time Neo4jGraph.add_graph_documents (needs APOC)")
+    args = parser.parse_args()
+
+    graph = Neo4jGraph(refresh_schema=False)
+    documents = synthetic_documents(args.chunks, args.entities_per_chunk, args.vocabulary)
+
+    graph.query("MATCH (n) DETACH DELETE n")
+    writer = BulkGraphWriter(graph, batch_size=args.batch_size)
+    writer.ensure_constraints()
+    stats = writer.write(documents, doc_id="benchmark")
+    print(f"bulk writer: {stats['nodes']} node rows, {stats['relationships']} rel rows, "
+          f"{stats['batches']} batches in {stats['seconds']:.2f}s "
+          f"({stats['nodes_per_second']:.0f} nodes/s, {stats['relationships_per_second']:.0f} rels/s)")
+    slowest = sorted(writer.timings, key=lambda t: t["seconds"], reverse=True)[:5]
+    for timing in slowest:
+        print(f"  {timing['kind']:<13} {timing['key']:<40} {timing['rows']:>6} rows "
+              f"{timing['seconds'] * 1000:>8.1f} ms")
+
+    if args.baseline:
+        graph.query("MATCH (n) DETACH DELETE n")
+        started = time.perf_counter()
+        graph.add_graph_documents(documents, include_source=True)
+        print(f"add_graph_documents: {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
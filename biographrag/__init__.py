@@ -0,0 +1 @@
+"""BioGraphRAG ingestion and query pipeline used by the Streamlit app."""
@@ -0,0 +1,370 @@
+"""Local vector index over chunk and entity embeddings.
+
+`Neo4jVector` only covered entities and cost a round-trip to the database
+per search, and the chunk text stored as `Document` nodes was never searched.
+`VectorIndex` keeps unit vectors in one append-only file per embedding model,
+memory-mapped as float32, or float16 / int8 (with a per-row scale), so the OS
+pages in only what a scan touches; the keys live next to it in SQLite and are
+read from there only for the rows a search returns.
+
+- `search(queries, k)` scores a batch of queries at once, scanning the file
+  in blocks of `ANN_SCAN_BLOCK` rows, so resident memory does not grow with
+  the corpus;
+- from `ANN_IVF_MIN_ROWS` vectors on, `train()` clusters them (k-means, about
+  sqrt(n) lists) and a query only scans the `ANN_IVF_PROBES` lists whose
+  centroids are closest: a batch reads each probed list once and scores it
+  against just the queries that probe it;
+- a key embedded again gets a new row and its old row is masked out.
+
+Keys are `(kind, label, id)`: ("chunk", "Document", chunk id) or ("entity",
+label, node id), so hits map straight back to graph nodes. `GraphRetriever`
+turns hits into answer context: the matching chunks' text and the one-hop
+neighbourhood of the matched entities and of the entities those chunks
+mention. Ingestion workers append under SQLite's write lock; readers pick up
+new rows on their next search.
+"""
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+
+from biographrag import config, tracing
+from biographrag.writer import BASE_ENTITY_LABEL
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+PASSAGE_QUERY = """
+MATCH (d:Document) WHERE d.id IN $chunks
+RETURN d.id AS id, d.text AS passage
+"""
+
+# Seed entities are found through the `__Entity__(id)` index (see BulkGraphWriter.ensure_constraints)
+NEIGHBOURHOOD_QUERY = """
+CALL {{
+    UNWIND $entities AS seed
+    MATCH (n:`{base}` {{id: seed.id}})
+    WHERE seed.label IN labels(n)
+    RETURN n
+    UNION
+    UNWIND $chunks AS chunk
+    MATCH (:Document {{id: chunk}})-[:MENTIONS]->(n)
+    RETURN n
+}}
+OPTIONAL MATCH (n)-[r]-(m:`{base}`)
+WITH n, r, m LIMIT $limit
+RETURN DISTINCT CASE
+    WHEN r IS NULL THEN [l IN labels(n) WHERE l <> '{base}'][0] + ': ' + n.id
+    WHEN startNode(r) = n THEN n.id + ' ' + type(r) + ' ' + m.id
+    ELSE m.id + ' ' + type(r) + ' ' + n.id
+END AS fact
+"""
+
+
+def unit_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize(vectors, dtype):
+    """(stored rows, per-row scales) of float32 unit `vectors`."""
+    if dtype != "int8":
+        return vectors.astype(DTYPES[dtype]), np.ones(len(vectors), np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+class VectorIndex:
+    """Memory-mapped vectors of one embedding model, keyed by `(kind, label, id)`."""
+
+    def __init__(self, model="", directory=None, dtype=None, block=None,
+                 ivf_min_rows=None, probes=None):
+        self.dtype = dtype or config.ANN_DTYPE
+        if self.dtype not in DTYPES:
+            raise ValueError(f"ANN_DTYPE must be one of {', '.join(DTYPES)}, not {self.dtype!r}")
+        self.block = block or config.ANN_SCAN_BLOCK
+        self.ivf_min_rows = config.ANN_IVF_MIN_ROWS if ivf_min_rows is None else ivf_min_rows
+        self.probes = probes or config.ANN_IVF_PROBES
+        directory = directory or config.ANN_DIR
+        os.makedirs(directory, exist_ok=True)
+        name = re.sub(r"[^\w.-]+", "_", model or "default")
+        stem = os.path.join(directory, f"{name}.{self.dtype}")
+        self.vectors_path = stem + ".vectors"
+        self.centroids_path = stem + ".centroids.npy"
+        self.lock = threading.Lock()
+        # Autocommit, so writers can take SQLite's write lock with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(stem + ".sqlite", check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            " row INTEGER PRIMARY KEY, kind TEXT NOT NULL, label TEXT NOT NULL, id TEXT NOT NULL,"
+            " hash TEXT NOT NULL, scale REAL NOT NULL, list INTEGER NOT NULL DEFAULT -1,"
+            " live INTEGER NOT NULL DEFAULT 1)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS rows_key ON rows (kind, label, id) WHERE live = 1")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.generation = None
+        self.dims = None
+        self.vectors = None
+        self.centroids = None
+        self.live = np.zeros(0, bool)
+        self.scales = np.zeros(0, np.float32)
+        self.lists = np.zeros(0, np.int32)
+        self.members = np.zeros(0, np.int64)  # row positions grouped by IVF list
+        self.bounds = np.zeros(0, np.int64)  # list l (-1 first) spans members[bounds[l + 1]:bounds[l + 2]]
+        self.counts = {"searches": 0, "queries": 0, "scanned": 0}
+
+    def meta(self, key, value=None):
+        if value is not None:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+            return value
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _bump(self):
+        self.meta("generation", int(self.meta("generation") or 0) + 1)
+
+    def refresh(self):
+        """Reload row metadata and remap the vectors if a writer changed the index."""
+        generation = self.meta("generation")
+        if generation == self.generation:
+            return
+        rows = np.fromiter(self.conn.execute("SELECT scale, list, live FROM rows ORDER BY row"),
+                           dtype=[("scale", np.float32), ("list", np.int32), ("live", bool)])
+        self.dims = int(self.meta("dims") or 0)
+        self.scales = rows["scale"]
+        self.lists = rows["list"]
+        self.live = rows["live"]
+        self.vectors = (np.memmap(self.vectors_path, dtype=DTYPES[self.dtype], mode="r",
+                                  shape=(len(rows), self.dims)) if len(rows) else None)
+        self.centroids = np.load(self.centroids_path) if os.path.exists(self.centroids_path) else None
+        self.members = np.argsort(self.lists, kind="stable")
+        count = 0 if self.centroids is None else len(self.centroids)
+        self.bounds = np.searchsorted(self.lists[self.members], np.arange(-1, count + 1))
+        self.generation = generation
+
+    def keys(self, positions):
+        """row position -> `(kind, label, id)` for `positions`, read from SQLite."""
+        positions = sorted({int(position) for position in positions})
+        found = {}
+        with self.lock:
+            for start in range(0, len(positions), 500):
+                batch = positions[start:start + 500]
+                found.update((row, (kind, label, key)) for row, kind, label, key in self.conn.execute(
+                    f"SELECT row, kind, label, id FROM rows WHERE row IN ({', '.join('?' * len(batch))})",
+                    batch))
+        return found
+
+    def missing(self, items):
+        """The `(kind, label, id, hash)` items the index holds no live row for."""
+        found = []
+        with self.lock:
+            for kind, label, key, digest in items:
+                row = self.conn.execute(
+                    "SELECT hash FROM rows WHERE kind = ? AND label = ? AND id = ? AND live = 1",
+                    (kind, label, key)).fetchone()
+                if row is None or row[0] != digest:
+                    found.append((kind, label, key, digest))
+        return found
+
+    def add(self, items):
+        """Append `(kind, label, id, hash, vector)` items, masking rows they replace."""
+        latest = {item[:3]: item for item in items}
+        if not latest:
+            return 0
+        items = list(latest.values())
+        vectors = unit_rows(np.asarray([item[4] for item in items], np.float32))
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                dims = int(self.meta("dims") or self.meta("dims", vectors.shape[1]))
+                if dims != vectors.shape[1]:
+                    raise ValueError(f"index holds {dims}-dimensional vectors, got {vectors.shape[1]}")
+                for kind, label, key, _, _ in items:
+                    self.conn.execute("UPDATE rows SET live = 0 WHERE kind = ? AND label = ? AND id = ? AND live = 1",
+                                      (kind, label, key))
+                start = self.conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+                data, scales = quantize(vectors, self.dtype)
+                lists = np.full(len(items), -1)
+                if os.path.exists(self.centroids_path):
+                    lists = np.argmax(vectors @ np.load(self.centroids_path).T, axis=1)
+                # Rows past MAX(row) are left over from a writer that did not commit
+                with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+                    f.seek(start * data.itemsize * dims)
+                    f.write(data.tobytes())
+                    f.truncate()
+                self.conn.executemany(
+                    "INSERT INTO rows (row, kind, label, id, hash, scale, list) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(start + i, kind, label, key, digest, float(scale), int(lst))
+                     for i, ((kind, label, key, digest, _), scale, lst) in enumerate(zip(items, scales, lists))])
+                self._bump()
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        live = self.conn.execute("SELECT COUNT(*) FROM rows WHERE live = 1").fetchone()[0]
+        trained = int(self.meta("trained_rows") or 0)
+        if live >= self.ivf_min_rows and live >= 4 * trained:
+            self.train()
+        return len(items)
+
+    def remove(self, keys):
+        """Mask the rows of `(kind, label, id)` keys, e.g. chunks that left their document."""
+        if not keys:
+            return
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany("UPDATE rows SET live = 0 WHERE kind = ? AND label = ? AND id = ? AND live = 1",
+                                  list(keys))
+            self._bump()
+            self.conn.execute("COMMIT")
+
+    def clear(self):
+        """Drop every vector, e.g. once the graph they came from was deleted."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("DELETE FROM rows")
+                self.conn.execute("DELETE FROM meta WHERE key IN ('dims', 'trained_rows')")
+                # Unlinked, not truncated: readers still mapping the old file keep valid pages
+                for path in (self.vectors_path, self.centroids_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._bump()
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def rows(self, positions):
+        """float32 unit vectors of the rows at `positions` (sorted)."""
+        return self.vectors[positions].astype(np.float32) * self.scales[positions, None]
+
+    def train(self, lists=None, iterations=10, seed=0):
+        """Cluster the live vectors into IVF lists and assign every row to one."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")  # no writer may assign with the old centroids
+            try:
+                self.generation = None
+                self.refresh()
+                live = np.flatnonzero(self.live)
+                if not len(live):
+                    self.conn.execute("ROLLBACK")
+                    return
+                count = lists or max(1, int(np.sqrt(len(live))))
+                rng = np.random.default_rng(seed)
+                sample = np.sort(rng.choice(live, min(len(live), 64 * count), replace=False))
+                data = self.rows(sample)
+                centroids = data[rng.choice(len(data), min(count, len(data)), replace=False)]
+                for _ in range(iterations):
+                    nearest = np.argmax(data @ centroids.T, axis=1)
+                    sums = np.zeros_like(centroids)
+                    np.add.at(sums, nearest, data)
+                    empty = np.bincount(nearest, minlength=len(centroids)) == 0
+                    sums[empty] = centroids[empty]
+                    centroids = unit_rows(sums)
+                assigned = []
+                for start in range(0, len(self.live), self.block):
+                    positions = np.arange(start, min(start + self.block, len(self.live)))
+                    nearest = np.argmax(self.rows(positions) @ centroids.T, axis=1)
+                    assigned.extend(zip(nearest.tolist(), positions.tolist()))
+                np.save(self.centroids_path + ".tmp.npy", centroids.astype(np.float32))
+                os.replace(self.centroids_path + ".tmp.npy", self.centroids_path)
+                self.conn.executemany("UPDATE rows SET list = ? WHERE row = ?", assigned)
+                self.meta("trained_rows", len(live))
+                self._bump()
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def search(self, queries, k=None):
+        """Top-`k` `((kind, label, id), cosine)` lists, one per query vector."""
+        k = k or config.ANN_TOP_K
+        queries = unit_rows(np.atleast_2d(np.asarray(queries, np.float32)))
+        with self.lock:
+            self.refresh()
+            vectors, scales, live, centroids, members, bounds = (self.vectors, self.scales, self.live,
+                                                                 self.centroids, self.members, self.bounds)
+        self.counts["searches"] += 1
+        self.counts["queries"] += len(queries)
+        if vectors is None or queries.shape[1] != vectors.shape[1]:
+            return [[] for _ in queries]
+        everyone = np.arange(len(queries))
+        if centroids is None:
+            # (queries, row positions) to score: every row against every query
+            groups = [(everyone, np.arange(len(live)))]
+        else:
+            probes = np.argsort(-(queries @ centroids.T), axis=1)[:, :self.probes]
+            # Rows added by a writer that had not seen the centroids yet (-1) are scanned by every query
+            groups = [(everyone, members[bounds[0]:bounds[1]])]
+            for lst in np.unique(probes):
+                groups.append((np.flatnonzero((probes == lst).any(axis=1)), members[bounds[lst + 1]:bounds[lst + 2]]))
+        best_scores = np.full((len(queries), k), -np.inf, np.float32)
+        best_rows = np.full((len(queries), k), -1, np.int64)
+        for asking, positions in groups:
+            positions = positions[live[positions]]
+            for start in range(0, len(positions), self.block):
+                block = positions[start:start + self.block]
+                scores = queries[asking] @ (vectors[block].astype(np.float32) * scales[block, None]).T
+                self.counts["scanned"] += len(block)
+                merged_scores = np.concatenate([best_scores[asking], scores], axis=1)
+                merged_rows = np.concatenate([best_rows[asking], np.broadcast_to(block, scores.shape)], axis=1)
+                top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+                best_scores[asking] = np.take_along_axis(merged_scores, top, axis=1)
+                best_rows[asking] = np.take_along_axis(merged_rows, top, axis=1)
+        keys = self.keys(best_rows[np.isfinite(best_scores)])
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            results.append([(keys[rows[i]], float(scores[i])) for i in order
+                            if np.isfinite(scores[i]) and rows[i] in keys])
+        return results
+
+    def stats(self):
+        with self.lock:
+            self.refresh()
+            size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+            return {"rows": len(self.live), "live": int(self.live.sum()), "dims": self.dims,
+                    "dtype": self.dtype, "bytes": size,
+                    "lists": 0 if self.centroids is None else len(self.centroids),
+                    **self.counts}
+
+    def close(self):
+        self.vectors = None
+        self.conn.close()
+
+
+class GraphRetriever:
+    """Answer context from `VectorIndex` hits, expanded one hop through the graph.
+
+    `retrieve(vector)` returns rows for the answer prompt: `{"passage": text}`
+    for the closest chunks, then `{"fact": ...}` for the neighbourhood of the
+    closest entities and of the entities those chunks mention.
+    """
+
+    def __init__(self, index, graph, k=None, limit=None):
+        self.index = index
+        self.graph = graph
+        self.k = k or config.ANN_TOP_K
+        self.limit = limit or config.ANN_CONTEXT_FACTS
+
+    def retrieve(self, vector):
+        with tracing.span("qa.ann_search") as span:
+            hits = self.index.search(vector, self.k)[0]
+            span.set(hits=len(hits))
+        chunks = [key for (kind, _, key), _ in hits if kind == "chunk"]
+        entities = [{"label": label, "id": key} for (kind, label, key), _ in hits if kind == "entity"]
+        rows = []
+        if chunks:
+            passages = {row["id"]: row["passage"]
+                        for row in tracing.profiled_query(self.graph, PASSAGE_QUERY, {"chunks": chunks})}
+            rows.extend({"passage": passages[chunk]} for chunk in chunks if passages.get(chunk))
+        if chunks or entities:
+            rows.extend(tracing.profiled_query(
+                self.graph, NEIGHBOURHOOD_QUERY.format(base=BASE_ENTITY_LABEL),
+                {"entities": entities, "chunks": chunks, "limit": self.limit}))
+        return rows
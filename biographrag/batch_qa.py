@@ -0,0 +1,201 @@
+"""Batch question answering: a question list through `GraphQA`, concurrently.
+
+    python -m biographrag.batch_qa checklist.txt                   # one question per line
+    python -m biographrag.batch_qa checklist.json --concurrency 8  # a JSON list of questions
+    python -m biographrag.batch_qa checklist.txt --output results/report-42.jsonl
+
+Each question goes through the same cache lookup, routing, Cypher
+generation, guard, query and answer steps as one asked in the app, on at
+most `concurrency` threads at once. Work repeated across the batch is done
+once: questions that normalise to the same text are answered once, and
+questions whose Cypher comes out identical (a cached or routed query, or
+generations that agree) share one database execution, later ones waiting
+for the first. Results are written as JSON lines in question order, each
+with its answer, query, row count, how the query was found and its
+seconds per stage; the app offers the same run under "Batch questions".
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from copy import copy
+from datetime import datetime
+
+from biographrag import config, tracing
+from biographrag.qa import normalize_question
+
+
+def read_questions(path):
+    """Questions from a JSON list or a text file (one per line, `#` comments skipped)."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if path.lower().endswith(".json"):
+        questions = json.loads(text)
+    else:
+        questions = [line for line in text.splitlines() if not line.lstrip().startswith("#")]
+    return [question.strip() for question in questions if question.strip()]
+
+
+class SharedQueries:
+    """Runs each distinct (cypher, params) once; concurrent callers wait for the first run."""
+
+    def __init__(self, execute):
+        self.execute = execute
+        self.lock = threading.Lock()
+        self.results = {}
+        self.counts = {"queries": 0, "executions": 0, "shared": 0}
+
+    def __call__(self, cypher, params=None):
+        key = (cypher, json.dumps(params or {}, sort_keys=True, default=str))
+        with self.lock:
+            self.counts["queries"] += 1
+            future = self.results.get(key)
+            owner = future is None
+            if owner:
+                future = self.results[key] = Future()
+                self.counts["executions"] += 1
+            else:
+                self.counts["shared"] += 1
+        if owner:
+            try:
+                future.set_result(self.execute(cypher, params))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            tracing.add("db.shared")
+        return future.result()
+
+
+def result_row(index, question, res, seconds):
+    step = res["intermediate_steps"][0]
+    context = res["intermediate_steps"][1]["context"]
+    trace = res.get("trace") or []
+    stages = {}
+    for span in trace:
+        if span["parent_id"] is not None:
+            stages[span["name"]] = round(stages.get(span["name"], 0.0) + span["ms"] / 1000, 3)
+    return {
+        "index": index, "question": question, "answer": res["result"],
+        "cypher": step.get("query"), "params": step.get("params"),
+        "rows": len(context) if isinstance(context, list) else None,
+        "cypher_cache": res["cypher_cache"], "route": res["route"], "guard": res["guard"],
+        "summaries": res["summaries"], "retrieved": res["retrieved"],
+        "shared_query": any(span["attributes"].get("db.shared") for span in trace),
+        "seconds": round(seconds, 3), "stages": stages, "error": None,
+    }
+
+
+class BatchQA:
+    """Answers a list of questions with `qa` on a bounded thread pool.
+
+    `run(questions)` returns one row per question, in order (see
+    `result_row`); a question that fails gets its `error` instead of
+    stopping the batch. `stats()` covers the last run.
+    """
+
+    def __init__(self, qa, concurrency=None):
+        self.qa = qa
+        self.concurrency = max(1, concurrency or config.BATCH_QA_CONCURRENCY)
+        self.counts = {}
+
+    def run(self, questions, progress=None):
+        # A copy of `qa` whose query executions go through this run's SharedQueries
+        qa = copy(self.qa)
+        qa.execute = shared = SharedQueries(self.qa.execute)
+        first = {}  # normalised question -> index of its first occurrence
+        for index, question in enumerate(questions):
+            first.setdefault(normalize_question(question), index)
+        unique = sorted(set(first.values()))
+
+        def ask(index):
+            started = time.perf_counter()
+            try:
+                res = qa.invoke({"query": questions[index]})
+            except Exception as e:
+                return {"index": index, "question": questions[index], "answer": None,
+                        "seconds": round(time.perf_counter() - started, 3),
+                        "error": f"{type(e).__name__}: {e}"}
+            return result_row(index, questions[index], res, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        rows = {}
+        with tracing.span("qa.batch", questions=len(questions), unique=len(unique)) as span:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                futures = [pool.submit(ask, index) for index in unique]
+                for done, future in enumerate(as_completed(futures), 1):
+                    row = future.result()
+                    rows[row["index"]] = row
+                    if progress:
+                        progress(done, len(unique), row)
+            span.set(executions=shared.counts["executions"], shared=shared.counts["shared"])
+
+        results = []
+        for index, question in enumerate(questions):
+            original = first[normalize_question(question)]
+            if original == index:
+                results.append(rows[index])
+            else:
+                results.append({**rows[original], "index": index, "question": question,
+                                "duplicate_of": original, "seconds": 0.0, "stages": {}})
+        seconds = [row["seconds"] for row in results if row.get("duplicate_of") is None]
+        self.counts = {"questions": len(questions), "unique": len(unique),
+                       "errors": sum(1 for row in results if row["error"]),
+                       "seconds": time.perf_counter() - started,
+                       "question_seconds": sum(seconds), **shared.counts}
+        return results
+
+    def stats(self):
+        return dict(self.counts)
+
+
+def write_results(results, path):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for row in results:
+            f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("questions", help="a .txt file (one question per line) or a .json list")
+    parser.add_argument("--concurrency", type=int, default=config.BATCH_QA_CONCURRENCY)
+    parser.add_argument("--output", help="results file (default <cache dir>/batch_qa/<name>-<time>.jsonl)")
+    args = parser.parse_args()
+    questions = read_questions(args.questions)
+    if not questions:
+        sys.exit(f"no questions in {args.questions}")
+
+    from dotenv import load_dotenv
+
+    from biographrag import resources
+    from biographrag.qa import build_qa
+    from biographrag.schema import SchemaService
+
+    load_dotenv()
+    graph = resources.graph()
+    qa = build_qa(resources.llm(), resources.embeddings(), graph, schema=SchemaService(graph).load(),
+                  limiter=resources.rate_limiter())
+    batch = BatchQA(qa, args.concurrency)
+    try:
+        results = batch.run(questions, progress=lambda done, total, row: print(
+            f"\r{done}/{total} answered", end="", flush=True))
+    finally:
+        qa.close()
+        resources.close()
+
+    name = os.path.splitext(os.path.basename(args.questions))[0]
+    output = args.output or os.path.join(config.CACHE_DIR, "batch_qa",
+                                         f"{name}-{datetime.now():%Y%m%d-%H%M%S}.jsonl")
+    write_results(results, output)
+    stats = batch.stats()
+    print(f"\n{stats['questions']} questions ({stats['unique']} distinct) in {stats['seconds']:.1f}s, "
+          f"{stats['executions']} query executions for {stats['queries']} queries, {stats['errors']} errors")
+    print(f"saved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+
+from biographrag import config
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def transformer_settings(transformer, **options):
+    """What an `LLMGraphTransformer` asks for besides model and schema.
+
+    Its prompt, tool calling and strict mode, plus `options` such as the
+    `node_properties` it was built with, which it does not keep.
+    """
+    prompt = getattr(getattr(transformer, "chain", None), "first", None)
+    return {
+        **options,
+        "strict_mode": getattr(transformer, "strict_mode", None),
+        "function_call": getattr(transformer, "_function_call", None),
+        "prompt": prompt.pretty_repr() if prompt is not None else None,
+    }
+
+
+def extraction_key(text, model, temperature, allowed_nodes, allowed_relationships, settings=None):
+    """Content address of one chunk extraction.
+
+    Anything that changes what the LLM would return is part of the key, so a
+    new model, temperature, schema, prompt or property setting never reads a
+    stale entry.
+    """
+    payload = json.dumps({
+        "text": normalize_text(text),
+        "model": model,
+        "temperature": temperature,
+        "nodes": sorted(allowed_nodes),
+        "relationships": sorted(allowed_relationships),
+        "settings": settings or {},
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def dump_graph_document(graph_document):
+    """Compact JSON for the nodes and relationships (the source is not stored)."""
+    return json.dumps({
+        "nodes": [[n.id, n.type, n.properties] for n in graph_document.nodes],
+        "relationships": [
+            [r.source.id, r.source.type, r.type, r.target.id, r.target.type, r.properties]
+            for r in graph_document.relationships
+        ],
+    }, separators=(",", ":"))
+
+
+def load_graph_document(data, source):
+    data = json.loads(data)
+    nodes = [Node(id=i, type=t, properties=p) for i, t, p in data["nodes"]]
+    relationships = [
+        Relationship(source=Node(id=si, type=st), target=Node(id=ti, type=tt), type=rt, properties=p)
+        for si, st, rt, ti, tt, p in data["relationships"]
+    ]
+    return GraphDocument(nodes=nodes, relationships=relationships, source=source)
+
+
+class ExtractionCache:
+    """SQLite store of chunk extractions with size-bounded LRU eviction.
+
+    Entries are zlib-compressed JSON keyed by `extraction_key`. `hits` and
+    `misses` count lookups made through this instance. The stored size is
+    tracked as entries are written and only summed again when it passes the
+    budget; hits update `last_used` in batches of `touch_batch`.
+    """
+
+    def __init__(self, path=None, max_bytes=None, model=config.LLM_MODEL,
+                 temperature=config.LLM_TEMPERATURE, allowed_nodes=config.ALLOWED_NODES,
+                 allowed_relationships=config.ALLOWED_RELATIONSHIPS, settings=None, touch_batch=64):
+        self.path = path or config.EXTRACTION_CACHE_PATH
+        self.max_bytes = max_bytes if max_bytes is not None else config.EXTRACTION_CACHE_MAX_MB * 1024 * 1024
+        self.key_args = (model, temperature, allowed_nodes, allowed_relationships, settings)
+        self.touch_batch = touch_batch
+        self.touched = {}  # key -> last use not yet written
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            " key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS extractions_lru ON extractions (last_used)")
+        self.conn.commit()
+        self.total = self._stored_bytes()
+
+    def _stored_bytes(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+
+    def key(self, document):
+        return extraction_key(document.page_content, *self.key_args)
+
+    def get(self, document):
+        key = self.key(document)
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.touched[key] = time.time()
+            if len(self.touched) >= self.touch_batch:
+                self._touch()
+                self.conn.commit()
+        return load_graph_document(zlib.decompress(row[0]).decode("utf-8"), document)
+
+    def put(self, document, graph_document):
+        data = zlib.compress(dump_graph_document(graph_document).encode("utf-8"))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, data, size, last_used) VALUES (?, ?, ?, ?)",
+                (self.key(document), data, len(data), time.time()),
+            )
+            self.total += len(data)
+            if self.total > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _touch(self):
+        self.conn.executemany("UPDATE extractions SET last_used = ? WHERE key = ?",
+                              [(used, key) for key, used in self.touched.items()])
+        self.touched.clear()
+
+    def _evict(self):
+        # Other processes write to the same file (and replaced entries were counted twice)
+        self.total = self._stored_bytes()
+        if self.total <= self.max_bytes:
+            return
+        self._touch()
+        # Drop least recently used entries until we are back under budget
+        excess = self.total - self.max_bytes
+        for key, size in self.conn.execute(
+                "SELECT key, size FROM extractions ORDER BY last_used").fetchall():
+            self.conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+            self.total -= size
+            excess -= size
+            if excess <= 0:
+                break
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self):
+        with self.lock:
+            if self.touched:
+                self._touch()
+                self.conn.commit()
+            self.conn.close()
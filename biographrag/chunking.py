@@ -0,0 +1,172 @@
+"""Token-budget chunk packing.
+
+`RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=40)` makes
+~50-token chunks, so most of every extraction call is LLMGraphTransformer's
+prompt and schema, and the 20% overlap is extracted twice. This splitter
+packs whole sentences and paragraphs up to a token budget instead. Chunks
+never span a page or a section heading, and rather than re-sending
+overlapping text each chunk carries a one-line header naming its section
+and the salient entities of the previous chunk (entity carry-over), which is
+what the overlap was there to preserve. The header goes in the chunk's
+`context` metadata and only into the extraction prompt, so a chunk's id and
+cache key depend on its own text, not on what came before it.
+"""
+import re
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from biographrag import config
+from biographrag.extraction import estimate_tokens
+
+SENTENCE_END = re.compile(r"(?<=[.!?;])\s+(?=[A-Z0-9(\"'])")
+HEADING = re.compile(r"^(\d+(\.\d+)*\.?\s+)?[A-Z][A-Za-z0-9 ,/&()-]{1,60}:?$")
+SALIENT = re.compile(
+    r"\b(?:[A-Z][a-z]+\.?\s)?[A-Z][a-z]+(?:\s[A-Z][a-z]+)*\b"  # Dr. Smith, Type Name
+    r"|\b[A-Z][A-Z0-9-]*\d[A-Z0-9-]*\b|\b[A-Z]{2,}[a-z]?\d*\b"  # BRCA1, HER2, HbA1c-like acronyms
+)
+# Capitalised words that start sentences far more often than they name things
+STOPWORDS = {"The", "A", "An", "He", "She", "They", "It", "This", "These", "On", "In", "At",
+             "After", "Before", "During", "His", "Her", "Their", "There", "No", "All", "We"}
+
+
+def is_heading(line):
+    line = line.strip()
+    return (bool(HEADING.match(line)) and not line.endswith((".", ","))
+            and len(line.split()) <= 8)
+
+
+def salient_terms(text, labels=None):
+    """Entity-like mentions in `text`: proper names, gene/lab acronyms and schema nouns."""
+    terms = []
+    for match in SALIENT.finditer(text):
+        term = match.group(0).strip()
+        if term not in STOPWORDS and term not in terms:
+            terms.append(term)
+    for label in labels or config.ALLOWED_NODES:
+        if re.search(rf"\b{re.escape(label)}s?\b", text, re.IGNORECASE) and label.lower() not in terms:
+            terms.append(label.lower())
+    return terms
+
+
+# Titles and Latin shorthand that end in a period without ending the sentence
+ABBREVIATIONS = ("Dr.", "Mr.", "Mrs.", "Ms.", "Prof.", "St.", "vs.", "e.g.", "i.e.", "approx.", "No.")
+
+
+def sentences(paragraph):
+    out = []
+    for part in SENTENCE_END.split(paragraph):
+        part = part.strip()
+        if not part:
+            continue
+        if out and out[-1].endswith(ABBREVIATIONS):
+            out[-1] = f"{out[-1]} {part}"
+        else:
+            out.append(part)
+    return out
+
+
+class TokenBudgetSplitter:
+    """Packs sentences into chunks of at most `token_budget` tokens.
+
+    Carry-over state spans pages, so one splitter instance handles one
+    document at a time; call `reset()` before starting the next.
+    """
+
+    def __init__(self, token_budget=None, max_carry=None, count_tokens=estimate_tokens):
+        self.token_budget = token_budget or config.chunk_token_budget(config.LLM_MODEL)
+        self.max_carry = config.CHUNK_CARRY_ENTITIES if max_carry is None else max_carry
+        self.count_tokens = count_tokens
+        self.reset()
+
+    def reset(self):
+        self.section = None
+        self.carry = []
+
+    def _header(self):
+        parts = []
+        if self.section:
+            parts.append(f"Section: {self.section}")
+        if self.carry:
+            parts.append(f"Context: {', '.join(self.carry)}")
+        return f"[{' | '.join(parts)}] " if parts else ""
+
+    def _units(self, text):
+        """(kind, text) pairs: headings and sentences, with oversized sentences cut on words."""
+        for paragraph in re.split(r"\n\s*\n", text):
+            lines = [line.strip() for line in paragraph.splitlines() if line.strip()]
+            body = []
+            for line in lines:
+                if is_heading(line):
+                    if body:
+                        yield from self._sentences(" ".join(body))
+                        body = []
+                    yield "heading", line.rstrip(":")
+                else:
+                    body.append(line)
+            if body:
+                yield from self._sentences(" ".join(body))
+            yield "paragraph", None
+
+    def _sentences(self, text):
+        for sentence in sentences(text):
+            if self.count_tokens(sentence) <= self.token_budget:
+                yield "sentence", sentence
+                continue
+            words, part = sentence.split(), []
+            for word in words:
+                if part and self.count_tokens(" ".join(part + [word])) > self.token_budget:
+                    yield "sentence", " ".join(part)
+                    part = []
+                part.append(word)
+            if part:
+                yield "sentence", " ".join(part)
+
+    def split_text(self, text):
+        chunks, current = [], []
+
+        def flush():
+            if current:
+                body = " ".join(current)
+                chunks.append((self._header(), body, self.section))
+                self.carry = salient_terms(body)[-self.max_carry:] if self.max_carry else []
+                current.clear()
+
+        for kind, unit in self._units(text):
+            if kind == "heading":
+                flush()
+                self.section = unit
+                self.carry = []
+            elif kind == "sentence":
+                budget = self.token_budget - self.count_tokens(self._header())
+                if current and self.count_tokens(" ".join(current + [unit])) > budget:
+                    flush()
+                current.append(unit)
+        flush()  # never carry text across a page boundary
+        return chunks
+
+    def split_documents(self, documents):
+        out = []
+        for document in documents:
+            for header, body, section in self.split_text(document.page_content):
+                metadata = dict(document.metadata)
+                if section:
+                    metadata["section"] = section
+                if header:
+                    metadata["context"] = header
+                out.append(Document(page_content=body, metadata=metadata))
+        return out
+
+
+def default_splitter():
+    return RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=40)
+
+
+def make_splitter(mode=None):
+    """Splitter for `CHUNKING_MODE`: "recursive" (the original) or "token_budget"."""
+    mode = mode or config.CHUNKING_MODE
+    if mode == "token_budget":
+        return TokenBudgetSplitter()
+    if mode == "recursive":
+        return default_splitter()
+    raise ValueError(f"Unknown CHUNKING_MODE {mode!r}; use 'recursive' or 'token_budget'")
@@ -0,0 +1,157 @@
+import os
+
+# Biomedical schema shared by extraction, graph writes and query generation
+ALLOWED_NODES = [
+    "Patient", "Disease", "Medication", "Test", "Symptom", "Doctor",
+    "Procedure", "Anatomy", "Gene", "Protein", "Biomarker", "ClinicalTrial"
+]
+ALLOWED_RELATIONSHIPS = [
+    "HAS_DISEASE", "TAKES_MEDICATION", "UNDERWENT_TEST", "HAS_SYMPTOM", "TREATED_BY",
+    "EXPRESSES", "MUTATES", "TARGETS", "ENROLLED_IN", "AFFECTS", "UNDERWENT_PROCEDURE"
+]
+
+LLM_MODEL = "llama-3.3-70b-versatile"
+LLM_TEMPERATURE = 0
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+# Chunk extraction throughput. Defaults follow the Groq free tier for
+# llama-3.3-70b-versatile; raise them for paid plans.
+EXTRACTION_CONCURRENCY = env_int("EXTRACTION_CONCURRENCY", 4)
+EXTRACTION_MAX_RETRIES = env_int("EXTRACTION_MAX_RETRIES", 6)
+GROQ_RPM = env_int("GROQ_RPM", 30)
+GROQ_TPM = env_int("GROQ_TPM", 12000)
+# Tokens billed per extraction call on top of the chunk text: the
+# LLMGraphTransformer system prompt, tool schema and the JSON completion.
+EXTRACTION_PROMPT_TOKENS = env_int("EXTRACTION_PROMPT_TOKENS", 900)
+EXTRACTION_COMPLETION_TOKENS = env_int("EXTRACTION_COMPLETION_TOKENS", 250)
+
+# Local state (extraction cache, embeddings, job queue) lives under this directory
+CACHE_DIR = os.getenv("BIOGRAPHRAG_CACHE_DIR", ".cache")
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", os.path.join(CACHE_DIR, "extraction.sqlite"))
+EXTRACTION_CACHE_MAX_MB = env_int("EXTRACTION_CACHE_MAX_MB", 256)
+
+# Rows per UNWIND transaction when writing graph documents to Neo4j
+WRITE_BATCH_SIZE = env_int("WRITE_BATCH_SIZE", 1000)
+
+# Entity embeddings: one vector and one keyword index over every allowed label
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(CACHE_DIR, "embeddings.sqlite"))
+EMBEDDING_BATCH_SIZE = env_int("EMBEDDING_BATCH_SIZE", 256)
+ENTITY_VECTOR_INDEX = "entity_vector_index"
+ENTITY_KEYWORD_INDEX = "entity_keyword_index"
+
+# Streaming ingestion: chunks buffered between the PDF reader and extraction,
+# and extracted chunks per graph write
+STREAM_QUEUE_SIZE = env_int("STREAM_QUEUE_SIZE", 64)
+STREAM_WRITE_EVERY = env_int("STREAM_WRITE_EVERY", 32)
+
+# Chunking: "recursive" keeps the original 200-character splitter, "token_budget"
+# packs sentences up to the model's budget with entity carry-over instead of overlap
+CHUNKING_MODE = os.getenv("CHUNKING_MODE", "recursive")
+CHUNK_TOKEN_BUDGETS = {
+    "llama-3.3-70b-versatile": 800,
+    "llama-3.1-8b-instant": 500,
+}
+CHUNK_CARRY_ENTITIES = env_int("CHUNK_CARRY_ENTITIES", 6)
+
+
+def chunk_token_budget(model):
+    return env_int("CHUNK_TOKEN_BUDGET", CHUNK_TOKEN_BUDGETS.get(model, 600))
+
+# Question -> Cypher cache: exact match on the normalised question, else the
+# nearest cached question by embedding if its cosine similarity reaches this
+CYPHER_CACHE_PATH = os.getenv("CYPHER_CACHE_PATH", os.path.join(CACHE_DIR, "cypher.sqlite"))
+CYPHER_CACHE_SIMILARITY = env_float("CYPHER_CACHE_SIMILARITY", 0.95)
+CYPHER_CACHE_MAX_ENTRIES = env_int("CYPHER_CACHE_MAX_ENTRIES", 500)
+
+# Ingestion jobs: queue shared by the app and `python -m biographrag.worker`.
+# A running job whose worker has not heartbeaten for JOB_STALE_SECONDS is retried.
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(CACHE_DIR, "jobs.sqlite"))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(CACHE_DIR, "uploads"))
+INGEST_WORKERS = env_int("INGEST_WORKERS", 2)
+JOB_STALE_SECONDS = env_int("JOB_STALE_SECONDS", 60)
+JOB_HEARTBEAT_SECONDS = env_int("JOB_HEARTBEAT_SECONDS", 10)
+JOB_MAX_ATTEMPTS = env_int("JOB_MAX_ATTEMPTS", 3)
+
+# Tracing: every ingestion and QA stage is a span. TRACE_EXPORT is a comma list
+# of "jsonl" (TRACE_LOG_PATH) and "otlp" (OTLP/HTTP JSON), or "none"
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "jsonl")
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", os.path.join(CACHE_DIR, "traces.jsonl"))
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+TRACE_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "biographrag")
+# Run QA queries under PROFILE to record db hits (a little extra server work)
+TRACE_PROFILE_QUERIES = env_int("TRACE_PROFILE_QUERIES", 1)
+
+# Shared clients (biographrag.resources): one Neo4j driver pool and one keep-alive
+# HTTP pool per process, whatever the number of app sessions
+NEO4J_MAX_POOL_SIZE = env_int("NEO4J_MAX_POOL_SIZE", 20)
+NEO4J_ACQUISITION_TIMEOUT = env_float("NEO4J_ACQUISITION_TIMEOUT", 30.0)
+NEO4J_CONNECTION_LIFETIME = env_int("NEO4J_CONNECTION_LIFETIME", 300)
+NEO4J_LIVENESS_CHECK_SECONDS = env_float("NEO4J_LIVENESS_CHECK_SECONDS", 30.0)
+HTTP_MAX_CONNECTIONS = env_int("HTTP_MAX_CONNECTIONS", 20)
+HTTP_KEEPALIVE_SECONDS = env_float("HTTP_KEEPALIVE_SECONDS", 60.0)
+HTTP_TIMEOUT_SECONDS = env_float("HTTP_TIMEOUT_SECONDS", 60.0)
+
+# Template router: questions matching one schema pattern skip LLM Cypher generation.
+# Embedding similarity (cosine) must reach this to pick between close templates.
+ROUTER_ENABLED = env_int("ROUTER_ENABLED", 1)
+ROUTER_SIMILARITY = env_float("ROUTER_SIMILARITY", 0.8)
+
+# Entity resolution: extracted names whose normalised forms share enough character
+# trigrams (Jaccard) become one node; trigrams shared by more keys than
+# RESOLUTION_MAX_BLOCK are too common to block on. Each new name loads at most
+# RESOLUTION_CANDIDATES stored entities from the graph's trigram index.
+RESOLUTION_ENABLED = env_int("RESOLUTION_ENABLED", 1)
+RESOLUTION_SIMILARITY = env_float("RESOLUTION_SIMILARITY", 0.75)
+RESOLUTION_MAX_BLOCK = env_int("RESOLUTION_MAX_BLOCK", 200)
+RESOLUTION_CANDIDATES = env_int("RESOLUTION_CANDIDATES", 25)
+
+# Guard for generated Cypher: bounded paths, a LIMIT, EXPLAIN-based rejection of
+# cartesian products and huge estimates (one LLM rewrite attempt), and a timeout
+GUARD_ENABLED = env_int("GUARD_ENABLED", 1)
+GUARD_MAX_ESTIMATED_ROWS = env_int("GUARD_MAX_ESTIMATED_ROWS", 1_000_000)
+GUARD_MAX_HOPS = env_int("GUARD_MAX_HOPS", 4)
+GUARD_TIMEOUT_SECONDS = env_float("GUARD_TIMEOUT_SECONDS", 15.0)
+GUARD_LLM_REWRITE = env_int("GUARD_LLM_REWRITE", 1)
+
+# Local vector index (biographrag.ann) over chunk and entity embeddings: one
+# memory-mapped file per embedding model, float32, float16 or int8. Searches scan
+# ANN_SCAN_BLOCK rows at a time, or only the ANN_IVF_PROBES nearest IVF lists once
+# the index holds ANN_IVF_MIN_ROWS vectors. Hits are expanded into at most
+# ANN_CONTEXT_FACTS graph facts when Cypher finds nothing.
+ANN_ENABLED = env_int("ANN_ENABLED", 1)
+ANN_DIR = os.getenv("ANN_DIR", os.path.join(CACHE_DIR, "ann"))
+ANN_DTYPE = os.getenv("ANN_DTYPE", "float16")
+ANN_SCAN_BLOCK = env_int("ANN_SCAN_BLOCK", 8192)
+ANN_IVF_MIN_ROWS = env_int("ANN_IVF_MIN_ROWS", 20000)
+ANN_IVF_PROBES = env_int("ANN_IVF_PROBES", 8)
+ANN_TOP_K = env_int("ANN_TOP_K", 8)
+ANN_CONTEXT_FACTS = env_int("ANN_CONTEXT_FACTS", 40)
+
+# Batch QA (biographrag.batch_qa): questions answered at once. The LLM calls of every
+# question (Cypher generation, guard rewrites, answers) wait on one GROQ_RPM/GROQ_TPM
+# limiter per process, shared with the questions asked in the app; QA_COMPLETION_TOKENS
+# is what each call is budgeted for on top of its prompt.
+BATCH_QA_CONCURRENCY = env_int("BATCH_QA_CONCURRENCY", 4)
+QA_COMPLETION_TOKENS = env_int("QA_COMPLETION_TOKENS", 300)
+
+# Entity neighbourhood summaries (biographrag.summaries): after ingestion, entities
+# within SUMMARY_HOPS of what was written store up to SUMMARY_MAX_FACTS facts from
+# their neighbourhood, following SUMMARY_FANOUT relationships per node and hop.
+# QA reads them when Cypher finds nothing (or always, with SUMMARY_EXTRA_CONTEXT=1).
+SUMMARIES_ENABLED = env_int("SUMMARIES_ENABLED", 1)
+SUMMARY_HOPS = env_int("SUMMARY_HOPS", 2)
+SUMMARY_FANOUT = env_int("SUMMARY_FANOUT", 25)
+SUMMARY_MAX_FACTS = env_int("SUMMARY_MAX_FACTS", 40)
+SUMMARY_MAX_CHUNKS = env_int("SUMMARY_MAX_CHUNKS", 50)
+SUMMARY_CONTEXT_FACTS = env_int("SUMMARY_CONTEXT_FACTS", 40)
+SUMMARY_EXTRA_CONTEXT = env_int("SUMMARY_EXTRA_CONTEXT", 0)
@@ -0,0 +1,208 @@
+"""Incremental entity embeddings.
+
+Every entity written by `BulkGraphWriter` carries the `__Entity__` label, so a
+single vector index and a single full-text index cover all allowed labels.
+Nodes store the hash of the text they were embedded from; only nodes whose
+text hash changed are re-embedded, and vectors are memoised by text hash in a
+local SQLite store so the embeddings API is never paid twice for one text.
+With a `VectorIndex`, entity vectors and the text of written chunks are
+also added to the local index (`biographrag.ann`).
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+
+from biographrag import config
+from biographrag.writer import BASE_ENTITY_LABEL
+
+# Properties that are bookkeeping rather than content
+INTERNAL_PROPERTIES = {"id", "embedding", "embedding_hash", "doc_ids",
+                       "neighbourhood", "neighbourhood_chunks", "neighbourhood_hash",
+                       "resolution_keys", "resolution_grams"}
+
+
+def embedding_model_name(embeddings):
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+def entity_text(label, node_id, properties):
+    """The text an entity is embedded from: label, name and its extracted properties."""
+    details = "; ".join(f"{key}: {value}" for key, value in sorted(properties.items())
+                        if key not in INTERNAL_PROPERTIES and value not in (None, ""))
+    return f"{label}: {node_id}" + (f" ({details})" if details else "")
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """SQLite memo of vectors keyed by (model, text hash), stored as float32."""
+
+    def __init__(self, path=None, model=""):
+        self.path = path or config.EMBEDDING_CACHE_PATH
+        self.model = model
+        self.lock = threading.Lock()
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            " model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, hash))"
+        )
+        self.conn.commit()
+
+    def get_many(self, hashes):
+        found = {}
+        with self.lock:
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT hash, vector FROM vectors WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+                    [self.model, *part]).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, items):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO vectors (model, hash, vector) VALUES (?, ?, ?)",
+                [(self.model, key, array("f", vector).tobytes()) for key, vector in items])
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class EntityEmbedder:
+    """Embeds entities of every allowed label whose text changed since last time."""
+
+    def __init__(self, graph, embeddings, store=None, labels=None, batch_size=None, index=None):
+        self.graph = graph
+        self.embeddings = embeddings
+        self.store = store or EmbeddingStore(model=embedding_model_name(embeddings))
+        self.labels = labels or config.ALLOWED_NODES
+        self.batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+        self.index = index
+        self.stats = {"nodes": 0, "stale": 0, "memoised": 0, "embedded": 0, "api_calls": 0,
+                      "indexed": 0}
+
+    def stale_nodes(self, label, ids=None):
+        """Nodes of `label` (optionally only `ids`) whose text changed or is not in the local index.
+
+        Rows with `stale` set need their graph embedding rewritten.
+        """
+        where = "WHERE n.id IN $ids" if ids is not None else ""
+        rows = self.graph.query(f"""
+            MATCH (n:`{label}`) {where}
+            RETURN n.id AS id, n.embedding_hash AS hash,
+                   [k IN keys(n) WHERE NOT k IN $internal | [k, n[k]]] AS properties
+        """, {"ids": ids, "internal": sorted(INTERNAL_PROPERTIES)})
+        self.stats["nodes"] += len(rows)
+        stale = []
+        for row in rows:
+            text = entity_text(label, row["id"], dict(row["properties"]))
+            digest = text_hash(text)
+            stale.append({"id": row["id"], "text": text, "hash": digest, "stale": digest != row["hash"]})
+        unindexed = set()
+        if self.index is not None:
+            unindexed = {key for _, _, key, _ in self.index.missing(
+                [("entity", label, row["id"], row["hash"]) for row in stale])}
+        return [row for row in stale if row["stale"] or row["id"] in unindexed]
+
+    def embed(self, rows):
+        """Attach `embedding` to each row, calling the API only for unseen texts."""
+        known = self.store.get_many(sorted({row["hash"] for row in rows}))
+        self.stats["memoised"] += sum(1 for row in rows if row["hash"] in known)
+        missing = {}
+        for row in rows:
+            if row["hash"] not in known:
+                missing.setdefault(row["hash"], row["text"])
+        pending = list(missing.items())
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            vectors = self.embeddings.embed_documents([text for _, text in batch])
+            self.stats["api_calls"] += 1
+            self.stats["embedded"] += len(batch)
+            new = [(key, vector) for (key, _), vector in zip(batch, vectors)]
+            self.store.put_many(new)
+            known.update(new)
+        for row in rows:
+            row["embedding"] = known[row["hash"]]
+        return rows
+
+    def write(self, label, rows):
+        for start in range(0, len(rows), config.WRITE_BATCH_SIZE):
+            self.graph.query(f"""
+                UNWIND $rows AS row
+                MATCH (n:`{label}` {{id: row.id}})
+                SET n:`{BASE_ENTITY_LABEL}`, n.embedding = row.embedding, n.embedding_hash = row.hash
+            """, {"rows": [{"id": r["id"], "embedding": r["embedding"], "hash": r["hash"]}
+                           for r in rows[start:start + config.WRITE_BATCH_SIZE]]})
+
+    def ensure_indexes(self, dimensions):
+        self.graph.query(
+            f"CREATE VECTOR INDEX `{config.ENTITY_VECTOR_INDEX}` IF NOT EXISTS "
+            f"FOR (n:`{BASE_ENTITY_LABEL}`) ON (n.embedding) "
+            f"OPTIONS {{indexConfig: {{`vector.dimensions`: {int(dimensions)}, "
+            "`vector.similarity_function`: 'cosine'}}")
+        self.graph.query(
+            f"CREATE FULLTEXT INDEX `{config.ENTITY_KEYWORD_INDEX}` IF NOT EXISTS "
+            f"FOR (n:`{BASE_ENTITY_LABEL}`) ON EACH [n.id]")
+
+    def index_chunks(self, chunks):
+        """Add `(chunk id, text)` pairs the local index does not hold yet."""
+        rows = {chunk: {"id": chunk, "text": text, "hash": text_hash(text)} for chunk, text in chunks}
+        missing = self.index.missing([("chunk", "Document", row["id"], row["hash"]) for row in rows.values()])
+        rows = self.embed([rows[key] for _, _, key, _ in missing])
+        self.stats["indexed"] += self.index.add(
+            [("chunk", "Document", row["id"], row["hash"], row["embedding"]) for row in rows])
+
+    def run(self, touched=None, chunks=None, removed=(), deleted=()):
+        """Embed stale entities.
+
+        `touched` maps label -> ids written by the last ingestion batch; when
+        given, only those nodes are checked, so cost follows new content. With
+        `touched=None` every node of every label is checked (backfill).
+        With a local index, `chunks` (`(id, text)` pairs; every stored chunk
+        on backfill) are indexed too, and `removed` chunk ids and `deleted`
+        `(label, id)` entities are dropped from it.
+        """
+        if self.index is not None:
+            self.index.remove([("chunk", "Document", chunk) for chunk in removed]
+                              + [("entity", label, key) for label, key in deleted])
+            if chunks is None and touched is None:
+                chunks = [(row["id"], row["text"]) for row in self.graph.query(
+                    "MATCH (d:Document) WHERE d.text IS NOT NULL RETURN d.id AS id, d.text AS text")]
+            if chunks:
+                self.index_chunks(chunks)
+        stale = {}
+        for label in self.labels:
+            ids = None
+            if touched is not None:
+                ids = touched.get(label)
+                if not ids:
+                    continue
+            rows = self.stale_nodes(label, ids)
+            if rows:
+                stale[label] = rows
+        rows = [row for label_rows in stale.values() for row in label_rows]
+        if not rows:
+            return self.stats
+        # One pass over all labels so API batches stay full
+        self.stats["stale"] += sum(1 for row in rows if row["stale"])
+        self.embed(rows)
+        for label, label_rows in stale.items():
+            label_rows = [row for row in label_rows if row["stale"]]
+            if label_rows:
+                self.write(label, label_rows)
+            if self.index is not None:
+                self.stats["indexed"] += self.index.add(
+                    [("entity", label, row["id"], row["hash"], row["embedding"]) for row in stale[label]])
+        self.ensure_indexes(len(rows[0]["embedding"]))
+        return self.stats
@@ -0,0 +1,237 @@
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from langchain_core.documents import Document
+
+from biographrag import config, tracing
+
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for budgeting Llama/OpenAI calls
+    return max(1, len(text) // 4)
+
+
+def with_context(document):
+    """`document` as the LLM sees it: its carried-over `context` header (see chunking) first."""
+    context = document.metadata.get("context")
+    if not context:
+        return document
+    return Document(page_content=context + document.page_content, metadata=document.metadata)
+
+
+def is_rate_limit_error(error):
+    """True for provider 429s (groq/openai RateLimitError or a bare HTTP 429)."""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    return type(error).__name__ == "RateLimitError"
+
+
+def retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def rate_limited(limiter, call, tokens, max_retries=None, backoff_base=1.0, backoff_cap=60.0):
+    """`call()` once `limiter` has room for `tokens`, retried with backoff on 429s.
+
+    A 429 pauses `limiter` for everyone sharing it, as in `ChunkExtractor`.
+    """
+    max_retries = config.EXTRACTION_MAX_RETRIES if max_retries is None else max_retries
+    attempt = 0
+    while True:
+        limiter.acquire(tokens)
+        try:
+            return call()
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt >= max_retries:
+                raise
+            delay = random.uniform(0, min(backoff_cap, backoff_base * 2 ** attempt))
+            limiter.pause(max(delay, retry_after_seconds(e) or 0))
+            attempt += 1
+            tracing.add("llm.retries")
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity or rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` tokens are available (0 if they are now)."""
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= amount:
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    def try_take(self, amount):
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return True
+            return False
+
+    def give_back(self, amount):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits for one provider.
+
+    A limit of 0 disables that bucket. `pause()` blocks every caller, which is
+    how a 429 seen by one worker slows down all of them.
+    """
+
+    def __init__(self, rpm=0, tpm=0):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def acquire(self, tokens=1):
+        """Block until one request costing `tokens` fits in both budgets."""
+        while True:
+            delay = self.paused_until - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            if self.requests and not self.requests.try_take(1):
+                time.sleep(self.requests.wait_time(1))
+                continue
+            if self.tokens and not self.tokens.try_take(tokens):
+                if self.requests:
+                    self.requests.give_back(1)
+                time.sleep(self.tokens.wait_time(tokens))
+                continue
+            return
+
+
+class ChunkExtractor:
+    """Runs `transformer.process_response` over chunks on a bounded worker pool.
+
+    `transformer` is an LLMGraphTransformer or anything exposing the same
+    `process_response(document)` method (see `biographrag.fakes`). Results come
+    back in chunk order regardless of completion order. With an
+    `ExtractionCache`, only chunks missing from the cache reach the LLM.
+
+    `iter_extract` consumes its input lazily and keeps at most `window` chunks
+    in flight, so it can sit between a streaming splitter and the writer.
+    """
+
+    def __init__(self, transformer, concurrency=None, limiter=None, max_retries=None,
+                 backoff_base=1.0, backoff_cap=60.0, cache=None, window=None):
+        self.transformer = transformer
+        self.cache = cache
+        self.concurrency = max(1, concurrency or config.EXTRACTION_CONCURRENCY)
+        self.window = window or 2 * self.concurrency
+        self.limiter = limiter or RateLimiter(config.GROQ_RPM, config.GROQ_TPM)
+        self.max_retries = config.EXTRACTION_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.stats = {"chunks": 0, "cached": 0, "llm_calls": 0, "retries": 0, "seconds": 0.0}
+        self.stats_lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def request_tokens(self, document):
+        return (config.EXTRACTION_PROMPT_TOKENS + estimate_tokens(with_context(document).page_content)
+                + config.EXTRACTION_COMPLETION_TOKENS)
+
+    def extract_one(self, document):
+        with tracing.span("extract.chunk", root=False) as span:
+            attempt = 0
+            while True:
+                started = time.perf_counter()
+                self.limiter.acquire(self.request_tokens(document))
+                span.add("rate_limit_wait_seconds", time.perf_counter() - started)
+                self._count("llm_calls")
+                try:
+                    graph_document = self.transformer.process_response(with_context(document))
+                    graph_document.source = document
+                except Exception as e:
+                    if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                        raise
+                    # Full jitter keeps the workers from retrying in lockstep
+                    delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                    self.limiter.pause(max(delay, retry_after_seconds(e) or 0))
+                    attempt += 1
+                    self._count("retries")
+                    span.add("retries")
+                    continue
+                if self.cache is not None:
+                    self.cache.put(document, graph_document)
+                return graph_document
+
+    def _submit(self, pool, document):
+        cached = self.cache.get(document) if self.cache is not None else None
+        if cached is None:
+            # The pool thread reports into the caller's current span
+            return pool.submit(contextvars.copy_context().run, self.extract_one, document)
+        self._count("cached")
+        tracing.add("extract.cached")
+        future = Future()
+        future.set_result(cached)
+        return future
+
+    def iter_extract(self, documents, progress=None):
+        """Yield one GraphDocument per input document, in input order.
+
+        `progress(done)` is called on the consumer's thread after each yield.
+        """
+        started = time.perf_counter()
+        in_flight = deque()
+        done = 0
+        pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            for document in documents:
+                in_flight.append(self._submit(pool, document))
+                while len(in_flight) >= self.window or (in_flight and in_flight[0].done()):
+                    yield in_flight.popleft().result()
+                    done += 1
+                    if progress:
+                        progress(done)
+            while in_flight:
+                yield in_flight.popleft().result()
+                done += 1
+                if progress:
+                    progress(done)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            self._count("chunks", done)
+            self._count("seconds", time.perf_counter() - started)
+
+    def run(self, documents, progress=None):
+        """Extract every document; `progress(done, total)` runs on the caller's thread."""
+        documents = list(documents)
+        report = (lambda done: progress(done, len(documents))) if progress else None
+        return list(self.iter_extract(documents, progress=report))
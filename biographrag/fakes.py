@@ -0,0 +1,141 @@
+"""Local stand-ins for the hosted models, for offline throughput runs."""
+import random
+import re
+import threading
+import time
+
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from biographrag.extraction import estimate_tokens
+
+# Surface form -> label. Small, but enough to give every chunk of the sample
+# corpus a realistic handful of entities.
+LEXICON = {
+    "patient": "Patient",
+    "type 2 diabetes": "Disease", "hypertension": "Disease", "breast cancer": "Disease",
+    "chronic kidney disease": "Disease", "pneumonia": "Disease",
+    "metformin": "Medication", "lisinopril": "Medication", "tamoxifen": "Medication",
+    "trastuzumab": "Medication", "insulin glargine": "Medication", "amoxicillin": "Medication",
+    "hba1c": "Test", "creatinine": "Test", "chest x-ray": "Test", "complete blood count": "Test",
+    "fatigue": "Symptom", "polyuria": "Symptom", "cough": "Symptom", "fever": "Symptom",
+    "dr. smith": "Doctor", "dr. patel": "Doctor",
+    "mastectomy": "Procedure", "biopsy": "Procedure", "dialysis": "Procedure",
+    "kidney": "Anatomy", "breast": "Anatomy", "lung": "Anatomy",
+    "brca1": "Gene", "her2": "Gene", "tp53": "Gene",
+    "her2 protein": "Protein", "estrogen receptor": "Protein",
+    "ca 15-3": "Biomarker", "egfr": "Biomarker",
+    "nct01234567": "ClinicalTrial",
+}
+
+# Relationship used when linking the patient to an entity of this label
+PATIENT_RELATIONS = {
+    "Disease": "HAS_DISEASE", "Medication": "TAKES_MEDICATION", "Test": "UNDERWENT_TEST",
+    "Symptom": "HAS_SYMPTOM", "Doctor": "TREATED_BY", "Procedure": "UNDERWENT_PROCEDURE",
+    "ClinicalTrial": "ENROLLED_IN",
+}
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+def lexicon_entities(text):
+    """(surface form, label) pairs from LEXICON found in `text`, in text order."""
+    lowered = text.lower()
+    found = []
+    for term, label in LEXICON.items():
+        match = re.search(r"(?<![\w-])" + re.escape(term) + r"(?![\w-])", lowered)
+        if match:
+            found.append((match.start(), term, label))
+    return [(term, label) for _, term, label in sorted(found)]
+
+
+def lexicon_graph_document(document):
+    nodes = [Node(id=term.title(), type=label) for term, label in lexicon_entities(document.page_content)]
+    patients = [n for n in nodes if n.type == "Patient"]
+    relationships = []
+    for patient in patients:
+        for node in nodes:
+            if node.type in PATIENT_RELATIONS:
+                relationships.append(Relationship(source=patient, target=node,
+                                                  type=PATIENT_RELATIONS[node.type]))
+    return GraphDocument(nodes=nodes, relationships=relationships, source=document)
+
+
+class FakeGraphExtractor:
+    """Drop-in for LLMGraphTransformer that never leaves the machine.
+
+    Each call sleeps `latency` seconds (plus up to `jitter`) to mimic a hosted
+    model, then extracts LEXICON terms. `rpm_limit` makes it answer with a 429
+    once more than that many calls land inside a rolling `window` (a minute,
+    the way Groq counts), so retry and rate-limit handling can be exercised.
+    """
+
+    def __init__(self, latency=0.2, jitter=0.05, rpm_limit=0, window=60.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rpm_limit = rpm_limit
+        self.window = window
+        self.random = random.Random(seed)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def process_response(self, document, config=None):
+        now = time.monotonic()
+        with self.lock:
+            self.calls = [t for t in self.calls if now - t < self.window]
+            if self.rpm_limit and len(self.calls) >= self.rpm_limit:
+                raise FakeRateLimitError("Rate limit reached (429)")
+            self.calls.append(now)
+            delay = self.latency + self.random.uniform(0, self.jitter)
+        time.sleep(delay)
+        return lexicon_graph_document(document)
+
+    def convert_to_graph_documents(self, documents, config=None):
+        return [self.process_response(document, config) for document in documents]
+
+
+def question_cypher(question):
+    """The Cypher a well-behaved model would write for a simple "which X" question."""
+    from biographrag.schema import SYNONYMS, label_words
+
+    text = question.lower()
+    label = next((label for label in PATIENT_RELATIONS
+                  if any(re.search(rf"\b{re.escape(w)}\b", text) for w in label_words(label))), None)
+    label = label or next((label for word, label in SYNONYMS.items()
+                           if label in PATIENT_RELATIONS and re.search(rf"\b{word}s?\b", text)), None)
+    if label is None:
+        return "MATCH (p:Patient) RETURN p.id LIMIT 10"
+    return f"MATCH (p:Patient)-[:{PATIENT_RELATIONS[label]}]->(x:{label}) RETURN x.id LIMIT 10"
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model for the QA chain: writes Cypher for Cypher prompts, lists results otherwise.
+
+    Answers are a pure function of the prompt, after sleeping `latency` seconds.
+    """
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "fake-biographrag"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        prompt = messages[-1].content
+        # "Question: ..." in the app's prompts, "The question is: ..." in LangChain's
+        questions = re.findall(r"(?:Question:|The question is:)\s*(.+)", prompt)
+        question = questions[-1].strip() if questions else prompt
+        if "cypher" in prompt.lower() and "Database Results" not in prompt and "Information:" not in prompt:
+            content = question_cypher(question)
+        else:
+            results = re.findall(r"'x\.id': '([^']+)'", prompt)
+            content = (f"The document mentions {', '.join(results)}." if results
+                       else "I couldn't find that information in the document")
+        usage = {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(content)}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))],
+                          llm_output={"token_usage": usage})
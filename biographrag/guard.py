@@ -0,0 +1,179 @@
+"""Checks and rewrites LLM-generated Cypher before it reaches Neo4j.
+
+The QA chain runs with `allow_dangerous_requests=True`, and `top_k` only
+truncates results after the database did all the work. `CypherGuard.check`
+sits between generation and execution:
+
+- write and admin clauses are rejected (answering never needs them);
+- variable-length patterns get an upper bound of `GUARD_MAX_HOPS`;
+- the final RETURN gets a `LIMIT` no larger than the rows the answer uses;
+- `EXPLAIN` (which plans without running) rejects cartesian products and
+  plans estimated above `GUARD_MAX_ESTIMATED_ROWS`; a query the database
+  refuses (a syntax error, an unknown procedure or function, a type error)
+  also surfaces here instead of at execution.
+
+A rejected query is handed to the LLM once for a cheaper rewrite, which is
+checked the same way. Queries that pass still run under a per-transaction
+timeout (`GUARD_TIMEOUT_SECONDS`, applied by `GraphQA`), so one bad question
+cannot hold a connection, or the database, for minutes.
+"""
+import re
+
+from biographrag import config
+
+WRITE_CLAUSES = re.compile(
+    r"\b(CREATE|MERGE|DELETE|DETACH|SET|REMOVE|DROP|FOREACH|LOAD\s+CSV)\b"
+    r"|\bCALL\s+(dbms|db\.create|apoc\.(create|merge|refactor|periodic|load|cypher\.run))",
+    re.IGNORECASE)
+STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+# `*`, `*3`, `*2..`, `*..5`, `*1..5` inside a relationship pattern `-[...]`
+VAR_LENGTH = re.compile(r"(-\[[^\]]*?)\*\s*(\d*)\s*(\.\.\s*(\d*))?(\s*[\]{])")
+FINAL_LIMIT = re.compile(r"\bLIMIT\s+(\d+)\s*;?\s*$", re.IGNORECASE)
+
+REWRITE_PROMPT = """The following Cypher query for a Neo4j graph was rejected: {problem}
+
+Query:
+{cypher}
+
+Rewrite it to answer the same question more cheaply: connect every pattern
+(no disconnected MATCH parts), bound any variable-length path, filter as
+early as possible and return at most {limit} rows. Use only the labels,
+relationship types and properties the query already uses. Return only the
+Cypher query."""
+
+
+class CypherRejected(Exception):
+    """A generated query the guard refused to run; `str()` says why."""
+
+
+def without_strings(cypher):
+    return STRING_LITERAL.sub("''", cypher)
+
+
+def bound_paths(cypher, max_hops):
+    """Give every variable-length pattern an upper bound of at most `max_hops`."""
+    def bound(match):
+        prefix, exact, dots, upper, suffix = match.groups()
+        if dots is None:
+            lower, upper = (exact, exact) if exact else ("1", "")
+        else:
+            lower = exact or "1"
+        upper = min(int(upper), max_hops) if upper else max_hops
+        if int(lower) > upper:
+            raise CypherRejected(f"path of at least {lower} hops (at most {max_hops} allowed)")
+        return f"{prefix}*{lower}..{upper}{suffix}"
+
+    return VAR_LENGTH.sub(bound, cypher)
+
+
+def limit_rows(cypher, limit):
+    """`cypher` with its final RETURN limited to at most `limit` rows."""
+    if re.search(r"\bUNION\b", without_strings(cypher), re.IGNORECASE):
+        return cypher  # each branch would need its own limit; left to EXPLAIN
+    cypher = cypher.strip().rstrip(";").rstrip()
+    match = FINAL_LIMIT.search(cypher)
+    if match:
+        if int(match.group(1)) <= limit:
+            return cypher
+        return cypher[:match.start(1)] + str(limit)
+    tail = without_strings(cypher).upper().rsplit("RETURN", 1)
+    if len(tail) < 2 or re.search(r"\bLIMIT\b", tail[1]):
+        return cypher  # LIMIT $param, or no final RETURN to limit
+    return f"{cypher}\nLIMIT {limit}"
+
+
+def plan_problems(plan, max_rows):
+    """Problems found walking an EXPLAIN plan (a dict from the driver's summary)."""
+    problems = []
+    stack = [plan] if plan else []
+    while stack:
+        operator = stack.pop()
+        name = operator.get("operatorType", "")
+        if name.startswith("CartesianProduct"):
+            problems.append("it builds a cartesian product of disconnected patterns")
+        rows = (operator.get("args") or operator.get("arguments") or {}).get("EstimatedRows", 0)
+        if rows > max_rows:
+            problems.append(f"{name.split('@')[0]} is estimated at {rows:,.0f} rows")
+        stack.extend(operator.get("children", []))
+    return sorted(set(problems))
+
+
+def llm_rewriter(llm, limit, limiter=None):
+    """`rewrite(cypher, problem)` asking `llm` for a cheaper query, within `limiter` if given."""
+    from langchain_community.chains.graph_qa.cypher import extract_cypher
+
+    from biographrag.extraction import estimate_tokens, rate_limited
+
+    def rewrite(cypher, problem):
+        prompt = REWRITE_PROMPT.format(problem=problem, cypher=cypher, limit=limit)
+        if limiter is None:
+            message = llm.invoke(prompt)
+        else:
+            message = rate_limited(limiter, lambda: llm.invoke(prompt),
+                                   estimate_tokens(prompt) + config.QA_COMPLETION_TOKENS)
+        return extract_cypher(getattr(message, "content", message))
+
+    return rewrite
+
+
+class CypherGuard:
+    """Validates, bounds and (optionally) rewrites generated Cypher.
+
+    `check(cypher)` returns the query to run, or raises `CypherRejected`.
+    `rewrite(cypher, problem)` may be any callable returning a new query;
+    `GraphQA` passes one backed by the QA model.
+    """
+
+    def __init__(self, graph, limit=10, max_rows=None, max_hops=None, rewrite=None):
+        self.graph = graph
+        self.limit = limit
+        self.max_rows = config.GUARD_MAX_ESTIMATED_ROWS if max_rows is None else max_rows
+        self.max_hops = max_hops or config.GUARD_MAX_HOPS
+        self.rewrite = rewrite
+        self.counts = {"checked": 0, "rewritten": 0, "rejected": 0, "llm_rewrites": 0}
+
+    def explain(self, cypher):
+        """The plan of `cypher`, or None when the graph has no driver to ask."""
+        driver = getattr(self.graph, "_driver", None)
+        if driver is None:
+            return None
+        from neo4j.exceptions import ClientError
+
+        try:
+            with driver.session(database=getattr(self.graph, "_database", None)) as session:
+                return session.run(f"EXPLAIN {cypher}").consume().plan
+        except ClientError as e:
+            # Syntax and semantic errors alike; auth or transaction trouble is not the query's fault
+            if not (e.code or "").startswith(("Neo.ClientError.Statement.", "Neo.ClientError.Procedure.")):
+                raise
+            raise CypherRejected(f"invalid Cypher: {e.message}") from e
+
+    def bounded(self, cypher):
+        if WRITE_CLAUSES.search(without_strings(cypher)):
+            raise CypherRejected("it would modify the graph")
+        bounded = limit_rows(bound_paths(cypher, self.max_hops), self.limit)
+        problems = plan_problems(self.explain(bounded), self.max_rows)
+        if problems:
+            raise CypherRejected("; ".join(problems))
+        return bounded
+
+    def check(self, cypher):
+        self.counts["checked"] += 1
+        try:
+            bounded = self.bounded(cypher)
+        except CypherRejected as e:
+            if self.rewrite is None:
+                self.counts["rejected"] += 1
+                raise
+            self.counts["llm_rewrites"] += 1
+            try:
+                bounded = self.bounded(self.rewrite(cypher, str(e)))
+            except CypherRejected:
+                self.counts["rejected"] += 1
+                raise
+        if bounded != cypher.strip():
+            self.counts["rewritten"] += 1
+        return bounded
+
+    def stats(self):
+        return dict(self.counts)
@@ -0,0 +1,133 @@
+"""Incremental, per-document ingestion.
+
+Every chunk becomes a `Document` node tagged with `doc_id`, `doc_version` and
+`chunk_index`; its id is a hash of the document id and the chunk text, so an
+unchanged chunk keeps its id across revisions. Entities carry the `doc_ids`
+that mention them and relationships the `chunk_ids` they were extracted from.
+Re-ingesting a document deletes only the subgraph owned by chunks that
+disappeared and writes only chunks that are new; other documents are never
+touched.
+"""
+import hashlib
+import re
+
+from langchain_core.documents import Document
+
+from biographrag.cache import normalize_text
+from biographrag.writer import BASE_ENTITY_LABEL, BulkGraphWriter
+
+
+def document_id(name):
+    """Stable id for an uploaded file; re-uploading the same name is a new revision."""
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("_").lower() or "document"
+
+
+class DocumentHasher:
+    """Builds chunk ids and the document version one chunk at a time."""
+
+    def __init__(self, doc_id):
+        self.doc_id = doc_id
+        self.seen = {}
+        self.digest = hashlib.sha256()
+
+    def chunk_id(self, text):
+        """Content-addressed chunk id; repeated identical chunks get distinct ids."""
+        normalized = normalize_text(text)
+        self.digest.update(normalized.encode("utf-8") + b"\0")
+        base = hashlib.sha1(f"{self.doc_id}\0{normalized}".encode("utf-8")).hexdigest()
+        self.seen[base] = self.seen.get(base, 0) + 1
+        return base if self.seen[base] == 1 else f"{base}-{self.seen[base]}"
+
+    def version(self):
+        return self.digest.hexdigest()[:16]
+
+
+def chunk_document(text, chunk_id, doc_id, index, source, version=None, context=None):
+    metadata = {
+        "id": chunk_id, "source": source, "doc_id": doc_id,
+        "doc_version": version, "chunk_index": index,
+    }
+    if context:
+        metadata["context"] = context  # extraction prompt only; not part of the id
+    return Document(page_content=text, metadata=metadata)
+
+
+class IncrementalIngestor:
+    """Diffs a document's chunks against the graph and applies only the change."""
+
+    def __init__(self, graph, writer=None):
+        self.graph = graph
+        self.writer = writer or BulkGraphWriter(graph)
+
+    def ensure_indexes(self):
+        self.writer.ensure_constraints()
+        self.graph.query("CREATE INDEX document_doc_id IF NOT EXISTS "
+                         "FOR (d:Document) ON (d.doc_id)")
+
+    def existing_chunks(self, doc_id):
+        rows = self.graph.query("MATCH (c:Document {doc_id: $doc_id}) RETURN c.id AS id",
+                                {"doc_id": doc_id})
+        return {row["id"] for row in rows}
+
+    def remove_chunks(self, removed):
+        """Delete chunks and whatever graph content only they supported.
+
+        Returns the `(label, id)` of the entities the chunks mentioned, as two
+        lists: those deleted with them and those that remain.
+        """
+        if not removed:
+            return [], []
+        params = {"removed": removed}
+        # Drop the removed chunks' provenance from relationships; delete orphans
+        self.graph.query("""
+            MATCH (c:Document)-[:MENTIONS]->(n)-[r]-()
+            WHERE c.id IN $removed AND any(x IN coalesce(r.chunk_ids, []) WHERE x IN $removed)
+            WITH DISTINCT r
+            SET r.chunk_ids = [x IN r.chunk_ids WHERE NOT x IN $removed]
+            WITH r WHERE size(r.chunk_ids) = 0
+            DELETE r
+        """, params)
+        entities = [row["id"] for row in self.graph.query("""
+            MATCH (c:Document)-[:MENTIONS]->(n)
+            WHERE c.id IN $removed
+            RETURN DISTINCT elementId(n) AS id
+        """, params)]
+        self.graph.query("MATCH (c:Document) WHERE c.id IN $removed DETACH DELETE c", params)
+        # Entities no longer mentioned by any chunk go; the rest get fresh doc_ids
+        rows = self.graph.query("""
+            UNWIND $ids AS id
+            MATCH (n) WHERE elementId(n) = id
+            OPTIONAL MATCH (d:Document)-[:MENTIONS]->(n)
+            WITH n, collect(DISTINCT d.doc_id) AS doc_ids
+            WITH n, doc_ids, [l IN labels(n) WHERE l <> $base][0] AS label, n.id AS key
+            FOREACH (_ IN CASE WHEN size(doc_ids) = 0 THEN [1] ELSE [] END | DETACH DELETE n)
+            FOREACH (_ IN CASE WHEN size(doc_ids) > 0 THEN [1] ELSE [] END | SET n.doc_ids = doc_ids)
+            RETURN label, key AS id, size(doc_ids) = 0 AS deleted
+        """, {"ids": entities, "base": BASE_ENTITY_LABEL})
+        return ([(row["label"], row["id"]) for row in rows if row["deleted"]],
+                [(row["label"], row["id"]) for row in rows if not row["deleted"]])
+
+    def document_entities(self, doc_id):
+        """label -> ids of the entities this document's chunks mention."""
+        rows = self.graph.query("""
+            MATCH (:Document {doc_id: $doc_id})-[:MENTIONS]->(n)
+            UNWIND [l IN labels(n) WHERE l <> $base] AS label
+            RETURN label, collect(DISTINCT n.id) AS ids
+        """, {"doc_id": doc_id, "base": BASE_ENTITY_LABEL})
+        return {row["label"]: row["ids"] for row in rows}
+
+    def write(self, graph_documents, doc_id, aliases=None):
+        """Upsert extracted chunks, tagging entities and relationships with their provenance."""
+        return self.writer.write(graph_documents, doc_id, aliases)
+
+    def mark_current(self, chunks, version):
+        """Stamp `(chunk_id, chunk_index)` pairs with the document's current version."""
+        for start in range(0, len(chunks), self.writer.batch_size):
+            self.graph.query("""
+                UNWIND $rows AS row
+                MATCH (c:Document {id: row.id})
+                SET c.doc_version = $version, c.chunk_index = row.chunk_index
+            """, {"version": version, "rows": [
+                {"id": chunk_id, "chunk_index": index}
+                for chunk_id, index in chunks[start:start + self.writer.batch_size]
+            ]})
@@ -0,0 +1,162 @@
+"""SQLite job queue shared by the Streamlit app and ingestion workers.
+
+A job is one PDF to ingest. Workers claim jobs atomically, heartbeat while
+they run and store the pipeline's progress state, so the app only submits
+and polls. A job whose worker stopped heartbeating is claimed again; since
+ingestion is incremental, the retry skips every chunk the first attempt
+already wrote and the extraction cache covers the ones it had extracted.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from biographrag import config
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobQueue:
+    """Jobs and worker liveness in one SQLite file, safe across processes."""
+
+    def __init__(self, path=None, stale_seconds=None, max_attempts=None):
+        self.path = path or config.JOB_QUEUE_PATH
+        self.stale_seconds = stale_seconds or config.JOB_STALE_SECONDS
+        self.max_attempts = max_attempts or config.JOB_MAX_ATTEMPTS
+        self.lock = threading.RLock()  # a worker's heartbeat thread shares the connection
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, path TEXT NOT NULL,"
+            " name TEXT NOT NULL, doc_id TEXT NOT NULL, owned INTEGER NOT NULL DEFAULT 0,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, worker TEXT,"
+            " submitted REAL NOT NULL, started REAL, finished REAL, heartbeat REAL,"
+            " progress TEXT, result TEXT, error TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS workers ("
+            " id TEXT PRIMARY KEY, heartbeat REAL NOT NULL)"
+        )
+
+    def submit(self, path, name, doc_id, key=None, owned=False):
+        """Queue `path`; a queued or running job with the same `key` is reused."""
+        key = key or os.path.abspath(path)
+        with self.lock:
+            return self._submit(key, path, name, doc_id, owned)
+
+    def _submit(self, key, path, name, doc_id, owned):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT id FROM jobs WHERE key = ? AND status IN (?, ?) ORDER BY id DESC LIMIT 1",
+                (key, QUEUED, RUNNING)).fetchone()
+            if row:
+                return row["id"]
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (key, path, name, doc_id, owned, status, submitted)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, path, name, doc_id, int(owned), QUEUED, time.time()))
+            return cursor.lastrowid
+        finally:
+            self.conn.execute("COMMIT")
+
+    def claim(self, worker):
+        """Oldest queued job, or a running one whose worker went quiet; None if idle.
+
+        Jobs of a document another worker is running wait until it finishes.
+        """
+        with self.lock:
+            return self._claim(worker)
+
+    def _claim(self, worker):
+        now = time.time()
+        stale = now - self.stale_seconds
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                # Two runs of one document would each remove the chunks the other is writing
+                row = self.conn.execute(
+                    "SELECT * FROM jobs WHERE (status = ? OR (status = ? AND heartbeat < ?))"
+                    " AND NOT EXISTS (SELECT 1 FROM jobs AS other WHERE other.doc_id = jobs.doc_id"
+                    "  AND other.id != jobs.id AND other.status = ? AND other.heartbeat >= ?)"
+                    " ORDER BY id LIMIT 1",
+                    (QUEUED, RUNNING, stale, RUNNING, stale)).fetchone()
+                if row is None:
+                    return None
+                if row["attempts"] < self.max_attempts:
+                    break
+                # Out of attempts: fail it and look further, so a draining worker does not stop here
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, finished = ?, error = ? WHERE id = ?",
+                    (FAILED, now, f"gave up after {row['attempts']} attempts", row["id"]))
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1,"
+                " started = ?, heartbeat = ?, error = NULL WHERE id = ?",
+                (RUNNING, worker, now, now, row["id"]))
+            return dict(row, status=RUNNING, worker=worker, attempts=row["attempts"] + 1)
+        finally:
+            self.conn.execute("COMMIT")
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def heartbeat(self, job_id, progress=None):
+        if progress is None:
+            self._execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+        else:
+            self._execute("UPDATE jobs SET heartbeat = ?, progress = ? WHERE id = ?",
+                          (time.time(), json.dumps(progress, default=str), job_id))
+
+    def finish(self, job_id, result):
+        result = json.dumps(result, default=str)
+        self._execute("UPDATE jobs SET status = ?, finished = ?, result = ?, progress = ? WHERE id = ?",
+                      (DONE, time.time(), result, result, job_id))
+
+    def retry(self, job_id, error):
+        """Back to the queue after a failed attempt, or FAILED once attempts run out."""
+        self._execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END,"
+                      " finished = CASE WHEN attempts >= ? THEN ? END, error = ? WHERE id = ?",
+                      (self.max_attempts, FAILED, QUEUED, self.max_attempts, time.time(), error, job_id))
+
+    def get(self, job_id):
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        row = rows[0] if rows else None
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ("progress", "result"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def jobs(self, limit=50):
+        rows = self._execute("SELECT id FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+        return [self.get(row["id"]) for row in rows]
+
+    def counts(self):
+        rows = self._execute("SELECT status, count(*) AS n FROM jobs GROUP BY status")
+        return {row["status"]: row["n"] for row in rows}
+
+    def worker_alive(self, worker):
+        self._execute("INSERT OR REPLACE INTO workers (id, heartbeat) VALUES (?, ?)",
+                      (worker, time.time()))
+
+    def live_workers(self):
+        rows = self._execute("SELECT id FROM workers WHERE heartbeat >= ?",
+                             (time.time() - self.stale_seconds,))
+        return [row["id"] for row in rows]
+
+    def close(self):
+        self.conn.close()
+
+
+def worker_name(slot=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{slot}"
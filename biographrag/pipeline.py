@@ -0,0 +1,283 @@
+"""Streaming PDF ingestion: parse -> chunk -> extract -> write -> embed.
+
+Pages are read lazily on a producer thread and split one page at a time into
+a bounded queue; `ChunkExtractor.iter_extract` keeps a bounded window of LLM
+calls in flight; extracted chunks are written every `write_every` chunks.
+The stages overlap, the first nodes reach Neo4j after the first batch rather
+than after the last LLM call, and memory stays flat as documents grow.
+"""
+import queue
+import threading
+import time
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_experimental.graph_transformers import LLMGraphTransformer
+from pypdf import PdfReader
+
+from biographrag import config, tracing
+from biographrag.cache import ExtractionCache, transformer_settings
+from biographrag.chunking import make_splitter
+from biographrag.ann import VectorIndex
+from biographrag.embeddings import EntityEmbedder, embedding_model_name
+from biographrag.extraction import ChunkExtractor, RateLimiter
+from biographrag.ingest import DocumentHasher, IncrementalIngestor, chunk_document
+from biographrag.resolution import EntityResolver
+from biographrag.schema import empty_schema, merge
+from biographrag.summaries import NeighbourhoodSummarizer
+
+_DONE = object()
+
+
+def page_count(path):
+    return len(PdfReader(path).pages)
+
+
+def iter_chunk_texts(pages, splitter):
+    """(text, context header) of each non-empty chunk; the header may be empty."""
+    for page in pages:
+        for chunk in splitter.split_documents([page]):
+            text = chunk.page_content.replace("\n", "")
+            if text.strip():
+                yield text, chunk.metadata.get("context", "")
+
+
+class StreamingIngestion:
+    """Runs one PDF through the pipeline with bounded buffers between stages.
+
+    `progress(state)` is called on the caller's thread with the running
+    counters in `state` (pages, chunks seen/extracted/written, ...).
+    When a `SchemaService` is given, what the run wrote is merged into it.
+    With an `EntityResolver`, extracted names are mapped to canonical
+    entities before each write; with a `NeighbourhoodSummarizer`, the
+    summaries around what the run wrote or removed are refreshed last.
+    """
+
+    def __init__(self, ingestor, extractor, embedder=None, splitter=None,
+                 queue_size=None, write_every=None, schema=None, resolver=None, summarizer=None):
+        self.ingestor = ingestor
+        self.extractor = extractor
+        self.embedder = embedder
+        self.summarizer = summarizer
+        self.schema = schema
+        self.resolver = resolver
+        self.splitter = splitter or make_splitter()
+        self.queue_size = queue_size or config.STREAM_QUEUE_SIZE
+        self.write_every = write_every or config.STREAM_WRITE_EVERY
+
+    def _produce(self, path, pages, chunks, stop, parent):
+        def put(item):
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            loader = PyPDFLoader(path).lazy_load()
+            for _ in range(pages):
+                # Spans end before the hand-off, so queue back-pressure is not counted
+                with tracing.span("ingest.page", parent=parent) as span:
+                    started = time.perf_counter()
+                    page = next(loader, None)
+                    span.set(parse_seconds=time.perf_counter() - started)
+                    texts = list(iter_chunk_texts([page], self.splitter)) if page else []
+                    span.set(chunks=len(texts))
+                if page is None:
+                    break
+                for chunk in texts:
+                    if not put(("chunk", chunk)):
+                        return
+                if not put(("page", None)):
+                    return
+            put((_DONE, None))
+        except BaseException as e:
+            put(("error", e))
+
+    def run(self, path, doc_id, source, progress=None, resume=False):
+        """Ingest one PDF.
+
+        `resume=True` is for retrying an interrupted run: entities of chunks
+        the earlier attempt already wrote are checked for embeddings too,
+        since that attempt may have stopped before embedding them.
+        The returned state carries a per-stage summary of the run's trace.
+        """
+        with tracing.span("ingest", doc_id=doc_id, source=source, resume=resume) as root:
+            state = self._run(path, doc_id, source, progress, resume, root)
+            state["trace_id"] = root.trace_id
+            state["trace"] = tracing.summarize(root.finished)
+            return state
+
+    def _run(self, path, doc_id, source, progress, resume, root):
+        state = {"pages": page_count(path), "pages_done": 0, "chunks": 0, "new": 0,
+                 "kept": 0, "removed": 0, "extracted": 0, "written": 0,
+                 "nodes": 0, "relationships": 0, "write_seconds": 0.0, "write_batches": 0}
+
+        def report():
+            if progress:
+                progress(state)
+
+        if hasattr(self.splitter, "reset"):
+            self.splitter.reset()  # entity carry-over must not leak between documents
+        if self.resolver is not None:
+            self.resolver.reset()
+        self.ingestor.ensure_indexes()
+        existing = self.ingestor.existing_chunks(doc_id)
+        hasher = DocumentHasher(doc_id)
+        seen = []
+        touched = {}
+        written = []  # (chunk id, text) for the local vector index
+        delta = empty_schema()
+        chunks = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(path, state["pages"], chunks, stop, root),
+                                    daemon=True)
+
+        def new_chunks():
+            while True:
+                kind, value = chunks.get()
+                if kind is _DONE:
+                    return
+                if kind == "error":
+                    raise value
+                if kind == "page":
+                    state["pages_done"] += 1
+                    report()
+                    continue
+                text, context = value
+                chunk_id = hasher.chunk_id(text)
+                seen.append((chunk_id, len(seen)))
+                state["chunks"] += 1
+                if chunk_id in existing:
+                    state["kept"] += 1
+                    continue
+                state["new"] += 1
+                yield chunk_document(text, chunk_id, doc_id, len(seen) - 1, source, context=context)
+
+        def flush(buffer):
+            if not buffer:
+                return
+            aliases = None
+            if self.resolver is not None:
+                with tracing.span("ingest.resolve", chunks=len(buffer)) as span:
+                    merged = self.resolver.stats["merged"]
+                    buffer[:] = self.resolver.resolve(buffer)
+                    aliases = self.resolver.aliases
+                    span.set(merged=self.resolver.stats["merged"] - merged)
+            with tracing.span("ingest.write", chunks=len(buffer)) as span:
+                stats = self.ingestor.write(buffer, doc_id, aliases)
+            if self.resolver is not None:
+                self.resolver.store_keys()  # later batches and documents find these entities
+                span.set(nodes=stats["nodes"], relationships=stats["relationships"],
+                         batches=stats["batches"])
+            written.extend((gd.source.metadata["id"], gd.source.page_content)
+                           for gd in buffer if gd.source.metadata.get("id"))
+            for label, ids in self.ingestor.writer.touched.items():
+                touched.setdefault(label, set()).update(ids)
+            merge(delta, self.ingestor.writer.schema_delta)
+            state["written"] += len(buffer)
+            state["nodes"] += stats["nodes"]
+            state["relationships"] += stats["relationships"]
+            state["write_seconds"] += stats["seconds"]
+            state["write_batches"] += stats["batches"]
+            buffer.clear()
+            report()
+
+        producer.start()
+        buffer = []
+        try:
+            for graph_document in self.extractor.iter_extract(new_chunks()):
+                buffer.append(graph_document)
+                state["extracted"] += 1
+                if len(buffer) >= self.write_every:
+                    flush(buffer)
+                else:
+                    report()
+            flush(buffer)
+        finally:
+            stop.set()
+            producer.join()
+
+        # Only now do we know which of the stored chunks disappeared
+        removed = sorted(existing - {chunk_id for chunk_id, _ in seen})
+        state["removed"] = len(removed)
+        state["version"] = hasher.version()
+        with tracing.span("ingest.finalize", removed=len(removed), chunks=len(seen)):
+            deleted, kept = self.ingestor.remove_chunks(removed)
+            self.ingestor.mark_current(seen, state["version"])
+        if resume:
+            for label, ids in self.ingestor.document_entities(doc_id).items():
+                touched.setdefault(label, set()).update(ids)
+        if self.resolver is not None:
+            state["resolution"] = dict(self.resolver.stats)
+        if self.schema is not None:
+            with tracing.span("ingest.schema"):
+                self.schema.update(delta)
+            state["schema_version"] = self.schema.version
+        if self.embedder is not None:
+            with tracing.span("ingest.embed") as span:
+                state["embedding"] = self.embedder.run(
+                    touched={label: sorted(ids) for label, ids in touched.items()},
+                    chunks=written, removed=removed, deleted=deleted)
+                span.set(**{key: value for key, value in state["embedding"].items()
+                            if isinstance(value, (int, float))})
+        if self.summarizer is not None:
+            # Entities that lost facts with the removed chunks need new summaries too
+            changed = {label: set(ids) for label, ids in touched.items()}
+            for label, key in kept:
+                changed.setdefault(label, set()).add(key)
+            with tracing.span("ingest.summaries") as span:
+                state["summaries"] = dict(self.summarizer.refresh(
+                    touched={label: sorted(ids) for label, ids in changed.items()}))
+                span.set(**state["summaries"])
+        report()
+        return state
+
+    def close(self):
+        if self.extractor.cache is not None:
+            self.extractor.cache.close()
+        if self.embedder is not None:
+            self.embedder.store.close()
+            if self.embedder.index is not None:
+                self.embedder.index.close()
+
+
+def build_ingestion(graph, llm, embeddings, allowed_nodes=None, allowed_relationships=None,
+                    schema=None, workers=1):
+    """The app's ingestion pipeline: cached, rate-limited extraction into Neo4j.
+
+    `workers` is the number of processes running pipelines at once; each
+    gets an equal share of the provider's RPM/TPM limits.
+    """
+    allowed_nodes = allowed_nodes or config.ALLOWED_NODES
+    allowed_relationships = allowed_relationships or config.ALLOWED_RELATIONSHIPS
+    index = VectorIndex(model=embedding_model_name(embeddings)) if config.ANN_ENABLED else None
+    properties = dict(
+        node_properties=True,  # Capture quantitative data: dosages, dates, test values
+        relationship_properties=True  # Capture relationship metadata
+    )
+    transformer = LLMGraphTransformer(
+        llm=llm,
+        allowed_nodes=allowed_nodes,
+        allowed_relationships=allowed_relationships,
+        **properties
+    )
+    # 0 keeps a limit disabled
+    rpm, tpm = (limit and max(1, limit // workers) for limit in (config.GROQ_RPM, config.GROQ_TPM))
+    # Chunks already extracted with the same model, schema and prompt are served from disk
+    cache = ExtractionCache(
+        model=getattr(llm, "model_name", config.LLM_MODEL),
+        temperature=getattr(llm, "temperature", config.LLM_TEMPERATURE),
+        allowed_nodes=allowed_nodes,
+        allowed_relationships=allowed_relationships,
+        settings=transformer_settings(transformer, **properties),
+    )
+    return StreamingIngestion(
+        ingestor=IncrementalIngestor(graph),
+        extractor=ChunkExtractor(transformer, cache=cache, limiter=RateLimiter(rpm, tpm)),
+        embedder=EntityEmbedder(graph, embeddings, labels=allowed_nodes, index=index),
+        schema=schema,
+        resolver=EntityResolver(graph, labels=allowed_nodes) if config.RESOLUTION_ENABLED else None,
+        summarizer=NeighbourhoodSummarizer(graph, labels=allowed_nodes) if config.SUMMARIES_ENABLED else None,
+    )
@@ -0,0 +1,464 @@
+"""Question answering over the graph with a question -> Cypher cache.
+
+`GraphQA` runs the same two steps as `GraphCypherQAChain` (generate Cypher,
+then answer from the query results) but looks the question up first: an
+exact hit on the normalised question, or a semantic hit on the nearest
+previously asked question above a cosine threshold, skips Cypher generation
+entirely. Entries are keyed by a generation version (schema, Cypher prompt
+and model), so they stop matching as soon as ingestion changes the schema.
+With a `SchemaService`, each generation prompt carries only the part of the
+schema the question is about, and a `QueryRouter` answers the common
+question shapes from precompiled templates before any generation. Generated
+Cypher passes a `CypherGuard` before it runs, and every query runs under
+a transaction timeout. When no query finds anything, a `SummaryRetriever`
+supplies the precomputed neighbourhoods of the entities the question is
+about, and failing that a `GraphRetriever` context from the local vector
+index.
+"""
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import string
+import threading
+import time
+from array import array
+
+from langchain_community.chains.graph_qa.cypher import GraphCypherQAChain, extract_cypher
+from langchain_core.prompts import PromptTemplate
+
+from biographrag import config, tracing
+from biographrag.ann import GraphRetriever, VectorIndex
+from biographrag.embeddings import EmbeddingStore, embedding_model_name, text_hash
+from biographrag.extraction import estimate_tokens, rate_limited
+from biographrag.guard import CypherGuard, CypherRejected, llm_rewriter
+
+# Numbers, quoted strings and mid-sentence capitalised words end up as Cypher
+# literals; two questions that differ in any of them never share a query
+LITERAL = re.compile(r"\"[^\"]+\"|'[^']+'|\b\d[\d.,/-]*\b|(?<=\s)[A-Z][\w-]*")
+
+
+# Prompts used by the app and batch runs
+CYPHER_TEMPLATE = """
+            Task: Generate a Cypher query to retrieve information from a Neo4j graph database.
+
+            Use ONLY the provided schema and relationship types.
+
+            Schema:
+            {schema}
+
+            Instructions:
+            1. Generate syntactically correct Cypher queries
+            2. Use only node labels and relationship types from the schema
+            3. For questions about entities, use MATCH patterns to find them
+            4. Use RETURN to specify what information to retrieve
+            5. Keep queries simple and focused
+
+            Examples:
+            - "What medications?" → MATCH (p:Patient)-[:TAKES_MEDICATION]->(m:Medication) RETURN m.id
+            - "What diseases?" → MATCH (d:Disease) RETURN d.id
+            - "What symptoms?" → MATCH (s:Symptom) RETURN s.id
+
+            Question: {question}
+
+            Cypher Query:"""
+
+ANSWER_TEMPLATE = """Based on the question and database results, provide a natural, conversational answer.
+
+Question: {question}
+Database Results: {context}
+
+Instructions:
+1. Write in a natural, conversational tone
+2. If results show medications/diseases/symptoms, explain them clearly
+3. Provide context and relevant details from the data
+4. If no results, say "I couldn't find that information in the document"
+5. Keep it concise but informative
+
+Answer:"""
+
+
+def normalize_question(question):
+    question = question.lower().translate(str.maketrans("", "", string.punctuation.replace("'", "")))
+    return re.sub(r"\s+", " ", question).strip()
+
+
+def question_literals(question):
+    return sorted({match.group(0).strip("\"'").lower() for match in LITERAL.finditer(question)})
+
+
+def output_text(result, key="text"):
+    """Text from an LLMChain dict, a chat message or a plain string."""
+    if isinstance(result, dict):
+        result = result.get(key, result.get("text"))
+    return getattr(result, "content", result)
+
+
+def generation_version(schema, prompt, model):
+    payload = f"{model}\0{prompt}\0{schema}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def unit(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return array("f", (x / norm for x in vector))
+
+
+class CypherCache:
+    """SQLite store of generated Cypher with exact and nearest-neighbour lookup.
+
+    Only entries for the current `version` are loaded. Rows of other versions
+    are left alone, since other engines and processes may still use them; at
+    most `max_entries` rows are kept across all versions, the least recently
+    used going first, so versions nobody uses any more age out.
+    """
+
+    def __init__(self, version, embeddings=None, store=None, path=None,
+                 threshold=None, max_entries=None):
+        self.version = version
+        self.embeddings = embeddings
+        self.store = store
+        self.path = path or config.CYPHER_CACHE_PATH
+        self.threshold = config.CYPHER_CACHE_SIMILARITY if threshold is None else threshold
+        self.max_entries = max_entries or config.CYPHER_CACHE_MAX_ENTRIES
+        self.lock = threading.Lock()
+        self.counts = {"lookups": 0, "exact": 0, "semantic": 0, "misses": 0,
+                       "saved_seconds": 0.0, "generation_seconds": 0.0}
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cypher ("
+            " version TEXT NOT NULL, question TEXT NOT NULL, literals TEXT NOT NULL,"
+            " cypher TEXT NOT NULL, vector BLOB, seconds REAL NOT NULL,"
+            " hits INTEGER NOT NULL DEFAULT 0, last_used REAL NOT NULL,"
+            " PRIMARY KEY (version, question))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cypher_lru ON cypher (last_used)")
+        self.conn.commit()
+        self.entries = {}  # normalised question -> (literals, cypher, unit vector, seconds)
+        for question, literals, cypher, vector, seconds in self.conn.execute(
+                "SELECT question, literals, cypher, vector, seconds FROM cypher WHERE version = ?",
+                (version,)):
+            self.entries[question] = (literals, cypher, array("f", vector) if vector else None, seconds)
+
+    def embed(self, text):
+        if self.embeddings is None:
+            return None
+        if self.store is not None:
+            key = text_hash(text)
+            known = self.store.get_many([key])
+            if key in known:
+                return unit(known[key])
+            vector = self.embeddings.embed_query(text)
+            self.store.put_many([(key, vector)])
+            return unit(vector)
+        return unit(self.embeddings.embed_query(text))
+
+    def lookup(self, question):
+        """(cypher, kind, query vector, matched question); kind is "exact", "semantic" or None."""
+        normalized = normalize_question(question)
+        self.counts["lookups"] += 1
+        entry = (normalized, self.entries[normalized]) if normalized in self.entries else None
+        vector = None
+        kind = "exact" if entry else None
+        if entry is None and self.threshold < 1:
+            vector = self.embed(normalized)
+            entry = self.nearest(vector, ",".join(question_literals(question)))
+            kind = "semantic" if entry else None
+        if entry is None:
+            self.counts["misses"] += 1
+            return None, None, vector, None
+        match, (_, cypher, _, seconds) = entry
+        self.counts[kind] += 1
+        self.counts["saved_seconds"] += seconds
+        with self.lock:
+            self.conn.execute(
+                "UPDATE cypher SET hits = hits + 1, last_used = ? WHERE version = ? AND question = ?",
+                (time.time(), self.version, match))
+            self.conn.commit()
+        return cypher, kind, vector, match
+
+    def nearest(self, vector, literals):
+        if vector is None:
+            return None
+        best, best_score = None, self.threshold
+        for question, entry in list(self.entries.items()):  # put() may run in another thread
+            if entry[2] is None or entry[0] != literals:
+                continue
+            score = sum(a * b for a, b in zip(vector, entry[2]))
+            if score >= best_score:
+                best, best_score = (question, entry), score
+        return best
+
+    def put(self, question, cypher, seconds, vector=None):
+        normalized = normalize_question(question)
+        literals = ",".join(question_literals(question))
+        if vector is None and self.threshold < 1:
+            vector = self.embed(normalized)
+        self.entries[normalized] = (literals, cypher, vector, seconds)
+        self.counts["generation_seconds"] += seconds
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cypher (version, question, literals, cypher, vector, seconds, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.version, normalized, literals, cypher,
+                 vector.tobytes() if vector is not None else None, seconds, time.time()))
+            self._evict()
+            self.conn.commit()
+
+    def discard(self, normalized, kind):
+        """Drop an entry whose query failed; the lookup that returned it counts as a miss."""
+        entry = self.entries.pop(normalized, None)
+        if entry is not None:
+            self.counts[kind] -= 1
+            self.counts["misses"] += 1
+            self.counts["saved_seconds"] -= entry[3]
+        with self.lock:
+            self.conn.execute("DELETE FROM cypher WHERE version = ? AND question = ?",
+                              (self.version, normalized))
+            self.conn.commit()
+
+    def _evict(self):
+        extra = self.conn.execute("SELECT COUNT(*) FROM cypher").fetchone()[0] - self.max_entries
+        if extra <= 0:
+            return
+        rows = self.conn.execute(
+            "SELECT version, question FROM cypher ORDER BY last_used LIMIT ?", (extra,)).fetchall()
+        self.conn.executemany("DELETE FROM cypher WHERE version = ? AND question = ?", rows)
+        for version, question in rows:
+            if version == self.version:
+                self.entries.pop(question, None)
+
+    def stats(self):
+        hits = self.counts["exact"] + self.counts["semantic"]
+        return {**self.counts, "hits": hits, "entries": len(self.entries),
+                "hit_rate": hits / self.counts["lookups"] if self.counts["lookups"] else 0.0}
+
+    def close(self):
+        self.conn.close()
+
+
+def clear_cypher_cache(path=None):
+    """Delete the cached queries of every version, once the graph they ran against is gone."""
+    path = path or config.CYPHER_CACHE_PATH
+    if not os.path.exists(path):
+        return
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("DELETE FROM cypher")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class GraphQA:
+    """`GraphCypherQAChain` with Cypher generation served from `CypherCache`.
+
+    `invoke({"query": ...})` returns the chain's output shape (`result` and
+    `intermediate_steps` with the query and its context) plus `cypher_cache`,
+    one of "exact", "semantic" or "miss", `route`, the template that answered
+    (None when the LLM wrote the query), `guard`, why the guard refused the
+    generated query (None when it ran), `summaries` and `retrieved`, how
+    many context rows came from entity summaries and from vector retrieval,
+    and `trace`, the question's spans.
+    Generated queries are only cached once they passed the guard, ran and
+    returned rows, so a bad generation is not pinned. With a `limiter`
+    (`extraction.RateLimiter`) every LLM call waits for its budget and backs
+    off on 429s.
+    """
+
+    def __init__(self, chain, cache, schema=None, router=None, guard=None, timeout=None,
+                 retriever=None, summaries=None, limiter=None):
+        self.chain = chain
+        self.cache = cache
+        self.schema = schema
+        self.router = router
+        self.guard = guard
+        self.retriever = retriever
+        self.summaries = summaries
+        self.limiter = limiter
+        self.timeout = config.GUARD_TIMEOUT_SECONDS if timeout is None else timeout
+
+    @classmethod
+    def from_chain(cls, chain, llm=None, embeddings=None, schema=None, limiter=None, **cache_options):
+        model = getattr(llm, "model_name", None) or config.LLM_MODEL
+        prompt = getattr(getattr(chain.cypher_generation_chain, "prompt", None), "template", "")
+        schema_text = schema.text() if schema is not None else chain.graph_schema
+        version = generation_version(schema_text, prompt, model)
+        store = None
+        if embeddings is not None:
+            store = EmbeddingStore(model=embedding_model_name(embeddings))
+        cache = CypherCache(version, embeddings, store, **cache_options)
+        router = None
+        if schema is not None and config.ROUTER_ENABLED:
+            from biographrag.router import QueryRouter  # router imports this module
+
+            router = QueryRouter(schema, embed=cache.embed, limit=chain.top_k)
+        guard = None
+        if config.GUARD_ENABLED:
+            rewrite = (llm_rewriter(llm, chain.top_k, limiter)
+                       if llm is not None and config.GUARD_LLM_REWRITE else None)
+            guard = CypherGuard(chain.graph, limit=chain.top_k, rewrite=rewrite)
+        retriever = None
+        if embeddings is not None and config.ANN_ENABLED:
+            index = VectorIndex(model=embedding_model_name(embeddings))
+            retriever = GraphRetriever(index, chain.graph)
+        summaries = None
+        if config.SUMMARIES_ENABLED:
+            from biographrag.summaries import SummaryRetriever  # summaries imports this module
+
+            summaries = SummaryRetriever(chain.graph, index=retriever.index if retriever is not None else None)
+        return cls(chain, cache, schema, router, guard, retriever=retriever, summaries=summaries,
+                   limiter=limiter)
+
+    def call_llm(self, llm_chain, args):
+        """`llm_chain.invoke(args)`, within the rate limiter when there is one."""
+        if self.limiter is None:
+            return llm_chain.invoke(args)
+        template = getattr(getattr(llm_chain, "prompt", None), "template", "")
+        tokens = estimate_tokens(template + "".join(str(value) for value in args.values()))
+        return rate_limited(self.limiter, lambda: llm_chain.invoke(args), tokens + config.QA_COMPLETION_TOKENS)
+
+    def generate_cypher(self, question):
+        schema = (self.schema.prompt_schema(question) if self.schema is not None
+                  else self.chain.graph_schema)
+        args = {"question": question, "schema": schema}
+        cypher = extract_cypher(output_text(self.call_llm(self.chain.cypher_generation_chain, args)))
+        corrector = getattr(self.chain, "cypher_query_corrector", None)
+        return corrector(cypher) if corrector else cypher
+
+    def answer(self, question, context):
+        qa_chain = self.chain.qa_chain
+        result = self.call_llm(qa_chain, {"question": question, "context": context})
+        return output_text(result, getattr(qa_chain, "output_key", "text"))
+
+    def query(self, cypher, params=None):
+        with tracing.span("qa.query"):
+            return self.execute(cypher, params)[:self.chain.top_k]
+
+    def execute(self, cypher, params=None):
+        return tracing.profiled_query(self.chain.graph, cypher, params, timeout=self.timeout)
+
+    def check(self, cypher):
+        """(query to run, None) or (the generated query, why the guard refused it)."""
+        with tracing.span("qa.guard") as span:
+            try:
+                return self.guard.check(cypher), None
+            except CypherRejected as e:
+                span.set(rejected=str(e))
+                return cypher, str(e)
+
+    def route(self, question, vector):
+        """(template, cypher, params, rows) when a template answers the question."""
+        if self.router is None:
+            return None
+        with tracing.span("qa.route") as span:
+            routed = self.router.route(question, vector)
+            span.set(template=routed[0] if routed else "none")
+        if routed is None:
+            return None
+        name, cypher, params = routed
+        context = self.query(cypher, params)
+        if not context:
+            self.router.empty()  # maybe not the shape it looked like; let the LLM try
+            return None
+        return name, cypher, params, context
+
+    def invoke(self, inputs):
+        question = inputs["query"]
+        with tracing.span("qa", question=question) as root:
+            with tracing.span("qa.cache_lookup") as span:
+                cypher, kind, vector, match = self.cache.lookup(question)
+                span.set(hit=kind or "miss")
+            context = None
+            route, params = None, None
+            if cypher is not None:
+                try:
+                    context = self.query(cypher)
+                except Exception:
+                    # The graph moved under a cached query; fall back to generating one
+                    self.cache.discard(match, kind)
+                    cypher, kind = None, None
+            if cypher is None:
+                routed = self.route(question, vector)
+                if routed is not None:
+                    route, cypher, params, context = routed
+            rejected = None
+            if cypher is None:
+                started = time.perf_counter()
+                with tracing.span("qa.cypher_generation"):
+                    cypher = self.generate_cypher(question)
+                    if cypher and self.guard is not None:
+                        cypher, rejected = self.check(cypher)
+                seconds = time.perf_counter() - started
+                try:
+                    context = self.query(cypher) if cypher and not rejected else []
+                except Exception as e:
+                    if "TimedOut" not in (getattr(e, "code", None) or ""):
+                        raise
+                    rejected = f"it ran for more than {self.timeout:g}s"
+                if context:
+                    self.cache.put(question, cypher, seconds, vector)
+            summarized, retrieved = None, None
+            summarize = self.summaries is not None and (not context or config.SUMMARY_EXTRA_CONTEXT)
+            if vector is None and (summarize or (not context and self.retriever is not None)):
+                vector = self.cache.embed(normalize_question(question))
+            if summarize:
+                with tracing.span("qa.summaries") as span:
+                    facts = self.summaries.retrieve(question, vector)
+                    summarized = len(facts)
+                    span.set(rows=summarized)
+                context = (context or []) + facts
+            if not context and self.retriever is not None and vector is not None:
+                with tracing.span("qa.retrieve") as span:
+                    context = self.retriever.retrieve(vector)
+                    retrieved = len(context)
+                    span.set(rows=retrieved)
+            if rejected and not (summarized or retrieved):
+                result = (f"I couldn't run a query for that question safely ({rejected}). "
+                          "Try a narrower question.")
+            else:
+                with tracing.span("qa.answer"):
+                    result = self.answer(question, context)
+            root.set(cypher_cache=kind or "miss", route=route or "llm", guard=rejected or "ok")
+        step = {"query": cypher, "params": params} if params else {"query": cypher}
+        return {
+            "query": question,
+            "result": result,
+            "intermediate_steps": [step, {"context": context}],
+            "cypher_cache": kind or "miss",
+            "route": route,
+            "guard": rejected,
+            "summaries": summarized,
+            "retrieved": retrieved,
+            "trace": [span.to_dict() for span in root.finished],
+        }
+
+    def close(self):
+        self.cache.close()
+        if self.retriever is not None:
+            self.retriever.index.close()
+        if self.cache.store is not None:
+            self.cache.store.close()
+
+
+def build_qa(llm, embeddings, graph, schema=None, top_k=10, limiter=None):
+    """`GraphQA` over `graph` with the app's prompts, as the app and batch runs use it.
+
+    `limiter` should be the process's shared one (`resources.rate_limiter()`).
+    """
+    chain = GraphCypherQAChain.from_llm(
+        llm=llm,
+        graph=graph,
+        cypher_prompt=PromptTemplate(template=CYPHER_TEMPLATE, input_variables=["schema", "question"]),
+        qa_prompt=PromptTemplate(template=ANSWER_TEMPLATE, input_variables=["question", "context"]),
+        verbose=True,
+        return_intermediate_steps=True,
+        allow_dangerous_requests=True,
+        top_k=top_k
+    )
+    # Repeat questions reuse their Cypher until the schema changes
+    return GraphQA.from_chain(chain, llm=llm, embeddings=embeddings, schema=schema, limiter=limiter)
@@ -0,0 +1,302 @@
+"""Entity resolution between extraction and the graph write.
+
+The LLM names one entity many ways ("Metformin", "metformin 500mg",
+"Metformin HCl"), and the writer merges on the raw `id`. `EntityResolver`
+maps every extracted name to a canonical id per label before the write:
+
+- names are normalised (case, punctuation, plurals; strengths, dosage forms
+  and salts for medications) and equal keys are the same entity;
+- otherwise candidates come from a character-trigram blocking index, so a
+  name is only compared with the few keys sharing rare trigrams, and the
+  closest one at or above `RESOLUTION_SIMILARITY` (trigram Jaccard, same
+  numbers) is the same entity;
+- the first name seen for an entity is its canonical id, and entities
+  already in the graph always are.
+
+Each label's keys form a union-find forest. The alternative names end up in
+the node's `aliases` list, and every entity stores the keys it was known by
+(`resolution_keys`) and their trigrams (`resolution_grams`) behind the
+`entity_resolution` fulltext index. Each batch only loads, from that index,
+the stored entities sharing the most trigrams with its new names, so later
+documents (and other workers) resolve against what is already stored at a
+cost that does not grow with the graph.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+
+from biographrag import config
+from biographrag.schema import missing_index
+from biographrag.writer import BASE_ENTITY_LABEL, clean_label
+
+RESOLUTION_INDEX = "entity_resolution"
+
+# Stored entities sharing the most trigrams with each new name; rare trigrams weigh most
+CANDIDATES_QUERY = """
+UNWIND $lookups AS lookup
+CALL db.index.fulltext.queryNodes($index, lookup.terms, {limit: $limit})
+YIELD node
+WHERE lookup.label IN labels(node)
+RETURN DISTINCT lookup.label AS label, node.id AS id, node.aliases AS aliases
+"""
+
+KEYS_QUERY = """
+UNWIND $rows AS row
+MATCH (n:`{label}` {{id: row.id}})
+WITH n, row, [key IN row.keys WHERE NOT key IN coalesce(n.resolution_keys, [])] AS new
+WHERE size(new) > 0 OR n.resolution_grams IS NULL
+SET n.resolution_keys = coalesce(n.resolution_keys, []) + new,
+    n.resolution_grams = trim(coalesce(n.resolution_grams, '') + ' ' + row.grams)
+"""
+
+# Medication names carry strengths, dosage forms and salts that do not change the drug
+STRENGTH = re.compile(r"\b\d+(?:\.\d+)?\s*(?:mg|mcg|µg|g|ml|units?|iu|%)(?:\s*/\s*(?:ml|dose|day|kg))?\b")
+DOSAGE_WORDS = {"tablet", "tablets", "tab", "tabs", "capsule", "capsules", "cap", "caps", "oral",
+                "injection", "solution", "suspension", "er", "xr", "sr", "ir", "dr", "la",
+                "hcl", "hydrochloride", "besylate", "mesylate", "maleate", "tartrate",
+                "succinate", "fumarate", "daily", "bid", "tid", "qd", "po"}
+STOPWORDS = {"the", "a", "an", "of"}
+
+
+def singular(word):
+    if len(word) > 4 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def normalize_name(name, label=None):
+    """Comparison key of an entity name; "" when nothing meaningful is left."""
+    text = unicodedata.normalize("NFKC", str(name)).lower()
+    if label == "Medication":
+        text = STRENGTH.sub(" ", text)
+    words = [singular(word) for word in re.findall(r"[^\W_]+", text) if word not in STOPWORDS]
+    if label == "Medication":
+        # Keep the name itself when it is nothing but such words ("oral solution")
+        words = [word for word in words if word not in DOSAGE_WORDS] or words
+    return " ".join(words)
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def gram_terms(keys):
+    """Index terms for the trigrams of `keys` (spaces as `_`, so each trigram is one token)."""
+    return " ".join(sorted({gram.replace(" ", "_") for key in keys for gram in trigrams(key)}))
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+class LabelIndex:
+    """Keys of one label: union-find over keys, canonical ids and a trigram blocking index."""
+
+    def __init__(self, max_block=None):
+        self.parent = {}
+        self.canonical = {}  # root key -> canonical id
+        self.grams = {}  # key -> trigram set
+        self.blocks = defaultdict(set)  # trigram -> keys
+        self.max_block = max_block or config.RESOLUTION_MAX_BLOCK
+
+    def find(self, key):
+        root = key
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[key] != root:  # path compression
+            self.parent[key], key = root, self.parent[key]
+        return root
+
+    def union(self, key, other):
+        """Attach `key`'s tree under `other`'s root, keeping `other`'s canonical id."""
+        root, other_root = self.find(key), self.find(other)
+        if root != other_root:
+            self.parent[root] = other_root
+            self.canonical.pop(root, None)
+        return other_root
+
+    def add(self, key, canonical_id):
+        if key in self.parent:
+            return self.find(key)
+        self.parent[key] = key
+        self.canonical[key] = canonical_id
+        self.grams[key] = trigrams(key)
+        for gram in self.grams[key]:
+            self.blocks[gram].add(key)
+        return key
+
+    def candidates(self, key):
+        """Keys sharing a trigram with `key`, skipping trigrams too common to discriminate."""
+        found = set()
+        for gram in trigrams(key):
+            block = self.blocks.get(gram)
+            if block and len(block) <= self.max_block:
+                found |= block
+        return found
+
+
+class EntityResolver:
+    """Rewrites GraphDocuments onto canonical entity ids.
+
+    `resolve(graph_documents)` returns new documents whose nodes and
+    relationship endpoints use canonical ids (duplicate nodes merged,
+    relationships that collapse onto one node dropped); the names it mapped
+    away are left in `aliases`, `(label, canonical id) -> names`, for the
+    writer to store.
+    """
+
+    def __init__(self, graph=None, threshold=None, labels=None, candidates=None):
+        self.graph = graph
+        self.threshold = config.RESOLUTION_SIMILARITY if threshold is None else threshold
+        self.labels = set(labels or config.ALLOWED_NODES)
+        self.candidates = candidates or config.RESOLUTION_CANDIDATES
+        self.indexes = {}
+        self.looked_up = set()  # (label, key) already fetched from the graph
+        self.keys = {}  # (label, canonical id) -> keys to store once written
+        self.aliases = {}
+        self.prepared = False
+        self.stats = {"names": 0, "merged": 0, "comparisons": 0, "loaded": 0}
+
+    def reset(self):
+        """Forget loaded entities so the next run sees entities other writers added."""
+        self.indexes = {}
+        self.looked_up = set()
+        self.keys = {}
+        if self.graph is not None and not self.prepared:
+            self.prepare()
+
+    def prepare(self):
+        """Create the trigram index and, once per process, key entities stored without one."""
+        self.graph.query(
+            f"CREATE FULLTEXT INDEX `{RESOLUTION_INDEX}` IF NOT EXISTS "
+            f"FOR (n:`{BASE_ENTITY_LABEL}`) ON EACH [n.resolution_grams] "
+            "OPTIONS {indexConfig: {`fulltext.analyzer`: 'whitespace'}}")
+        # Entities written before this index existed, or with resolution switched off
+        for label in self.labels:
+            label = clean_label(label)
+            for row in self.graph.query(f"MATCH (n:`{label}`) WHERE n.resolution_grams IS NULL "
+                                        "RETURN n.id AS id, n.aliases AS aliases"):
+                for name in [row["id"]] + (row["aliases"] or []):
+                    key = normalize_name(name, label)
+                    if key:
+                        self.keys.setdefault((label, row["id"]), set()).add(key)
+        self.store_keys()
+        self.prepared = True
+
+    def index(self, label):
+        if label not in self.indexes:
+            self.indexes[label] = LabelIndex()
+        return self.indexes[label]
+
+    def load(self, names):
+        """Add the stored entities closest to `(label, key)` pairs to the in-memory indexes."""
+        lookups = [{"label": label, "terms": " OR ".join(gram_terms([key]).split())}
+                   for label, key in names if (label, key) not in self.looked_up]
+        self.looked_up.update(names)
+        if self.graph is None or not lookups:
+            return
+        from neo4j.exceptions import ClientError
+
+        try:
+            rows = self.graph.query(CANDIDATES_QUERY, {"lookups": lookups, "index": RESOLUTION_INDEX,
+                                                       "limit": self.candidates})
+        except ClientError as e:
+            if not missing_index(e):
+                raise
+            return  # nothing has been keyed yet
+        for row in rows:
+            label, index = row["label"], self.index(row["label"])
+            self.stats["loaded"] += 1
+            root = index.add(normalize_name(row["id"], label), row["id"])
+            for alias in row["aliases"] or []:
+                key = normalize_name(alias, label)
+                if key:
+                    index.union(index.add(key, row["id"]), root)
+
+    def store_keys(self):
+        """Save the keys of what the last `resolve` mapped, once the writer stored its nodes."""
+        if self.graph is None:
+            return
+        by_label = {}
+        for (label, canonical), keys in self.keys.items():
+            by_label.setdefault(label, []).append(
+                {"id": canonical, "keys": sorted(keys), "grams": gram_terms(keys)})
+        for label, rows in by_label.items():
+            for start in range(0, len(rows), config.WRITE_BATCH_SIZE):
+                self.graph.query(KEYS_QUERY.format(label=label),
+                                 {"rows": rows[start:start + config.WRITE_BATCH_SIZE]})
+        self.keys = {}
+
+    def canonical_id(self, name, label):
+        if label not in self.labels:
+            return name
+        key = normalize_name(name, label)
+        if not key:
+            return name
+        self.stats["names"] += 1
+        index = self.index(label)
+        if key in index.parent:
+            return index.canonical[index.find(key)]
+        grams = trigrams(key)
+        numbers = re.findall(r"\d+", key)
+        best, best_score = None, self.threshold
+        for other in index.candidates(key):
+            self.stats["comparisons"] += 1
+            if re.findall(r"\d+", other) != numbers:
+                continue  # "type 1" and "type 2" diabetes are different diseases
+            score = jaccard(grams, index.grams[other])
+            if score >= best_score:
+                best, best_score = other, score
+        index.add(key, name)
+        if best is None:
+            return name
+        return index.canonical[index.union(key, best)]
+
+    def resolve(self, graph_documents):
+        self.aliases = {}
+        names = set()
+        for gd in graph_documents:
+            for n in gd.nodes + [end for rel in gd.relationships for end in (rel.source, rel.target)]:
+                label = clean_label(n.type)
+                key = normalize_name(n.id, label) if label in self.labels else ""
+                if key:
+                    names.add((label, key))
+        self.load(names)
+        resolved = []
+        for gd in graph_documents:
+            ids = {}
+
+            def node(n):
+                label = clean_label(n.type)
+                if (label, n.id) not in ids:
+                    canonical = self.canonical_id(n.id, label)
+                    ids[(label, n.id)] = canonical
+                    key = normalize_name(n.id, label) if label in self.labels else ""
+                    if key:
+                        self.keys.setdefault((label, canonical), set()).add(key)
+                    if canonical != n.id:
+                        self.stats["merged"] += 1
+                        self.aliases.setdefault((label, canonical), set()).add(n.id)
+                return Node(id=ids[(label, n.id)], type=n.type, properties=n.properties)
+
+            nodes = {}
+            for n in gd.nodes:
+                merged = node(n)
+                key = (merged.type, merged.id)
+                if key in nodes:
+                    nodes[key].properties.update(n.properties)
+                else:
+                    nodes[key] = Node(id=merged.id, type=merged.type, properties=dict(n.properties))
+            relationships = []
+            for rel in gd.relationships:
+                source, target = node(rel.source), node(rel.target)
+                if (source.type, source.id) == (target.type, target.id):
+                    continue
+                relationships.append(Relationship(source=source, target=target, type=rel.type,
+                                                  properties=rel.properties))
+            resolved.append(GraphDocument(nodes=list(nodes.values()), relationships=relationships,
+                                          source=gd.source))
+        return resolved
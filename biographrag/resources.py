@@ -0,0 +1,189 @@
+"""Process-wide Neo4j driver and model clients, shared by every app session.
+
+Streamlit runs each browser session in the same process, so building a
+`Neo4jGraph` (and its driver) or the model clients per session multiplies
+connections by the number of analysts. Here each is built once per process:
+one pooled driver (`NEO4J_MAX_POOL_SIZE` connections, a session borrowed per
+query) and one keep-alive HTTP client behind the LLM and embedding clients.
+`pool_stats()` reports how much of the driver's pool is in use.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from biographrag import config
+
+_lock = threading.RLock()  # builders nest (llm -> http_client)
+_shared = {}
+
+
+class PoolMetrics:
+    """Sessions borrowed from the driver: in use now, peak, and how long they were held."""
+
+    def __init__(self, size):
+        self.size = size
+        self.in_use = 0
+        self.peak = 0
+        self.borrows = 0
+        self.saturated = 0
+        self.held_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.in_use >= self.size:
+                self.saturated += 1  # this borrow queues for a free connection
+            self.in_use += 1
+            self.borrows += 1
+            self.peak = max(self.peak, self.in_use)
+        return time.perf_counter()
+
+    def release(self, started):
+        with self.lock:
+            self.in_use -= 1
+            self.held_seconds += time.perf_counter() - started
+
+    def stats(self):
+        with self.lock:
+            return {"size": self.size, "in_use": self.in_use, "peak": self.peak,
+                    "utilization": self.in_use / self.size if self.size else 0.0,
+                    "borrows": self.borrows, "saturated": self.saturated,
+                    "mean_held_ms": 1000 * self.held_seconds / self.borrows if self.borrows else 0.0}
+
+
+class BorrowedSession:
+    def __init__(self, session, metrics):
+        self.session = session
+        self.metrics = metrics
+        self.started = metrics.acquire()
+        self.closed = False
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.metrics.release(self.started)
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+class InstrumentedDriver:
+    """A neo4j `Driver` that counts the sessions and queries borrowing its pool."""
+
+    def __init__(self, driver, metrics):
+        self.driver = driver
+        self.metrics = metrics
+
+    def session(self, **kwargs):
+        return BorrowedSession(self.driver.session(**kwargs), self.metrics)
+
+    def execute_query(self, *args, **kwargs):
+        started = self.metrics.acquire()
+        try:
+            return self.driver.execute_query(*args, **kwargs)
+        finally:
+            self.metrics.release(started)
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+
+def driver_config():
+    return {
+        "max_connection_pool_size": config.NEO4J_MAX_POOL_SIZE,
+        "connection_acquisition_timeout": config.NEO4J_ACQUISITION_TIMEOUT,
+        # Recycle connections before cloud load balancers drop them
+        "max_connection_lifetime": config.NEO4J_CONNECTION_LIFETIME,
+        "liveness_check_timeout": config.NEO4J_LIVENESS_CHECK_SECONDS,
+    }
+
+
+def _get(key, build):
+    with _lock:
+        if key not in _shared:
+            _shared[key] = build()
+        return _shared[key]
+
+
+def graph(url=None, username=None, password=None, database=None):
+    """The process's `Neo4jGraph`; its schema is loaded by `SchemaService`, not introspected."""
+    from langchain_community.graphs import Neo4jGraph
+
+    url = url or os.getenv("NEO4J_URI")
+    username = username or os.getenv("NEO4J_USERNAME")
+    database = database or os.getenv("NEO4J_DATABASE", "neo4j")
+
+    def build():
+        shared = Neo4jGraph(url=url, username=username,
+                            password=password or os.getenv("NEO4J_PASSWORD"),
+                            database=database, refresh_schema=False, driver_config=driver_config())
+        shared._driver = InstrumentedDriver(shared._driver, PoolMetrics(config.NEO4J_MAX_POOL_SIZE))
+        return shared
+
+    return _get(("graph", url, username, database), build)
+
+
+def http_client():
+    """One keep-alive HTTP connection pool for every model client."""
+    import httpx
+
+    return _get("http", lambda: httpx.Client(
+        limits=httpx.Limits(max_connections=config.HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=config.HTTP_MAX_CONNECTIONS,
+                            keepalive_expiry=config.HTTP_KEEPALIVE_SECONDS),
+        timeout=httpx.Timeout(config.HTTP_TIMEOUT_SECONDS)))
+
+
+def llm(api_key=None):
+    """The shared Groq client for `api_key` (default `GROQ_API_KEY`); a new key gets its own."""
+    from langchain_groq import ChatGroq
+
+    from biographrag.tracing import TokenUsageCallback
+
+    api_key = api_key or os.getenv("GROQ_API_KEY")
+    # Keyed by a hash so the key itself is not kept around as a dict key
+    key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    return _get(("llm", config.LLM_MODEL, key_hash), lambda: ChatGroq(
+        model=config.LLM_MODEL, temperature=config.LLM_TEMPERATURE,
+        groq_api_key=api_key, http_client=http_client(),
+        callbacks=[TokenUsageCallback()]))  # token counts for the tracing spans
+
+
+def rate_limiter():
+    """The process's GROQ_RPM/GROQ_TPM budget for question answering."""
+    from biographrag.extraction import RateLimiter
+
+    return _get("rate_limiter", lambda: RateLimiter(config.GROQ_RPM, config.GROQ_TPM))
+
+
+def embeddings():
+    from langchain_openai import OpenAIEmbeddings
+
+    return _get("embeddings", lambda: OpenAIEmbeddings(http_client=http_client()))
+
+
+def pool_stats():
+    """Pool metrics of every shared driver built so far, by Neo4j URL."""
+    with _lock:
+        graphs = [(key[1], value) for key, value in _shared.items()
+                  if isinstance(key, tuple) and key[0] == "graph"]
+    return {url: shared._driver.metrics.stats() for url, shared in graphs}
+
+
+def close():
+    with _lock:
+        shared = dict(_shared)
+        _shared.clear()
+    for key, value in shared.items():
+        if isinstance(key, tuple) and key[0] == "graph":
+            value._driver.close()
+        elif key == "http":
+            value.close()
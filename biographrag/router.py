@@ -0,0 +1,257 @@
+"""Precompiled Cypher for the common question shapes, ahead of LLM generation.
+
+Most questions ask for the entities of one label linked to another through
+one relationship ("What medications does the patient take?"), or for every
+entity of a label, optionally around one named entity ("Which medications
+target HER2?"). `QueryRouter` builds a parameterised template for each
+(start, type, end) pattern of the stored schema that uses only allowed
+labels and relationship types, and matches questions to them locally:
+label names and synonyms, relationship stems, the named entity resolved
+through the keyword index, and embedding similarity to break ties. Only a
+confident match is routed; anything else (several hops, several unknowns,
+an entity it cannot pin down, a negation or a qualifier no template
+expresses) goes to the LLM as before.
+"""
+import re
+
+from biographrag import config
+from biographrag.qa import question_literals
+from biographrag.schema import SYNONYMS, label_words, missing_index
+
+# Words that introduce what the question asks for: "what medications", "any trials",
+# and the words that may sit between the two: "list all the medications"
+ANSWER_CUES = {"what", "which", "list", "any", "show", "name"}
+FILLERS = {"all", "the", "are", "is", "were", "of", "kinds", "types"}
+# Words that add no constraint of their own. Any other word a question uses beyond
+# its labels, relationship and entity ("current", "first", "approved") is a
+# qualifier no template expresses, so the LLM writes that query.
+FUNCTION_WORDS = {
+    "a", "an", "and", "or", "do", "does", "did", "has", "have", "had", "was", "be", "been",
+    "being", "in", "on", "for", "to", "by", "with", "from", "at", "as", "this", "that",
+    "these", "those", "there", "he", "she", "they", "it", "his", "her", "their", "its",
+    "them", "him", "s", "mentioned", "discussed", "listed", "document", "report", "paper",
+    "record", "records", "text",
+}
+# Negated questions ("not take", "were stopped") ask for the complement of what a
+# template returns
+NEGATIONS = {"not", "no", "never", "without", "none", "nor", "neither", "except", "excluding"}
+NEGATION_STEMS = ("stop", "discontinu", "cease", "quit", "withdr")
+
+
+def words(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def negated(question, tokens):
+    return (any(token in NEGATIONS or token.startswith(NEGATION_STEMS) for token in tokens)
+            or re.search(r"n['’]t\b", question.lower()) is not None)
+
+
+def label_phrases(label):
+    """Phrases that name `label` in a question, synonyms and plurals included."""
+    phrases = label_words(label) | {word for word, synonym in SYNONYMS.items() if synonym == label}
+    return phrases | {phrase + "s" for phrase in phrases}
+
+
+def relationship_words(rel_type):
+    return rel_type.lower().replace("_", " ")
+
+
+class Template:
+    """One routable question shape: `answer` entities linked to `anchor` by `rel_type`."""
+
+    def __init__(self, answer, anchor=None, rel_type=None, answer_is_start=False):
+        self.answer = answer
+        self.anchor = anchor
+        self.rel_type = rel_type
+        self.answer_is_start = answer_is_start
+        if anchor is None:
+            self.name = f"list:{answer}"
+        else:
+            start, end = (answer, anchor) if answer_is_start else (anchor, answer)
+            self.name = f"{start}-{rel_type}->{end}:{answer}"
+
+    def cypher(self, entity=False):
+        if self.anchor is None:
+            return f"MATCH (x:`{self.answer}`) RETURN DISTINCT x.id LIMIT $limit"
+        anchor = "(a:`{0}`{1})".format(self.anchor, " {id: $entity}" if entity else "")
+        pattern = (f"(x:`{self.answer}`)-[:`{self.rel_type}`]->{anchor}" if self.answer_is_start
+                   else f"{anchor}-[:`{self.rel_type}`]->(x:`{self.answer}`)")
+        return f"MATCH {pattern} RETURN DISTINCT x.id LIMIT $limit"
+
+    def description(self):
+        """Canonical phrasing, for embedding similarity."""
+        answer = sorted(label_words(self.answer))[0]
+        if self.anchor is None:
+            return f"list all {answer}"
+        anchor = sorted(label_words(self.anchor))[0]
+        if self.answer_is_start:
+            return f"which {answer} {relationship_words(self.rel_type)} the {anchor}"
+        return f"what {answer} does the {anchor} {relationship_words(self.rel_type)}"
+
+
+class QueryRouter:
+    """Maps questions to `Template`s built from a `SchemaService`'s patterns.
+
+    `route(question, vector)` returns `(name, cypher, params)` or None.
+    `embed(text)` should return a unit vector (`CypherCache.embed` does) and
+    is only used when keywords leave more than one candidate.
+    """
+
+    def __init__(self, schema, embed=None, limit=25, allowed_nodes=None,
+                 allowed_relationships=None, similarity=None):
+        self.schema = schema
+        self.embed = embed
+        self.limit = limit
+        self.allowed_nodes = set(allowed_nodes or config.ALLOWED_NODES)
+        self.allowed_relationships = set(allowed_relationships or config.ALLOWED_RELATIONSHIPS)
+        self.similarity = config.ROUTER_SIMILARITY if similarity is None else similarity
+        self.version = None
+        self.templates = []
+        self.vectors = {}
+        self.counts = {"questions": 0, "routed": 0, "fallback": 0, "empty": 0}
+
+    def _refresh(self):
+        if self.version == self.schema.version:
+            return
+        structured = self.schema.schema
+        labels = sorted(self.allowed_nodes & set(structured["node_props"]))
+        self.templates = [Template(label) for label in labels]
+        for start, rel_type, end in structured["relationships"]:
+            if (start == end or rel_type not in self.allowed_relationships
+                    or not {start, end} <= self.allowed_nodes):
+                continue
+            self.templates.append(Template(end, start, rel_type))
+            self.templates.append(Template(start, end, rel_type, answer_is_start=True))
+        self.version = self.schema.version
+        self.vectors = {}
+
+    def mentions(self, tokens):
+        """Allowed labels named in `tokens` by first position, and the tokens naming them."""
+        text = " " + " ".join(tokens) + " "
+        found = {}
+        naming = set()
+        for label in self.allowed_nodes:
+            for phrase in label_phrases(label):
+                position = text.find(f" {phrase} ")
+                if position >= 0:
+                    found[label] = min(found.get(label, position), position)
+                    naming.update(phrase.split())
+        return sorted(found, key=found.get), naming
+
+    def answer_label(self, labels, tokens):
+        """The label right after the question's one answer cue ("which doctor")."""
+        cues = [i for i, token in enumerate(tokens) if token in ANSWER_CUES]
+        if len(cues) != 1:
+            return None
+        rest = tokens[cues[0] + 1:]
+        while rest and rest[0] in FILLERS:
+            rest = rest[1:]
+        text = " " + " ".join(rest) + " "
+        for label in labels:
+            if any(text.startswith(f" {phrase} ") for phrase in label_phrases(label)):
+                return label
+        return None
+
+    def resolve_entity(self, name):
+        """(id, labels) of the node whose id is `name`, via the keyword index."""
+        from neo4j.exceptions import ClientError
+
+        term = '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
+        try:
+            rows = self.schema.graph.query("""
+                CALL db.index.fulltext.queryNodes($index, $term, {limit: 5})
+                YIELD node
+                WHERE toLower(node.id) = $name
+                RETURN node.id AS id, [label IN labels(node) WHERE label IN $labels] AS labels
+                LIMIT 1
+            """, {"index": config.ENTITY_KEYWORD_INDEX, "term": term, "name": name.lower(),
+                  "labels": sorted(self.allowed_nodes)})
+        except ClientError as e:
+            if not missing_index(e):
+                raise
+            return None  # no entity has been indexed yet
+        return (rows[0]["id"], set(rows[0]["labels"])) if rows and rows[0]["labels"] else None
+
+    def score(self, template, vector):
+        if template.name not in self.vectors:
+            self.vectors[template.name] = self.embed(template.description())
+        other = self.vectors[template.name]
+        return sum(a * b for a, b in zip(vector, other)) if other is not None else 0.0
+
+    def match(self, question, vector=None):
+        """(template, entity id or None) for a confident match, else None."""
+        self._refresh()
+        tokens = words(question)
+        if negated(question, tokens):
+            return None
+        labels, naming = self.mentions(tokens)
+        # "take" -> TAKES_MEDICATION, but "medications" alone names a label, not a relationship
+        stems = {token[:4] for token in tokens if len(token) >= 4 and token not in naming}
+        related = {rel_type for rel_type in self.allowed_relationships
+                   if any(len(part) >= 4 and part[:4] in stems for part in rel_type.lower().split("_"))}
+
+        entity = None
+        literals = question_literals(question)
+        if len(literals) > 1:
+            return None
+        rel_stems = {part[:4] for rel_type in related for part in rel_type.lower().split("_") if len(part) >= 4}
+        used = (ANSWER_CUES | FILLERS | FUNCTION_WORDS | naming
+                | {word for literal in literals for word in words(literal)})
+        if any(token not in used and not (len(token) >= 4 and token[:4] in rel_stems) for token in tokens):
+            return None  # a qualifier the templates cannot express
+        if literals:
+            resolved = self.resolve_entity(literals[0])
+            if resolved is None:
+                return None  # a name or value we cannot pin to one node
+            entity, entity_labels = resolved
+            labels = [label for label in labels if label not in entity_labels]
+            if len(labels) != 1:
+                return None
+            answer = labels[0]
+            candidates = [t for t in self.templates
+                          if t.answer == answer and t.anchor in entity_labels]
+        else:
+            if len(labels) > 2 or len(related) > 1:
+                return None  # several hops or several unknowns
+            answer = self.answer_label(labels, tokens)
+            if answer is None:
+                return None
+            if len(labels) == 1:
+                if related:
+                    return None  # a relationship to something it did not name
+                candidates = [t for t in self.templates if t.name == f"list:{answer}"]
+            else:
+                anchor = next(label for label in labels if label != answer)
+                candidates = [t for t in self.templates if t.answer == answer and t.anchor == anchor]
+        if related:
+            candidates = [t for t in candidates if t.rel_type in related] or candidates
+        if len(candidates) > 1:
+            if vector is None or self.embed is None:
+                return None
+            ranked = sorted(candidates, key=lambda t: self.score(t, vector), reverse=True)
+            if self.score(ranked[0], vector) < self.similarity:
+                return None
+            candidates = ranked[:1]
+        return (candidates[0], entity) if candidates else None
+
+    def route(self, question, vector=None):
+        """(template name, cypher, params) or None when the LLM should write the query."""
+        self.counts["questions"] += 1
+        found = self.match(question, vector)
+        if found is None:
+            self.counts["fallback"] += 1
+            return None
+        template, entity = found
+        params = {"limit": self.limit}
+        if entity is not None:
+            params["entity"] = entity
+        self.counts["routed"] += 1
+        return template.name, template.cypher(entity is not None), params
+
+    def empty(self):
+        """The routed query found nothing; the question goes to the LLM after all."""
+        self.counts["empty"] += 1
+
+    def stats(self):
+        return {**self.counts, "templates": len(self.templates)}
@@ -0,0 +1,265 @@
+"""Cached, incrementally maintained graph schema.
+
+`Neo4jGraph.refresh_schema` introspects the whole database, and the text it
+produces goes into every Cypher-generation prompt. `SchemaService` instead
+keeps the schema in a single `__Schema__` node with a version number. Each
+ingestion merges in the labels, relationship patterns and property keys of
+the batches it wrote, so loading the schema after ingestion is one read.
+`prompt_schema(question)` prunes it to the labels a question is about and
+their one-hop neighbourhood.
+
+The schema only grows: labels whose last node was removed stay listed until
+`refresh()` rebuilds it from the database. Clearing the graph deletes the
+`__Schema__` node too, so the next load starts empty.
+"""
+import json
+import re
+
+from biographrag import config
+from biographrag.writer import BASE_ENTITY_LABEL
+
+SCHEMA_LABEL = "__Schema__"
+# Concurrent writers each retry their compare-and-set this many times before giving up
+SAVE_ATTEMPTS = 20
+# Bookkeeping labels and properties that Cypher generation should never see
+INTERNAL_LABELS = {BASE_ENTITY_LABEL, SCHEMA_LABEL}
+INTERNAL_PROPERTIES = {"embedding", "embedding_hash", "doc_ids", "chunk_ids", "doc_version",
+                       "neighbourhood", "neighbourhood_chunks", "neighbourhood_hash",
+                       "resolution_keys", "resolution_grams"}
+
+# Words users say for a label that neither spell nor pluralise it
+SYNONYMS = {
+    "drug": "Medication", "medicine": "Medication", "prescription": "Medication",
+    "dose": "Medication", "dosage": "Medication",
+    "diagnosis": "Disease", "condition": "Disease", "illness": "Disease", "cancer": "Disease",
+    "physician": "Doctor", "clinician": "Doctor", "oncologist": "Doctor",
+    "lab": "Test", "result": "Test", "scan": "Test",
+    "surgery": "Procedure", "operation": "Procedure",
+    "trial": "ClinicalTrial", "study": "ClinicalTrial",
+    "organ": "Anatomy", "mutation": "Gene", "mutated": "Gene", "marker": "Biomarker",
+    "document": "Document", "report": "Document", "page": "Document",
+}
+
+# db.schema.*TypeProperties names -> the type names the prompt uses
+NEO4J_TYPES = {"String": "STRING", "Long": "INTEGER", "Double": "FLOAT", "Boolean": "BOOLEAN",
+               "Date": "DATE", "DateTime": "DATE_TIME", "LocalDateTime": "LOCAL_DATE_TIME"}
+
+
+def empty_schema():
+    return {"node_props": {}, "rel_props": {}, "relationships": []}
+
+
+def missing_index(error):
+    """Whether a Neo4j `ClientError` says the queried fulltext index does not exist."""
+    return (error.code == "Neo.ClientError.Procedure.ProcedureCallFailed"
+            and "no such fulltext schema index" in (error.message or "").lower())
+
+
+def neo4j_type(types):
+    name = (types or ["String"])[0]
+    return "LIST" if name.endswith("Array") or name.startswith("List") else NEO4J_TYPES.get(name, "STRING")
+
+
+def merge(schema, delta):
+    """Fold `delta` into `schema` in place; True if anything was new."""
+    changed = False
+    for kind in ("node_props", "rel_props"):
+        for name, props in delta[kind].items():
+            changed |= name not in schema[kind]
+            current = schema[kind].setdefault(name, {})
+            for key, value_type in props.items():
+                if key not in current:
+                    current[key] = value_type
+                    changed = True
+    for pattern in delta["relationships"]:
+        if list(pattern) not in schema["relationships"]:
+            schema["relationships"].append(list(pattern))
+            changed = True
+    return changed
+
+
+def structured(schema, labels=None):
+    """`Neo4jGraph.structured_schema` shape, optionally restricted to `labels`."""
+    keep = (lambda label: True) if labels is None else (lambda label: label in labels)
+    patterns = [(s, t, e) for s, t, e in schema["relationships"] if keep(s) and keep(e)]
+    types = {t for _, t, _ in patterns}
+
+    def props(items):
+        return [{"property": key, "type": value_type} for key, value_type in sorted(items.items())
+                if key not in INTERNAL_PROPERTIES]
+
+    return {
+        "node_props": {label: props(items) for label, items in sorted(schema["node_props"].items())
+                       if keep(label)},
+        "rel_props": {rel_type: props(items) for rel_type, items in sorted(schema["rel_props"].items())
+                      if rel_type in types and props(items)},
+        "relationships": [{"start": s, "type": t, "end": e} for s, t, e in patterns],
+    }
+
+
+def format_props(name, props):
+    return f"{name} {{" + ", ".join(f"{p['property']}: {p['type']}" for p in props) + "}"
+
+
+def format_schema(structured_schema):
+    """The text `Neo4jGraph.get_schema` would give for the same structure."""
+    node_props = [format_props(label, props) for label, props in structured_schema["node_props"].items()]
+    rel_props = [format_props(rel_type, props) for rel_type, props in structured_schema["rel_props"].items()]
+    rels = [f"(:{r['start']})-[:{r['type']}]->(:{r['end']})" for r in structured_schema["relationships"]]
+    return "\n".join(["Node properties:", "\n".join(node_props),
+                      "Relationship properties:", "\n".join(rel_props),
+                      "The relationships:", "\n".join(rels)])
+
+
+def label_words(label):
+    """Phrases that name `label`: "ClinicalTrial" -> "clinical trial", "clinical trials", ..."""
+    words = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", label).lower()
+    plural = words[:-1] + "ies" if words.endswith("y") else words + "s"
+    return {words, plural, words.replace(" ", ""), plural.replace(" ", "")}
+
+
+class SchemaService:
+    """Versioned schema kept in the graph and shared by every process that writes it."""
+
+    def __init__(self, graph, save_attempts=SAVE_ATTEMPTS):
+        self.graph = graph
+        self.save_attempts = save_attempts
+        self.schema = empty_schema()
+        self.version = 0
+        self.constrained = False
+
+    def load(self):
+        """Read the stored schema; build it from the database once if there is none."""
+        rows = self.graph.query(f"MATCH (s:`{SCHEMA_LABEL}` {{id: 'schema'}}) "
+                                "RETURN s.version AS version, s.data AS data")
+        if not rows:
+            return self.refresh()
+        self.version = rows[0]["version"]
+        self.schema = json.loads(rows[0]["data"])
+        return self
+
+    def refresh(self):
+        """Full rebuild from the database, for bootstrapping or after deletions."""
+        schema = empty_schema()
+        for row in self.graph.query("CALL db.schema.nodeTypeProperties() "
+                                    "YIELD nodeLabels, propertyName, propertyTypes "
+                                    "RETURN nodeLabels, propertyName, propertyTypes"):
+            for label in row["nodeLabels"]:
+                if label in INTERNAL_LABELS:
+                    continue
+                props = schema["node_props"].setdefault(label, {})
+                if row["propertyName"]:
+                    props[row["propertyName"]] = neo4j_type(row["propertyTypes"])
+        for row in self.graph.query("CALL db.schema.relTypeProperties() "
+                                    "YIELD relType, propertyName, propertyTypes "
+                                    "RETURN relType, propertyName, propertyTypes"):
+            rel_type = row["relType"].strip(":`")
+            props = schema["rel_props"].setdefault(rel_type, {})
+            if row["propertyName"]:
+                props[row["propertyName"]] = neo4j_type(row["propertyTypes"])
+        for rel_type in list(schema["rel_props"]):
+            for row in self.graph.query(f"""
+                MATCH (a)-[:`{rel_type}`]->(b)
+                WITH DISTINCT labels(a) AS starts, labels(b) AS ends
+                UNWIND [l IN starts WHERE NOT l IN $internal] AS start
+                UNWIND [l IN ends WHERE NOT l IN $internal] AS end
+                RETURN DISTINCT start, end
+            """, {"internal": sorted(INTERNAL_LABELS)}):
+                schema["relationships"].append([row["start"], rel_type, row["end"]])
+        self.schema = schema
+        self._save(replace=True)
+        return self
+
+    def update(self, delta):
+        """Merge what one ingestion wrote; the version only moves when something is new."""
+        if not merge(self.schema, delta):
+            return False
+        self._save()
+        return True
+
+    def _save(self, replace=False):
+        if not self.constrained:
+            # Two first MERGEs racing would otherwise create two schema nodes
+            self.graph.query(f"CREATE CONSTRAINT schema_id IF NOT EXISTS "
+                             f"FOR (s:`{SCHEMA_LABEL}`) REQUIRE s.id IS UNIQUE")
+            self.constrained = True
+        # Merge with whatever another process stored meanwhile, then bump the version
+        for _ in range(self.save_attempts):
+            rows = self.graph.query(f"MATCH (s:`{SCHEMA_LABEL}` {{id: 'schema'}}) "
+                                    "RETURN s.version AS version, s.data AS data")
+            stored = rows[0]["version"] if rows else None
+            if rows and not replace:
+                merge(self.schema, json.loads(rows[0]["data"]))
+            written = self.graph.query(f"""
+                MERGE (s:`{SCHEMA_LABEL}` {{id: 'schema'}})
+                WITH s WHERE s.version IS NULL OR s.version = $stored
+                SET s.version = coalesce(s.version, 0) + 1, s.data = $data
+                RETURN s.version AS version
+            """, {"stored": stored, "data": json.dumps(self.schema, sort_keys=True)})
+            if written:
+                self.version = written[0]["version"]
+                return
+        raise RuntimeError(f"could not save the schema: another writer changed it during each of "
+                           f"{self.save_attempts} attempts")
+
+    def structured(self, labels=None):
+        return structured(self.schema, labels)
+
+    def text(self):
+        return format_schema(self.structured())
+
+    def apply(self, graph=None):
+        """Install the cached schema on a `Neo4jGraph` in place of `refresh_schema()`."""
+        graph = graph or self.graph
+        graph.structured_schema = {**self.structured(), "metadata": {"version": self.version}}
+        graph.schema = self.text()
+        return graph
+
+    def relevant_labels(self, question):
+        """Labels named in the question, by name, synonym, relationship word or entity."""
+        text = question.lower()
+        words = set(re.findall(r"[a-z0-9]+", text))
+        known = set(self.schema["node_props"])
+        labels = {label for label in known
+                  if any(re.search(rf"\b{re.escape(w)}\b", text) for w in label_words(label))}
+        labels |= {label for word, label in SYNONYMS.items()
+                   if label in known and (word in words or word + "s" in words)}
+        # "treating" -> TREATED_BY, "take" -> TAKES_MEDICATION: compare 4-letter stems
+        stems = {word[:4] for word in words if len(word) >= 4}
+        for start, rel_type, end in self.schema["relationships"]:
+            if any(len(part) >= 4 and part[:4] in stems for part in rel_type.lower().split("_")):
+                labels |= {start, end}
+        labels |= self.entity_labels(question)
+        return labels
+
+    def entity_labels(self, question):
+        """Labels of entities named in the question, via the keyword index."""
+        terms = " ".join(re.findall(r"\w+", question.lower()))
+        if not terms:
+            return set()
+        from neo4j.exceptions import ClientError
+
+        try:
+            rows = self.graph.query("""
+                CALL db.index.fulltext.queryNodes($index, $terms, {limit: 3})
+                YIELD node
+                UNWIND labels(node) AS label
+                RETURN DISTINCT label
+            """, {"index": config.ENTITY_KEYWORD_INDEX, "terms": terms})
+        except ClientError as e:
+            if not missing_index(e):
+                raise
+            return set()  # no entity has been indexed yet
+        return {row["label"] for row in rows} - INTERNAL_LABELS
+
+    def prompt_schema(self, question):
+        """Schema text for one question: its labels plus their one-hop neighbours.
+
+        Falls back to the whole schema when the question names no label.
+        """
+        labels = self.relevant_labels(question)
+        if not labels:
+            return self.text()
+        neighbours = {label for s, _, e in self.schema["relationships"] if s in labels or e in labels
+                      for label in (s, e)}
+        return format_schema(self.structured(labels | neighbours))
@@ -0,0 +1,338 @@
+"""Graph snapshots: the extracted graph and its embeddings as Parquet tables.
+
+    python -m biographrag.snapshot export snapshots/clinical
+    python -m biographrag.snapshot import snapshots/clinical
+    python -m biographrag.snapshot info snapshots/clinical
+
+The live database was the only copy of what extraction produced, so a new
+environment, or a graph cleared from the app, meant paying for extraction
+again. A snapshot is a directory of zstd-compressed Parquet tables:
+
+- `chunks`: `Document` nodes (id, text, metadata);
+- `nodes`: entities (label, id, properties, the chunks mentioning them,
+  `doc_ids`, `aliases`);
+- `relationships`: (start label, type, end label, source, target,
+  properties, `chunk_ids`);
+- `embeddings`: entity vectors from the graph and chunk vectors from the
+  local embedding memo, keyed by the hash of the text they embed;
+
+and a `manifest.json` with the counts, the embedding model and the stored
+schema. Properties are JSON strings, since each label has its own keys.
+
+Export pages through the graph by `id` (an index range scan per label), and
+import streams each table back in record batches through the
+`BulkGraphWriter` queries, so memory stays bounded by the batch size
+whatever the size of the graph. `write_graph_documents` builds a snapshot
+straight from `GraphDocument`s, e.g. as a benchmark fixture.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from biographrag import config
+from biographrag.embeddings import EmbeddingStore, EntityEmbedder, text_hash
+from biographrag.schema import INTERNAL_LABELS, SchemaService
+from biographrag.writer import (BASE_ENTITY_LABEL, CHUNK_QUERY, NODE_QUERY, REL_QUERY,
+                                BulkGraphWriter, schema_delta, union)
+
+FORMAT_VERSION = 1
+STRINGS = pa.list_(pa.string())
+TABLES = {
+    "chunks": pa.schema([("id", pa.string()), ("text", pa.string()), ("metadata", pa.string())]),
+    "nodes": pa.schema([("label", pa.string()), ("id", pa.string()), ("properties", pa.string()),
+                        ("chunks", STRINGS), ("doc_ids", STRINGS), ("aliases", STRINGS)]),
+    "relationships": pa.schema([("start", pa.string()), ("type", pa.string()), ("end", pa.string()),
+                                ("source", pa.string()), ("target", pa.string()),
+                                ("properties", pa.string()), ("chunk_ids", STRINGS)]),
+    "embeddings": pa.schema([("kind", pa.string()), ("label", pa.string()), ("id", pa.string()),
+                             ("hash", pa.string()), ("vector", pa.list_(pa.float32()))]),
+}
+# Stored in their own columns (or, for embeddings, their own table)
+NODE_COLUMNS = {"id", "embedding", "embedding_hash", "doc_ids", "aliases"}
+
+CHUNK_PAGE_QUERY = """
+MATCH (d:Document) WHERE $after IS NULL OR d.id > $after
+WITH d ORDER BY d.id LIMIT $limit
+RETURN d.id AS id, d.text AS text, [k IN keys(d) WHERE NOT k IN ['id', 'text'] | [k, d[k]]] AS metadata
+"""
+
+NODE_PAGE_QUERY = """
+MATCH (n:`{label}`:`{base}`) WHERE $after IS NULL OR n.id > $after
+WITH n ORDER BY n.id LIMIT $limit
+RETURN n.id AS id, [k IN keys(n) WHERE NOT k IN $columns | [k, n[k]]] AS properties,
+       [(d:Document)-[:MENTIONS]->(n) | d.id] AS chunks,
+       coalesce(n.doc_ids, []) AS doc_ids, coalesce(n.aliases, []) AS aliases,
+       n.embedding_hash AS hash, n.embedding AS embedding,
+       [(n)-[r]->(t:`{base}`) | {{type: type(r), target: t.id,
+                                  end: [l IN labels(t) WHERE l <> '{base}'][0],
+                                  properties: [k IN keys(r) WHERE k <> 'chunk_ids' | [k, r[k]]],
+                                  chunk_ids: coalesce(r.chunk_ids, [])}}] AS relationships
+"""
+
+
+def to_json(pairs):
+    return json.dumps(dict(pairs), sort_keys=True, default=str)
+
+
+class SnapshotWriter:
+    """Appends rows to the snapshot's Parquet tables; `close()` writes the manifest."""
+
+    def __init__(self, path, compression="zstd"):
+        self.path = path
+        self.compression = compression
+        os.makedirs(path, exist_ok=True)
+        self.writers = {}
+        self.counts = {name: 0 for name in TABLES}
+        self.dimensions = None
+
+    def append(self, table, rows):
+        if not rows:
+            return
+        if table not in self.writers:
+            self.writers[table] = pq.ParquetWriter(os.path.join(self.path, f"{table}.parquet"),
+                                                   TABLES[table], compression=self.compression)
+        if table == "embeddings" and self.dimensions is None:
+            self.dimensions = len(rows[0]["vector"])
+        self.writers[table].write_table(pa.Table.from_pylist(rows, schema=TABLES[table]))
+        self.counts[table] += len(rows)
+
+    def close(self, **manifest):
+        for writer in self.writers.values():
+            writer.close()
+        manifest = {"format": FORMAT_VERSION,
+                    "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "counts": self.counts, "dimensions": self.dimensions, **manifest}
+        with open(os.path.join(self.path, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        return manifest
+
+
+def entity_labels(graph):
+    rows = graph.query("CALL db.labels() YIELD label RETURN label")
+    return sorted(row["label"] for row in rows
+                  if row["label"] not in INTERNAL_LABELS and row["label"] != "Document")
+
+
+def export_graph(graph, path, store=None, batch_size=None, progress=None):
+    """Write the whole graph (and the vectors `store` memoises for its chunks) to `path`."""
+    batch_size = batch_size or config.WRITE_BATCH_SIZE
+    snapshot = SnapshotWriter(path)
+
+    def pages(query, params=None):
+        after = None
+        while True:
+            rows = graph.query(query, {**(params or {}), "after": after, "limit": batch_size})
+            if not rows:
+                return
+            yield rows
+            after = rows[-1]["id"]
+
+    for rows in pages(CHUNK_PAGE_QUERY):
+        snapshot.append("chunks", [{"id": row["id"], "text": row["text"], "metadata": to_json(row["metadata"])}
+                                   for row in rows])
+        if store is not None:
+            hashes = {row["id"]: text_hash(row["text"]) for row in rows if row["text"]}
+            vectors = store.get_many(sorted(set(hashes.values())))
+            snapshot.append("embeddings", [
+                {"kind": "chunk", "label": "Document", "id": chunk, "hash": digest, "vector": vectors[digest]}
+                for chunk, digest in hashes.items() if digest in vectors])
+        if progress:
+            progress(snapshot.counts)
+
+    for label in entity_labels(graph):
+        query = NODE_PAGE_QUERY.format(label=label, base=BASE_ENTITY_LABEL)
+        for rows in pages(query, {"columns": sorted(NODE_COLUMNS)}):
+            snapshot.append("nodes", [
+                {"label": label, "id": row["id"], "properties": to_json(row["properties"]),
+                 "chunks": row["chunks"], "doc_ids": row["doc_ids"], "aliases": row["aliases"]}
+                for row in rows])
+            snapshot.append("relationships", [
+                {"start": label, "type": rel["type"], "end": rel["end"], "source": row["id"],
+                 "target": rel["target"], "properties": to_json(rel["properties"]),
+                 "chunk_ids": rel["chunk_ids"]}
+                for row in rows for rel in row["relationships"] if rel["end"]])
+            snapshot.append("embeddings", [
+                {"kind": "entity", "label": label, "id": row["id"], "hash": row["hash"],
+                 "vector": row["embedding"]}
+                for row in rows if row["embedding"] is not None])
+            if progress:
+                progress(snapshot.counts)
+
+    schema = SchemaService(graph).load().schema
+    return snapshot.close(embedding_model=getattr(store, "model", None), schema=schema)
+
+
+def write_graph_documents(graph_documents, path, doc_id=None, aliases=None):
+    """A snapshot of `GraphDocument`s as `BulkGraphWriter` would write them, without a database."""
+    chunks, nodes, rels = BulkGraphWriter(None).group(graph_documents, doc_id, aliases)
+    snapshot = SnapshotWriter(path)
+    snapshot.append("chunks", [{"id": row["id"], "text": row["text"], "metadata": to_json(row["metadata"].items())}
+                               for row in chunks])
+    for label, rows in nodes.items():
+        snapshot.append("nodes", [{"label": label, "id": row["id"], "properties": to_json(row["properties"].items()),
+                                   "chunks": row["chunks"], "doc_ids": row["doc_ids"], "aliases": row["aliases"]}
+                                  for row in rows])
+    for (start, rel_type, end), rows in rels.items():
+        snapshot.append("relationships", [
+            {"start": start, "type": rel_type, "end": end, "source": row["source"], "target": row["target"],
+             "properties": to_json(row["properties"].items()), "chunk_ids": row["chunk_ids"]}
+            for row in rows])
+    return snapshot.close(embedding_model=None, schema=schema_delta(chunks, nodes, rels))
+
+
+def read_manifest(path):
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{path} is snapshot format {manifest.get('format')}, expected {FORMAT_VERSION}")
+    return manifest
+
+
+def iter_rows(path, table, batch_size):
+    """Rows of one table, `batch_size` at a time."""
+    file = os.path.join(path, f"{table}.parquet")
+    if not os.path.exists(file):
+        return
+    for batch in pq.ParquetFile(file).iter_batches(batch_size=batch_size):
+        yield batch.to_pylist()
+
+
+class SnapshotLoader:
+    """Streams a snapshot into a graph through `BulkGraphWriter` batches.
+
+    Rows are buffered per label (nodes) or per pattern (relationships) and
+    written as soon as a buffer holds `batch_size` rows, so a load holds at
+    most one buffer per key in memory. With a `store`, vectors are added to
+    the embedding memo, so a later re-embedding costs no API calls; with a
+    `VectorIndex`, they go into the local index too.
+    """
+
+    def __init__(self, graph, writer=None, store=None, index=None):
+        self.graph = graph
+        self.writer = writer or BulkGraphWriter(graph)
+        self.store = store
+        self.index = index
+
+    def _drain(self, buffers, key, run, final=False):
+        if final or len(buffers[key]) >= self.writer.batch_size:
+            run(key, buffers.pop(key))
+
+    def _stream(self, path, table, key_of, row_of, run, progress):
+        buffers = {}
+        for rows in iter_rows(path, table, self.writer.batch_size):
+            for row in rows:
+                key = key_of(row)
+                buffers.setdefault(key, []).append(row_of(row))
+                self._drain(buffers, key, run)
+            if progress:
+                progress(self.writer.stats())
+        for key in list(buffers):
+            self._drain(buffers, key, run, final=True)
+
+    def load(self, path, progress=None):
+        manifest = read_manifest(path)
+        schema = manifest.get("schema") or {}
+        labels = sorted(set(schema.get("node_props", {})) - {"Document"}) or None
+        self.writer.timings = []
+        BulkGraphWriter(self.graph, labels=labels).ensure_constraints()
+        self.graph.query("CREATE INDEX document_doc_id IF NOT EXISTS FOR (d:Document) ON (d.doc_id)")
+        for rows in iter_rows(path, "chunks", self.writer.batch_size):
+            self.writer._run("chunks", "Document", CHUNK_QUERY, [
+                {"id": row["id"], "text": row["text"], "metadata": json.loads(row["metadata"])} for row in rows])
+
+        def nodes(label, rows):
+            query = NODE_QUERY.format(label=label, base=BASE_ENTITY_LABEL,
+                                      doc_ids=union("n.doc_ids", "row.doc_ids"),
+                                      aliases=union("n.aliases", "row.aliases"))
+            self.writer._run("nodes", label, query, rows)
+
+        def relationships(key, rows):
+            start, rel_type, end = key
+            query = REL_QUERY.format(start=start, type=rel_type, end=end,
+                                     chunk_ids=union("r.chunk_ids", "row.chunk_ids"))
+            self.writer._run("relationships", f"{start}-{rel_type}->{end}", query, rows)
+
+        self._stream(path, "nodes", lambda row: row["label"],
+                     lambda row: {"id": row["id"], "properties": json.loads(row["properties"]),
+                                  "chunks": row["chunks"], "doc_ids": row["doc_ids"], "aliases": row["aliases"]},
+                     nodes, progress)
+        self._stream(path, "relationships", lambda row: (row["start"], row["type"], row["end"]),
+                     lambda row: {"source": row["source"], "target": row["target"],
+                                  "properties": json.loads(row["properties"]), "chunk_ids": row["chunk_ids"]},
+                     relationships, progress)
+        embedded = self.load_embeddings(path)
+        if schema:
+            SchemaService(self.graph).load().update(schema)
+        return {**self.writer.stats(), "embeddings": embedded, "manifest": manifest}
+
+    def load_embeddings(self, path):
+        # Only its graph writes are used; nothing is embedded
+        embedder = EntityEmbedder(self.graph, None, store=self.store or EmbeddingStore(path=":memory:"))
+        count = 0
+        dimensions = None
+        for rows in iter_rows(path, "embeddings", self.writer.batch_size):
+            by_label = {}
+            for row in rows:
+                if row["kind"] == "entity":
+                    by_label.setdefault(row["label"], []).append(
+                        {"id": row["id"], "embedding": row["vector"], "hash": row["hash"]})
+            for label, label_rows in by_label.items():
+                embedder.write(label, label_rows)
+            if self.store is not None:
+                self.store.put_many([(row["hash"], row["vector"]) for row in rows])
+            if self.index is not None:
+                self.index.add([(row["kind"], row["label"], row["id"], row["hash"], row["vector"])
+                                for row in rows])
+            count += len(rows)
+            dimensions = dimensions or len(rows[0]["vector"])
+        if dimensions:
+            embedder.ensure_indexes(dimensions)
+        return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("export", "import", "info"):
+        commands.add_parser(name).add_argument("path", help="snapshot directory")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        print(json.dumps({k: v for k, v in read_manifest(args.path).items() if k != "schema"}, indent=2))
+        return
+
+    from dotenv import load_dotenv
+
+    from biographrag import resources
+    from biographrag.ann import VectorIndex
+    from biographrag.embeddings import embedding_model_name
+
+    load_dotenv()
+    graph = resources.graph()
+    started = time.perf_counter()
+    if args.command == "export":
+        store = EmbeddingStore(model=embedding_model_name(resources.embeddings()))
+        manifest = export_graph(graph, args.path, store=store,
+                                progress=lambda counts: print(f"\r{counts}", end="", flush=True))
+        print(f"\nexported {manifest['counts']} in {time.perf_counter() - started:.1f}s")
+    else:
+        model = read_manifest(args.path).get("embedding_model") or ""
+        store = EmbeddingStore(model=model) if model else None
+        index = VectorIndex(model=model) if model and config.ANN_ENABLED else None
+        stats = SnapshotLoader(graph, store=store, index=index).load(
+            args.path, progress=lambda s: print(f"\r{s['nodes']} nodes, {s['relationships']} relationships",
+                                                end="", flush=True))
+        print(f"\nimported {stats['chunks']} chunks, {stats['nodes']} nodes, {stats['relationships']} "
+              f"relationships and {stats['embeddings']} vectors in {time.perf_counter() - started:.1f}s")
+        if index is not None:
+            index.close()
+    resources.close()
+
+
+if __name__ == "__main__":
+    main()
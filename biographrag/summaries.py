@@ -0,0 +1,254 @@
+"""Precomputed neighbourhood summaries on entity nodes.
+
+    python -m biographrag.summaries refresh          # every entity (backfill)
+    python -m biographrag.summaries show Metformin
+
+Multi-hop questions ("What medications target the expressed proteins?")
+turn into Cypher whose cost grows with node degree, and when that Cypher
+misses the answer step gets nothing. After ingestion,
+`NeighbourhoodSummarizer` stores on each entity a capped list of facts from
+its 1-2 hop neighbourhood ("Metformin (Medication) TARGETS AMPK (Protein)
+{dosage: 500 mg}"), in `neighbourhood`, and the chunks those facts came
+from, in `neighbourhood_chunks`. A fact lies within `SUMMARY_HOPS` of the
+entity whose summary holds it, so a run only recomputes the entities it
+wrote or whose chunks it removed and those up to `SUMMARY_HOPS - 1` hops
+from them (at most `SUMMARY_FANOUT` neighbours per entity, so a hub such
+as the patient does not pull in the whole graph), and a summary is only
+written when it changed.
+
+At question time `SummaryRetriever` reads the summaries of the entities the
+question names (keyword index) or is closest to (local vector index): one
+indexed lookup instead of a traversal. `GraphQA` uses them when Cypher
+finds nothing, or on every question with `SUMMARY_EXTRA_CONTEXT=1`.
+"""
+import argparse
+import json
+import time
+
+from biographrag import config, tracing
+from biographrag.embeddings import text_hash
+from biographrag.qa import question_literals
+from biographrag.schema import missing_index
+from biographrag.writer import BASE_ENTITY_LABEL, BulkGraphWriter
+
+SUMMARY_PROPERTIES = {"neighbourhood", "neighbourhood_chunks", "neighbourhood_hash"}
+
+FACT = ("{{source: startNode({r}).id, source_label: [l IN labels(startNode({r})) WHERE l <> '{base}'][0], "
+        "type: type({r}), target: endNode({r}).id, target_label: [l IN labels(endNode({r})) WHERE l <> '{base}'][0], "
+        "properties: [k IN keys({r}) WHERE k <> 'chunk_ids' | [k, {r}[k]]], chunk_ids: coalesce({r}.chunk_ids, [])}}")
+
+# First hop: up to $fanout relationships of n; second hop: up to $fanout more
+# from each of those neighbours, not leading back to n
+SUMMARY_QUERY = """
+UNWIND $ids AS id
+MATCH (n:`{label}` {{id: id}})
+WITH n, [(n)-[r]-(a:`{base}`) | [r, a]][..$fanout] AS near
+RETURN n.id AS id, n.neighbourhood_hash AS hash,
+       [(d:Document)-[:MENTIONS]->(n) | d.id][..$max_chunks] AS mentions,
+       [r IN [pair IN near | pair[0]] | {first}] AS first,
+       {second} AS second
+"""
+SECOND_HOP = "[a IN [pair IN near | pair[1]] | [(a)-[r]-(b:`{base}`) WHERE b <> n | {fact}][..$fanout]]"
+
+WRITE_QUERY = """
+UNWIND $rows AS row
+MATCH (n:`{label}` {{id: row.id}})
+SET n.neighbourhood = row.facts, n.neighbourhood_chunks = row.chunks, n.neighbourhood_hash = row.hash
+"""
+
+NEIGHBOURS_QUERY = """
+UNWIND $ids AS id
+MATCH (n:`{label}` {{id: id}})
+UNWIND [(n)--(m:`{base}`) | m][..$fanout] AS m
+RETURN DISTINCT [l IN labels(m) WHERE l <> '{base}'][0] AS label, m.id AS id
+"""
+
+KEYWORD_QUERY = """
+CALL db.index.fulltext.queryNodes($index, $terms, {limit: $k})
+YIELD node
+WHERE node.neighbourhood IS NOT NULL
+RETURN node.id AS id, node.neighbourhood AS facts
+"""
+
+# Entities are found through the `__Entity__(id)` index (see BulkGraphWriter.ensure_constraints)
+LOOKUP_QUERY = """
+UNWIND $entities AS seed
+MATCH (n:`{base}` {{id: seed.id}})
+WHERE seed.label IN labels(n) AND n.neighbourhood IS NOT NULL
+RETURN n.id AS id, n.neighbourhood AS facts
+"""
+
+
+def fact_text(rel):
+    text = f"{rel['source']} ({rel['source_label']}) {rel['type']} {rel['target']} ({rel['target_label']})"
+    properties = ", ".join(f"{key}: {value}" for key, value in sorted(rel["properties"]))
+    return f"{text} {{{properties}}}" if properties else text
+
+
+def summarize(row, max_facts, max_chunks):
+    """(facts, chunk ids) of one SUMMARY_QUERY row: first-hop facts first, both capped."""
+    rels = row["first"] + [rel for rels in row["second"] for rel in rels]
+    facts, chunks = {}, dict.fromkeys(row["mentions"])
+    for rel in rels:
+        if len(facts) >= max_facts:
+            break
+        text = fact_text(rel)
+        if text not in facts:
+            facts[text] = None
+            chunks.update(dict.fromkeys(rel["chunk_ids"]))
+    return list(facts), list(chunks)[:max_chunks]
+
+
+class NeighbourhoodSummarizer:
+    """Keeps `neighbourhood` summaries of entities of every allowed label current."""
+
+    def __init__(self, graph, labels=None, hops=None, fanout=None, max_facts=None,
+                 max_chunks=None, batch_size=None):
+        self.graph = graph
+        self.labels = labels or config.ALLOWED_NODES
+        self.hops = config.SUMMARY_HOPS if hops is None else hops
+        self.fanout = fanout or config.SUMMARY_FANOUT
+        self.max_facts = max_facts or config.SUMMARY_MAX_FACTS
+        self.max_chunks = max_chunks or config.SUMMARY_MAX_CHUNKS
+        self.batch_size = batch_size or config.WRITE_BATCH_SIZE
+        self.stats = {"checked": 0, "written": 0, "seconds": 0.0}
+
+    def affected(self, touched):
+        """label -> ids whose summaries may have changed: `touched` and what lies within `hops - 1` of it."""
+        found = {label: set(ids) for label, ids in touched.items() if label in self.labels}
+        frontier = found
+        for _ in range(self.hops - 1):
+            reached = {}
+            for label, ids in frontier.items():
+                ids = sorted(ids)
+                for start in range(0, len(ids), self.batch_size):
+                    for row in self.graph.query(NEIGHBOURS_QUERY.format(label=label, base=BASE_ENTITY_LABEL),
+                                                {"ids": ids[start:start + self.batch_size],
+                                                 "fanout": self.fanout}):
+                        if row["label"] in self.labels and row["id"] not in found.get(row["label"], ()):
+                            reached.setdefault(row["label"], set()).add(row["id"])
+            for label, ids in reached.items():
+                found.setdefault(label, set()).update(ids)
+            frontier = reached
+        return found
+
+    def refresh_label(self, label, ids):
+        query = SUMMARY_QUERY.format(
+            label=label, base=BASE_ENTITY_LABEL,
+            first=FACT.format(r="r", base=BASE_ENTITY_LABEL),
+            second=SECOND_HOP.format(base=BASE_ENTITY_LABEL, fact=FACT.format(r="r", base=BASE_ENTITY_LABEL))
+            if self.hops > 1 else "[]")
+        for start in range(0, len(ids), self.batch_size):
+            rows = self.graph.query(query, {"ids": ids[start:start + self.batch_size], "fanout": self.fanout,
+                                            "max_chunks": self.max_chunks})
+            changed = []
+            for row in rows:
+                facts, chunks = summarize(row, self.max_facts, self.max_chunks)
+                digest = text_hash("\n".join(facts) + "\0" + "\n".join(chunks))
+                if digest != row["hash"]:
+                    changed.append({"id": row["id"], "facts": facts, "chunks": chunks, "hash": digest})
+            if changed:
+                self.graph.query(WRITE_QUERY.format(label=label), {"rows": changed})
+            self.stats["checked"] += len(rows)
+            self.stats["written"] += len(changed)
+
+    def refresh(self, touched=None):
+        """Recompute the summaries `touched` (label -> ids) may have changed.
+
+        `touched` should include the surviving entities of removed chunks. With
+        `touched=None` every entity of every label is recomputed (backfill).
+        """
+        started = time.perf_counter()
+        if touched is None:
+            affected = {label: [row["id"] for row in self.graph.query(f"MATCH (n:`{label}`) RETURN n.id AS id")]
+                        for label in self.labels}
+        else:
+            affected = {label: sorted(ids) for label, ids in self.affected(touched).items()}
+        for label, ids in affected.items():
+            if ids:
+                self.refresh_label(label, ids)
+        self.stats["seconds"] += time.perf_counter() - started
+        return self.stats
+
+
+def keyword_terms(question):
+    """A keyword index query for the names and values the question mentions, or None."""
+    literals = [term for term in question_literals(question) if any(c.isalpha() for c in term)]
+    if not literals:
+        return None
+    return " OR ".join('"' + term.replace("\\", "\\\\").replace('"', '\\"') + '"' for term in literals)
+
+
+class SummaryRetriever:
+    """Answer context from the stored summaries of the entities a question is about.
+
+    `retrieve(question, vector)` returns `{"fact": ...}` rows: the summaries
+    of entities named in the question, found through the keyword index,
+    then of the closest entities in the local `VectorIndex`, if given.
+    """
+
+    def __init__(self, graph, index=None, k=None, limit=None):
+        self.graph = graph
+        self.index = index
+        self.k = k or config.ANN_TOP_K
+        self.limit = limit or config.SUMMARY_CONTEXT_FACTS
+
+    def retrieve(self, question, vector=None):
+        from neo4j.exceptions import ClientError
+
+        rows = []
+        terms = keyword_terms(question)
+        if terms:
+            try:
+                rows.extend(tracing.profiled_query(self.graph, KEYWORD_QUERY, {
+                    "index": config.ENTITY_KEYWORD_INDEX, "terms": terms, "k": self.k}))
+            except ClientError as e:
+                if not missing_index(e):  # otherwise no entity has been indexed yet
+                    raise
+        if self.index is not None and vector is not None:
+            entities = [{"label": label, "id": key}
+                        for (kind, label, key), _ in self.index.search(vector, self.k)[0] if kind == "entity"]
+            if entities:
+                rows.extend(tracing.profiled_query(self.graph, LOOKUP_QUERY.format(base=BASE_ENTITY_LABEL),
+                                                   {"entities": entities}))
+        facts = {}
+        for row in rows:
+            for fact in row["facts"]:
+                if len(facts) >= self.limit:
+                    break
+                facts.setdefault(fact, None)
+        return [{"fact": fact} for fact in facts]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("refresh", help="recompute the summary of every entity")
+    show = commands.add_parser("show", help="print the stored summary of an entity")
+    show.add_argument("id")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    from biographrag import resources
+
+    load_dotenv()
+    graph = resources.graph()
+    # Graphs ingested before the `__Entity__(id)` index existed get it here
+    BulkGraphWriter(graph).ensure_constraints()
+    if args.command == "refresh":
+        stats = NeighbourhoodSummarizer(graph).refresh()
+        print(f"checked {stats['checked']} entities, wrote {stats['written']} summaries "
+              f"in {stats['seconds']:.1f}s")
+    else:
+        rows = graph.query(f"""
+            MATCH (n:`{BASE_ENTITY_LABEL}` {{id: $id}})
+            RETURN [l IN labels(n) WHERE l <> '{BASE_ENTITY_LABEL}'][0] AS label,
+                   n.neighbourhood AS facts, n.neighbourhood_chunks AS chunks
+        """, {"id": args.id})
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+    resources.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Spans for every ingestion and QA stage.
+
+`span(name, **attributes)` times a block and nests under the current span
+(a context variable, copied into extraction worker threads). Spans carry
+counters added along the way: `TokenUsageCallback` adds LLM prompt and
+completion tokens, `ChunkExtractor` adds retries, and `profiled_query` adds
+Neo4j db hits and rows. When a root span ends its whole trace goes to the
+configured exporters: JSON lines (`TRACE_EXPORT=jsonl`, the default) and/or
+OTLP/HTTP JSON (`TRACE_EXPORT=otlp`, to `OTEL_EXPORTER_OTLP_ENDPOINT`).
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from biographrag import config
+
+_current = contextvars.ContextVar("biographrag_span", default=None)
+
+
+class Span:
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        # Finished spans of the whole trace, shared from the root down
+        self.finished = parent.finished if parent else []
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.lock = threading.Lock()
+
+    def set(self, **attributes):
+        with self.lock:
+            self.attributes.update(attributes)
+
+    def add(self, key, amount=1):
+        with self.lock:
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def seconds(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self):
+        return {"name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+                "parent_id": self.parent_id, "start_ns": self.start_ns, "end_ns": self.end_ns,
+                "ms": round(self.seconds * 1000, 2), "status": self.status,
+                "attributes": dict(self.attributes)}
+
+
+class JsonLinesExporter:
+    """One JSON object per span appended to `path`, for log shippers."""
+
+    def __init__(self, path=None):
+        self.path = path or config.TRACE_LOG_PATH
+        self.lock = threading.Lock()
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def export(self, spans):
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        with self.lock, open(self.path, "a") as f:
+            f.write(lines)
+
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans, service=None):
+    """OTLP/JSON `ExportTraceServiceRequest` for `spans`."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name",
+                                     "value": {"stringValue": service or config.TRACE_SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "biographrag"}, "spans": [{
+            "traceId": span.trace_id, "spanId": span.span_id, "parentSpanId": span.parent_id or "",
+            "name": span.name, "kind": 1,
+            "startTimeUnixNano": str(span.start_ns), "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": otlp_value(value)}
+                           for key, value in span.attributes.items() if value is not None],
+            "status": {"code": 2 if span.status == "error" else 1},
+        } for span in spans]}],
+    }]}
+
+
+class OtlpHttpExporter:
+    """Posts each finished trace to an OTLP/HTTP collector (JSON encoding)."""
+
+    def __init__(self, endpoint=None, timeout=5):
+        endpoint = (endpoint or config.OTLP_ENDPOINT).rstrip("/")
+        self.url = endpoint if endpoint.endswith("/v1/traces") else endpoint + "/v1/traces"
+        self.timeout = timeout
+
+    def export(self, spans):
+        request = urllib.request.Request(
+            self.url, data=json.dumps(otlp_payload(spans)).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except OSError:
+            pass  # tracing must never fail the traced work
+
+
+def default_exporters():
+    exporters = []
+    kinds = {kind.strip() for kind in config.TRACE_EXPORT.split(",")}
+    if "jsonl" in kinds:
+        exporters.append(JsonLinesExporter())
+    if "otlp" in kinds and config.OTLP_ENDPOINT:
+        exporters.append(OtlpHttpExporter())
+    return exporters
+
+
+class Tracer:
+    def __init__(self, exporters=None):
+        self.exporters = default_exporters() if exporters is None else exporters
+
+    @contextmanager
+    def span(self, name, parent=None, root=True, **attributes):
+        """Time a block as a child of `parent` (default: the current span).
+
+        With `root=False` a span that has no parent is measured but not
+        exported, for stages that are only worth tracing as part of a run.
+        """
+        parent = parent or _current.get()
+        span = Span(name, parent, attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.set(error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current.reset(token)
+            span.end_ns = time.time_ns()
+            span.finished.append(span)
+            if span.parent_id is None and root:
+                for exporter in self.exporters:
+                    exporter.export(span.finished)
+
+
+tracer = Tracer()
+span = tracer.span
+
+
+def current_span():
+    return _current.get()
+
+
+def add(key, amount=1):
+    """Add to a counter on the current span, if there is one."""
+    current = _current.get()
+    if current is not None:
+        current.add(key, amount)
+
+
+def summarize(spans):
+    """name -> count, seconds and summed numeric attributes, for display."""
+    summary = {}
+    for s in spans:
+        entry = summary.setdefault(s.name, {"count": 0, "seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] += s.seconds
+        for key, value in s.attributes.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                entry[key] = entry.get(key, 0) + value
+    return summary
+
+
+def span_rows(spans):
+    """Display rows (one per span dict, in start order) for the app's debug panel."""
+    rows = []
+    for s in sorted(spans, key=lambda s: s["start_ns"]):
+        attributes = s["attributes"]
+        rows.append({
+            "span": s["name"], "ms": s["ms"], "status": s["status"],
+            "prompt tokens": attributes.get("llm.prompt_tokens", 0),
+            "completion tokens": attributes.get("llm.completion_tokens", 0),
+            "retries": attributes.get("retries", 0),
+            "db hits": attributes.get("db.hits", 0),
+            "rows": attributes.get("db.rows", 0),
+        })
+    return rows
+
+
+def stage_line(summary):
+    """One-line "stage: time (tokens)" summary of `summarize` output."""
+    parts = []
+    for name, entry in summary.items():
+        tokens = entry.get("llm.prompt_tokens", 0) + entry.get("llm.completion_tokens", 0)
+        part = f"{name.removeprefix('ingest.')} {entry['seconds']:.1f}s"
+        if entry["count"] > 1:
+            part += f" ×{entry['count']}"
+        if tokens:
+            part += f" ({tokens:,} tokens)"
+        parts.append(part)
+    return " · ".join(parts)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Adds each LLM call's token usage to the span it ran under."""
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt = usage.get("prompt_tokens", 0)
+        completion = usage.get("completion_tokens", 0)
+        if not usage:
+            # Newer chat models report usage on the message instead
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt += metadata.get("input_tokens", 0)
+                    completion += metadata.get("output_tokens", 0)
+        add("llm.calls")
+        add("llm.prompt_tokens", prompt)
+        add("llm.completion_tokens", completion)
+
+
+def db_hits(plan):
+    if not plan:
+        return 0
+    return plan.get("dbHits", 0) + sum(db_hits(child) for child in plan.get("children", []))
+
+
+def profiled_query(graph, cypher, params=None, timeout=None):
+    """`graph.query` under PROFILE, adding db hits and rows to the current span.
+
+    `timeout` (seconds) bounds the transaction on the server. Falls back to
+    a plain query for graphs without a driver; with `TRACE_PROFILE_QUERIES=0`
+    the query runs without PROFILE. Only valid for read queries.
+    """
+    driver = getattr(graph, "_driver", None)
+    if driver is None:
+        rows = graph.query(cypher, params or {})
+        add("db.rows", len(rows))
+        return rows
+    from neo4j import Query
+
+    text = f"PROFILE {cypher}" if config.TRACE_PROFILE_QUERIES else cypher
+    with driver.session(database=getattr(graph, "_database", None)) as session:
+        result = session.run(Query(text, timeout=timeout or None), params or {})
+        rows = [record.data() for record in result]
+        summary = result.consume()
+    add("db.rows", len(rows))
+    if summary.profile:
+        add("db.hits", db_hits(summary.profile))
+    return rows
@@ -0,0 +1,217 @@
+"""Headless ingestion: a CLI and a pool of worker processes over `JobQueue`.
+
+    python -m biographrag.worker ingest reports/          # queue a directory, process it, exit
+    python -m biographrag.worker submit a.pdf b.pdf       # queue only
+    python -m biographrag.worker run --workers 4          # serve the queue until stopped
+    python -m biographrag.worker status
+
+Every worker process builds its own models, Neo4j connection and pipeline
+(the same `build_ingestion` the app used inline) and claims one job at a
+time. Killing a run loses nothing: the job goes back to the queue once its
+heartbeat goes stale and resumes from the chunks already in the graph.
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+from biographrag import config
+from biographrag.ingest import document_id
+from biographrag.jobs import DONE, FAILED, QUEUED, JobQueue, worker_name
+
+
+def connect():
+    """LLM, embeddings and graph configured from the environment, like the app."""
+    from dotenv import load_dotenv
+
+    from biographrag import resources
+
+    load_dotenv()
+    return resources.llm(), resources.embeddings(), resources.graph()
+
+
+def pdf_paths(paths):
+    """(path, name) of every PDF; files in a directory are named by their path under it."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(".pdf"):
+                        file = os.path.join(root, name)
+                        yield file, os.path.relpath(file, path).replace(os.sep, "/")
+        else:
+            yield path, os.path.basename(path)
+
+
+def submit(queue, paths, doc_id=None):
+    """Queue PDFs; each name (or the explicit `doc_id`, for one file) is one document's id."""
+    files = list(pdf_paths(paths))
+    if doc_id is not None and len(files) != 1:
+        raise ValueError("an explicit document id needs exactly one PDF")
+    seen = {}
+    for path, name in files:
+        key = doc_id or document_id(name)
+        if key in seen:
+            # The second would be ingested as a new revision of the first, removing its chunks
+            raise ValueError(f"{seen[key]} and {path} would both be document {key!r}; "
+                             "submit them from a common directory or one at a time with --doc-id")
+        seen[key] = path
+    return [queue.submit(os.path.abspath(path), name, doc_id or document_id(name)) for path, name in files]
+
+
+class Heartbeat:
+    """Keeps a job (and its worker) alive while extraction sits in backoff."""
+
+    def __init__(self, queue, job_id, worker):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker = worker
+        self.progress = None
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._beat, daemon=True)
+
+    def _beat(self):
+        while not self.stop.wait(config.JOB_HEARTBEAT_SECONDS):
+            self.queue.heartbeat(self.job_id, self.progress)
+            self.queue.worker_alive(self.worker)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+
+def run_job(queue, job, ingestion, worker):
+    """Run one claimed job to DONE, back to QUEUED (retryable) or FAILED."""
+    last = [0.0]
+    with Heartbeat(queue, job["id"], worker) as beat:
+        def progress(state):
+            beat.progress = dict(state)
+            if time.monotonic() - last[0] >= 1.0:  # progress is per chunk; write at most 1/s
+                last[0] = time.monotonic()
+                queue.heartbeat(job["id"], beat.progress)
+
+        try:
+            result = ingestion.run(job["path"], job["doc_id"], job["name"], progress=progress,
+                                   resume=job["attempts"] > 1)
+        except Exception:
+            queue.retry(job["id"], traceback.format_exc())
+            return False
+    result["cache"] = ingestion.extractor.cache.stats()
+    queue.finish(job["id"], result)
+    if job["owned"]:
+        try:
+            os.unlink(job["path"])
+        except FileNotFoundError:
+            pass
+    return True
+
+
+def serve(slot=0, workers=1, drain=False, poll=2.0):
+    """Worker process body: claim and run jobs until stopped (or the queue is empty)."""
+    from biographrag.pipeline import build_ingestion
+    from biographrag.schema import SchemaService
+
+    queue = JobQueue()
+    worker = worker_name(slot)
+    llm, embeddings, graph = connect()
+    schema = SchemaService(graph)
+    while True:
+        queue.worker_alive(worker)
+        job = queue.claim(worker)
+        if job is None:
+            if drain:
+                return
+            time.sleep(poll)
+            continue
+        print(f"[{worker}] job {job['id']} {job['name']} (attempt {job['attempts']})", flush=True)
+        schema.load()  # another worker may have extended it
+        ingestion = build_ingestion(graph, llm, embeddings, schema=schema, workers=workers)
+        try:
+            ok = run_job(queue, job, ingestion, worker)
+        finally:
+            ingestion.close()
+        print(f"[{worker}] job {job['id']} {'done' if ok else 'failed'}", flush=True)
+
+
+def run_pool(workers, drain=False):
+    if workers == 1:
+        return serve(0, 1, drain)
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=serve, args=(slot, workers, drain), daemon=False)
+                 for slot in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+def start_worker(workers=1):
+    """Detached `run --drain` worker for when no worker service is running.
+
+    It is its own session, so it outlives the Streamlit script run (and the
+    browser tab) that started it, and exits once the queue is empty.
+    """
+    os.makedirs(config.CACHE_DIR, exist_ok=True)
+    with open(os.path.join(config.CACHE_DIR, "worker.log"), "ab") as log:
+        return subprocess.Popen(
+            [sys.executable, "-m", "biographrag.worker", "run", "--drain", "--workers", str(workers)],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+
+def print_status(queue):
+    counts = queue.counts()
+    print(", ".join(f"{status}: {counts.get(status, 0)}" for status in (QUEUED, "running", DONE, FAILED)))
+    print(f"live workers: {len(queue.live_workers())}")
+    for job in queue.jobs(limit=20):
+        state = job["progress"] or {}
+        detail = (f"{state.get('pages_done', 0)}/{state.get('pages', '?')} pages, "
+                  f"{state.get('written', 0)}/{state.get('new', 0)} new chunks") if state else ""
+        print(f"{job['id']:>5} {job['status']:<8} {job['attempts']:>2} {job['name']:<40} {detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("submit", "ingest"):
+        command = commands.add_parser(name)
+        command.add_argument("paths", nargs="+", help="PDF files or directories")
+        command.add_argument("--doc-id", help="document id for a single PDF (default: its name, or "
+                                              "its path under the directory given)")
+        if name == "ingest":
+            command.add_argument("--workers", type=int, default=config.INGEST_WORKERS)
+    run = commands.add_parser("run")
+    run.add_argument("--workers", type=int, default=config.INGEST_WORKERS)
+    run.add_argument("--drain", action="store_true", help="exit once the queue is empty")
+    commands.add_parser("status")
+    args = parser.parse_args()
+
+    queue = JobQueue()
+    if args.command in ("submit", "ingest"):
+        try:
+            ids = submit(queue, args.paths, args.doc_id)
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"queued {len(ids)} document(s)")
+    if args.command == "ingest":
+        run_pool(args.workers, drain=True)
+        print_status(queue)
+    elif args.command == "run":
+        run_pool(args.workers, drain=args.drain)
+    elif args.command == "status":
+        print_status(queue)
+
+
+if __name__ == "__main__":
+    main()
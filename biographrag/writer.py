@@ -0,0 +1,211 @@
+"""Batched graph persistence.
+
+Replaces `Neo4jGraph.add_graph_documents`, which issues two APOC calls per
+chunk. Rows are grouped by node label and by (start label, type, end label)
+so every statement uses static labels that hit the `id` uniqueness
+constraints, and each batch of `batch_size` rows is its own transaction.
+Entities also get the `__Entity__` label, which the embedding indexes cover.
+"""
+import time
+from collections import OrderedDict
+
+from biographrag import config
+
+BASE_ENTITY_LABEL = "__Entity__"
+
+
+def clean_label(label):
+    return label.replace("`", "")
+
+
+def relationship_type(rel):
+    # Same normalisation Neo4jGraph.add_graph_documents applies
+    return clean_label(rel.type.replace(" ", "_").upper())
+
+
+def batches(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def union(existing, new):
+    """Cypher fragment appending the items of list `new` missing from `existing`."""
+    return (f"coalesce({existing}, []) + "
+            f"[x IN {new} WHERE NOT x IN coalesce({existing}, [])]")
+
+
+def property_type(value):
+    """Neo4j type name of a property value, as the schema prompt spells it."""
+    if isinstance(value, bool):
+        return "BOOLEAN"
+    if isinstance(value, int):
+        return "INTEGER"
+    if isinstance(value, float):
+        return "FLOAT"
+    if isinstance(value, (list, tuple)):
+        return "LIST"
+    return "STRING"
+
+
+def schema_delta(chunks, nodes, rels):
+    """Labels, relationship patterns and property keys present in one write."""
+    delta = {"node_props": {}, "rel_props": {}, "relationships": []}
+    if chunks:
+        props = delta["node_props"].setdefault("Document", {"id": "STRING", "text": "STRING"})
+        for chunk in chunks:
+            props.update({key: property_type(value) for key, value in chunk["metadata"].items()
+                          if value is not None})
+    for label, rows in nodes.items():
+        props = delta["node_props"].setdefault(label, {"id": "STRING"})
+        for row in rows:
+            props.update({key: property_type(value) for key, value in row["properties"].items()})
+            if row.get("aliases"):
+                props["aliases"] = "LIST"
+            if row["chunks"] and ("Document", "MENTIONS", label) not in delta["relationships"]:
+                delta["relationships"].append(("Document", "MENTIONS", label))
+    for (start, rel_type, end), rows in rels.items():
+        props = delta["rel_props"].setdefault(rel_type, {})
+        for row in rows:
+            props.update({key: property_type(value) for key, value in row["properties"].items()})
+        if (start, rel_type, end) not in delta["relationships"]:
+            delta["relationships"].append((start, rel_type, end))
+    return delta
+
+
+CHUNK_QUERY = """
+UNWIND $rows AS row
+MERGE (d:Document {id: row.id})
+SET d.text = row.text, d += row.metadata
+"""
+
+NODE_QUERY = """
+UNWIND $rows AS row
+MERGE (n:`{label}` {{id: row.id}})
+SET n:`{base}`, n += row.properties, n.doc_ids = {doc_ids}
+FOREACH (_ IN CASE WHEN size(row.aliases) > 0 THEN [1] ELSE [] END | SET n.aliases = {aliases})
+WITH n, row
+UNWIND row.chunks AS chunk
+MATCH (d:Document {{id: chunk}})
+MERGE (d)-[:MENTIONS]->(n)
+"""
+
+REL_QUERY = """
+UNWIND $rows AS row
+MATCH (s:`{start}` {{id: row.source}})
+MATCH (t:`{end}` {{id: row.target}})
+MERGE (s)-[r:`{type}`]->(t)
+SET r += row.properties, r.chunk_ids = {chunk_ids}
+"""
+
+
+class BulkGraphWriter:
+    """Writes GraphDocuments with `UNWIND $rows` batches.
+
+    `timings` keeps one entry per committed batch and `stats()` reports
+    overall nodes/s and relationships/s for the last `write` call, whose
+    entity ids per label are left in `touched` and whose labels, patterns
+    and property keys are left in `schema_delta`.
+    """
+
+    def __init__(self, graph, batch_size=None, labels=None):
+        self.graph = graph
+        self.batch_size = batch_size or config.WRITE_BATCH_SIZE
+        self.labels = labels or config.ALLOWED_NODES
+        self.timings = []
+        self.touched = {}
+        self.schema_delta = schema_delta([], {}, {})
+
+    def ensure_constraints(self):
+        """Uniqueness on `id` for every allowed label so MERGE is an index seek.
+
+        `__Entity__(id)` is indexed too, for lookups that do not know the label.
+        """
+        self.graph.query("CREATE CONSTRAINT document_id IF NOT EXISTS "
+                         "FOR (d:Document) REQUIRE d.id IS UNIQUE")
+        self.graph.query(f"CREATE INDEX entity_id IF NOT EXISTS FOR (n:`{BASE_ENTITY_LABEL}`) ON (n.id)")
+        for label in self.labels:
+            label = clean_label(label)
+            self.graph.query(f"CREATE CONSTRAINT `{label.lower()}_id` IF NOT EXISTS "
+                             f"FOR (n:`{label}`) REQUIRE n.id IS UNIQUE")
+
+    def _run(self, kind, key, query, rows):
+        for batch in batches(rows, self.batch_size):
+            started = time.perf_counter()
+            self.graph.query(query, {"rows": batch})
+            self.timings.append({"kind": kind, "key": key, "rows": len(batch),
+                                 "seconds": time.perf_counter() - started})
+
+    def group(self, graph_documents, doc_id=None, aliases=None):
+        """Collapse documents into per-label node rows and per-type relationship rows.
+
+        `aliases` maps `(label, id)` to other names of that entity (see
+        `EntityResolver`); they are added to the node's `aliases` list.
+        """
+        aliases = aliases or {}
+        chunks = []
+        nodes = {}
+        rels = {}
+        doc_ids = [doc_id] if doc_id else []
+        for gd in graph_documents:
+            chunk = gd.source.metadata.get("id")
+            if chunk:
+                metadata = {k: v for k, v in gd.source.metadata.items() if k != "id"}
+                chunks.append({"id": chunk, "text": gd.source.page_content, "metadata": metadata})
+            endpoints = [n for rel in gd.relationships for n in (rel.source, rel.target)]
+            for node in list(gd.nodes) + endpoints:
+                label = clean_label(node.type)
+                row = nodes.setdefault(label, OrderedDict()).setdefault(
+                    node.id, {"id": node.id, "properties": {}, "chunks": [], "doc_ids": doc_ids,
+                              "aliases": sorted(aliases.get((label, node.id), ()))})
+                row["properties"].update(node.properties)
+                if chunk and chunk not in row["chunks"]:
+                    row["chunks"].append(chunk)
+            for rel in gd.relationships:
+                key = (clean_label(rel.source.type), relationship_type(rel), clean_label(rel.target.type))
+                row = rels.setdefault(key, OrderedDict()).setdefault(
+                    (rel.source.id, rel.target.id),
+                    {"source": rel.source.id, "target": rel.target.id, "properties": {}, "chunk_ids": []})
+                row["properties"].update(rel.properties)
+                if chunk and chunk not in row["chunk_ids"]:
+                    row["chunk_ids"].append(chunk)
+        return (chunks,
+                {label: list(rows.values()) for label, rows in nodes.items()},
+                {key: list(rows.values()) for key, rows in rels.items()})
+
+    def write(self, graph_documents, doc_id=None, aliases=None):
+        """Persist chunks, entities, MENTIONS links and relationships.
+
+        Entities get `doc_id` added to their `doc_ids` (and `aliases` to
+        their `aliases`); relationships record the `chunk_ids` they were
+        extracted from.
+        """
+        chunks, nodes, rels = self.group(graph_documents, doc_id, aliases)
+        self.timings = []
+        self.touched = {label: [row["id"] for row in rows] for label, rows in nodes.items()}
+        self.schema_delta = schema_delta(chunks, nodes, rels)
+        self._run("chunks", "Document", CHUNK_QUERY, chunks)
+        for label, rows in nodes.items():
+            query = NODE_QUERY.format(label=label, base=BASE_ENTITY_LABEL,
+                                      doc_ids=union("n.doc_ids", "row.doc_ids"),
+                                      aliases=union("n.aliases", "row.aliases"))
+            self._run("nodes", label, query, rows)
+        for (start, rel_type, end), rows in rels.items():
+            query = REL_QUERY.format(start=start, type=rel_type, end=end,
+                                     chunk_ids=union("r.chunk_ids", "row.chunk_ids"))
+            self._run("relationships", f"{start}-{rel_type}->{end}", query, rows)
+        return self.stats()
+
+    def stats(self):
+        totals = {"chunks": 0, "nodes": 0, "relationships": 0}
+        seconds = {"chunks": 0.0, "nodes": 0.0, "relationships": 0.0}
+        for timing in self.timings:
+            totals[timing["kind"]] += timing["rows"]
+            seconds[timing["kind"]] += timing["seconds"]
+        return {
+            **totals,
+            "batches": len(self.timings),
+            "seconds": sum(seconds.values()),
+            "nodes_per_second": totals["nodes"] / seconds["nodes"] if seconds["nodes"] else 0.0,
+            "relationships_per_second": (totals["relationships"] / seconds["relationships"]
+                                         if seconds["relationships"] else 0.0),
+        }
@@ -1,18 +1,46 @@
 import os
-from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-from langchain_core.prompts import PromptTemplate
-from langchain_community.vectorstores import Neo4jVector
-from langchain_groq import ChatGroq  # Groq for fast Llama inference
-from langchain_openai import OpenAIEmbeddings  # OpenAI for embeddings
-from langchain_community.graphs import Neo4jGraph
-from langchain_experimental.graph_transformers import LLMGraphTransformer
-from langchain_community.chains.graph_qa.cypher import GraphCypherQAChain
 import streamlit as st
-import tempfile
-from neo4j import GraphDatabase
+import hashlib
+import time
+from biographrag import config, resources
+from biographrag.jobs import DONE, FAILED, JobQueue
+from biographrag.schema import SchemaService
+
+# LangChain, the model clients and the Neo4j driver take seconds to import, so they
+# are imported inside the builders below the first time ingestion or QA needs them.
+# st.cache_resource builds each once per process; every session and rerun shares it.
+
+CREDENTIALS = ('OPENAI_API_KEY', 'GROQ_API_KEY', 'NEO4J_URI', 'NEO4J_USERNAME', 'NEO4J_PASSWORD')
+
+
+@st.cache_resource(show_spinner=False)
+def credentials():
+    """Settings from the environment, with .env loaded once per process."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    settings = {name: os.getenv(name) for name in CREDENTIALS}
+    settings['NEO4J_DATABASE'] = os.getenv('NEO4J_DATABASE', 'neo4j')
+    return settings
+
+
+@st.cache_resource(show_spinner=False)
+def connect_graph(url, username, password, database):
+    """The shared graph and its schema; a failed connection is not cached, so the next run retries."""
+    # One pooled driver per process; the schema comes from SchemaService's cached copy
+    graph = resources.graph(url, username, password, database)
+    return graph, SchemaService(graph).load()
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def qa_engine(_graph, _schema, schema_version, groq_api_key):
+    """GraphQA for one schema version, shared by every session."""
+    from biographrag.qa import build_qa
+
+    # OpenAI for embeddings, Groq Llama 3.3 70B for the LLM, shared by every session of this process
+    return build_qa(resources.llm(groq_api_key), resources.embeddings(), _graph, schema=_schema,
+                    limiter=resources.rate_limiter())
+
 
 def main():
     st.set_page_config(
@@ -116,6 +144,35 @@ def main():
     with st.sidebar:
         st.markdown("### 📊 System Information")
 
+        if 'extraction_cache_stats' in st.session_state:
+            cache_stats = st.session_state['extraction_cache_stats']
+            st.markdown("#### 🗄️ Extraction Cache")
+            hits_col, misses_col = st.columns(2)
+            hits_col.metric("Hits", cache_stats['hits'])
+            misses_col.metric("Misses", cache_stats['misses'])
+            st.caption(f"Hit rate {cache_stats['hit_rate']:.0%} · {cache_stats['entries']} chunks · {cache_stats['bytes'] / 1024 / 1024:.1f} MB")
+
+        if 'qa' in st.session_state:
+            cypher_stats = st.session_state['qa'].cache.stats()
+            st.markdown("#### ⚡ Cypher Cache")
+            hits_col, misses_col = st.columns(2)
+            hits_col.metric("Hits", cypher_stats['hits'])
+            misses_col.metric("Misses", cypher_stats['misses'])
+            st.caption(f"Hit rate {cypher_stats['hit_rate']:.0%} ({cypher_stats['exact']} exact, {cypher_stats['semantic']} similar) · {cypher_stats['saved_seconds']:.1f}s of generation saved")
+            if st.session_state['qa'].router is not None:
+                router_stats = st.session_state['qa'].router.stats()
+                st.caption(f"{router_stats['routed'] - router_stats['empty']} of {router_stats['questions']} uncached questions answered from {router_stats['templates']} templates")
+            if st.session_state['qa'].guard is not None:
+                guard_stats = st.session_state['qa'].guard.stats()
+                st.caption(f"Guard: {guard_stats['rewritten']} of {guard_stats['checked']} generated queries bounded, {guard_stats['rejected']} rejected")
+
+        for pool in resources.pool_stats().values():
+            st.markdown("#### 🔌 Neo4j Connection Pool")
+            in_use_col, peak_col = st.columns(2)
+            in_use_col.metric("In use", f"{pool['in_use']}/{pool['size']}")
+            peak_col.metric("Peak", pool['peak'])
+            st.caption(f"{pool['borrows']} sessions borrowed · {pool['mean_held_ms']:.0f} ms held on average · {pool['saturated']} borrowed with the pool full")
+
         st.markdown("---")
 
         st.markdown("#### 🎯 Supported Entities")
@@ -168,70 +225,37 @@ def main():
         </div>
         """, unsafe_allow_html=True)
 
-    load_dotenv()
-
-    # Load credentials from environment variables
-    openai_api_key = os.getenv('OPENAI_API_KEY')
-    groq_api_key = os.getenv('GROQ_API_KEY')
-    neo4j_url = os.getenv('NEO4J_URI')
-    neo4j_username = os.getenv('NEO4J_USERNAME')
-    neo4j_password = os.getenv('NEO4J_PASSWORD')
-    neo4j_database = os.getenv('NEO4J_DATABASE', 'neo4j')
+    settings = credentials()
+    if not all(settings[name] for name in CREDENTIALS):
+        credentials.clear()  # read .env again on the next run
 
     # Validate that credentials are loaded
-    if not openai_api_key:
+    if not settings['OPENAI_API_KEY']:
         st.error("OpenAI API Key not found. Please set OPENAI_API_KEY in your .env file.")
         st.stop()
 
-    if not groq_api_key:
+    if not settings['GROQ_API_KEY']:
         st.error("Groq API Key not found. Please set GROQ_API_KEY in your .env file.")
         st.stop()
 
-    if not all([neo4j_url, neo4j_username, neo4j_password]):
+    if not all([settings['NEO4J_URI'], settings['NEO4J_USERNAME'], settings['NEO4J_PASSWORD']]):
         st.error("Neo4j credentials not found. Please set NEO4J_URI, NEO4J_USERNAME, and NEO4J_PASSWORD in your .env file.")
         st.stop()
 
-    # Initialize models: OpenAI for embeddings, Groq for LLM
-    if 'embeddings' not in st.session_state:
-        # OpenAI Embeddings (text-embedding-ada-002)
-        embeddings = OpenAIEmbeddings()
-
-        # Groq with Llama 3.3 70B Versatile (recommended for tool use)
-        llm = ChatGroq(
-            model="llama-3.3-70b-versatile",  # Supports function calling
-            temperature=0,
-            groq_api_key=groq_api_key
-        )
-
-        st.session_state['embeddings'] = embeddings
-        st.session_state['llm'] = llm
-        st.sidebar.success("✅ AI Models Initialized")
-    else:
-        embeddings = st.session_state['embeddings']
-        llm = st.session_state['llm']
-
-    # Connect to Neo4j
-    if 'graph' not in st.session_state:
-        try:
-            graph = Neo4jGraph(
-                url=neo4j_url,
-                username=neo4j_username,
-                password=neo4j_password
-            )
-            st.session_state['graph'] = graph
-            st.session_state['neo4j_url'] = neo4j_url
-            st.session_state['neo4j_username'] = neo4j_username
-            st.session_state['neo4j_password'] = neo4j_password
-            st.sidebar.success("✅ Neo4j Connected: Realtime_Graph")
-        except Exception as e:
-            st.sidebar.error(f"❌ Neo4j Connection Failed")
-            st.error(f"**Database Connection Error:** {e}")
-            st.stop()
-    else:
-        graph = st.session_state['graph']
-        neo4j_url = st.session_state['neo4j_url']
-        neo4j_username = st.session_state['neo4j_username']
-        neo4j_password = st.session_state['neo4j_password']
+    def connected_graph():
+        """Connect to Neo4j the first time this session needs the graph."""
+        if 'graph' not in st.session_state:
+            try:
+                graph, schema = connect_graph(settings['NEO4J_URI'], settings['NEO4J_USERNAME'],
+                                              settings['NEO4J_PASSWORD'], settings['NEO4J_DATABASE'])
+                st.session_state['graph'] = graph
+                st.session_state['schema'] = schema
+                st.sidebar.success("✅ Neo4j Connected: Realtime_Graph")
+            except Exception as e:
+                st.sidebar.error(f"❌ Neo4j Connection Failed")
+                st.error(f"**Database Connection Error:** {e}")
+                st.stop()
+        return st.session_state['graph']
 
     # Main content area
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -253,9 +277,24 @@ def main():
         type="pdf",
         help="Upload clinical reports, research papers, patient records, or lab reports"
     )
+    rebuild_graph = st.checkbox(
+        "Clear the entire graph before ingesting",
+        value=False,
+        help="By default only this document's changed chunks are updated; other documents stay in the graph"
+    )
     st.markdown('</div>', unsafe_allow_html=True)
 
-    if uploaded_file is not None and 'qa' not in st.session_state:
+    # Each new upload (or new revision of a file) is merged into the shared graph
+    file_key = f"{uploaded_file.name}:{uploaded_file.size}" if uploaded_file is not None else None
+    # A file whose ingestion failed is only submitted again when asked, not on every rerun
+    failed = st.session_state.get('failed_file')
+    if failed is not None and failed['key'] == file_key:
+        st.error(f"❌ Ingestion of {uploaded_file.name} failed after {failed['attempts']} attempt(s)")
+        st.code(failed['error'])
+        if st.button("🔁 Retry ingestion"):
+            st.session_state.pop('failed_file')
+            st.rerun()
+    elif uploaded_file is not None and st.session_state.get('ingested_file') != file_key:
         # Show processing status
         st.markdown(f"""
             <div class='info-box'>
@@ -274,150 +313,92 @@ def main():
         progress_bar.progress(10)
 
         with st.spinner("Processing the PDF..."):
-            # Save uploaded file to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                tmp_file.write(uploaded_file.read())
-                tmp_file_path = tmp_file.name
-
-            # Load and split the PDF
-            status_text.markdown("<p style='color: #1e40af; font-weight: 600;'>📖 Extracting text from PDF pages...</p>", unsafe_allow_html=True)
-            progress_bar.progress(20)
-            loader = PyPDFLoader(tmp_file_path)
-            pages = loader.load_and_split()
-
-            status_text.markdown("<p style='color: #1e40af; font-weight: 600;'>✂️ Chunking text for optimal processing...</p>", unsafe_allow_html=True)
-            progress_bar.progress(30)
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=40)
-            docs = text_splitter.split_documents(pages)
-
-            lc_docs = []
-            for doc in docs:
-                lc_docs.append(Document(page_content=doc.page_content.replace("\n", ""),
-                metadata={'source': uploaded_file.name}))
-
-            # Clear the graph database
-            status_text.markdown("<p style='color: #1e40af; font-weight: 600;'>🗑️ Clearing existing graph data...</p>", unsafe_allow_html=True)
-            progress_bar.progress(40)
-            cypher = """
-              MATCH (n)
-              DETACH DELETE n;
-            """
-            graph.query(cypher)
-
-            # Define allowed nodes and relationships for Clinical Research
-            allowed_nodes = [
-                "Patient", "Disease", "Medication", "Test", "Symptom", "Doctor",
-                "Procedure", "Anatomy", "Gene", "Protein", "Biomarker", "ClinicalTrial"
-            ]
-            allowed_relationships = [
-                "HAS_DISEASE", "TAKES_MEDICATION", "UNDERWENT_TEST", "HAS_SYMPTOM", "TREATED_BY",
-                "EXPRESSES", "MUTATES", "TARGETS", "ENROLLED_IN", "AFFECTS", "UNDERWENT_PROCEDURE"
-            ]
-
-            # Transform documents into graph documents
-            # Enable properties to capture dosages, dates, test values, etc.
-            status_text.markdown("<p style='color: #1e40af; font-weight: 600;'>🤖 AI extracting entities and relationships...</p>", unsafe_allow_html=True)
-            progress_bar.progress(50)
-
-            transformer = LLMGraphTransformer(
-                llm=llm,
-                allowed_nodes=allowed_nodes,
-                allowed_relationships=allowed_relationships,
-                node_properties=True,  # Enable to capture quantitative data
-                relationship_properties=True  # Enable to capture relationship metadata
-            )
-
-            graph_documents = transformer.convert_to_graph_documents(lc_docs)
-
-            status_text.markdown("<p style='color: #1e40af; font-weight: 600;'>💾 Storing graph in Neo4j database...</p>", unsafe_allow_html=True)
-            progress_bar.progress(70)
-            graph.add_graph_documents(graph_documents, include_source=True)
-
-            # Use the stored connection parameters
-            status_text.markdown("<p style='color: #1e40af; font-weight: 600;'>🔍 Creating vector embeddings for semantic search...</p>", unsafe_allow_html=True)
-            progress_bar.progress(85)
-
-            index = Neo4jVector.from_existing_graph(
-                embedding=embeddings,
-                url=neo4j_url,
-                username=neo4j_username,
-                password=neo4j_password,
-                database="neo4j",
-                node_label="Patient",  # Adjust node_label as needed
-                text_node_properties=["id", "text"],
-                embedding_node_property="embedding",
-                index_name="vector_index",
-                keyword_index_name="entity_index",
-                search_type="hybrid"
-            )
+            from biographrag.ingest import document_id
+            from biographrag.worker import start_worker
+
+            graph = connected_graph()
+            # Keep the upload where a worker process can read it; the worker deletes it when done
+            pdf_bytes = uploaded_file.getvalue()
+            upload_key = hashlib.sha256(pdf_bytes).hexdigest()
+            os.makedirs(config.UPLOAD_DIR, exist_ok=True)
+            upload_path = os.path.join(config.UPLOAD_DIR, f"{upload_key}.pdf")
+            with open(upload_path, "wb") as upload:
+                upload.write(pdf_bytes)
+
+            if rebuild_graph:
+                status_text.markdown("<p style='color: #1e40af; font-weight: 600;'>🗑️ Clearing existing graph data...</p>", unsafe_allow_html=True)
+                graph.query("MATCH (n) DETACH DELETE n")
+                st.session_state['schema'].load()
+                # Cached queries and local vectors describe the deleted graph; QA engines,
+                # with their in-memory caches, are rebuilt for the next question
+                from biographrag.qa import clear_cypher_cache
+
+                clear_cypher_cache()
+                if config.ANN_ENABLED:
+                    from biographrag.ann import VectorIndex
+                    from biographrag.embeddings import embedding_model_name
+
+                    index = VectorIndex(model=embedding_model_name(resources.embeddings()))
+                    index.clear()
+                    index.close()
+                qa_engine.clear()
+                st.session_state.pop('qa', None)
+
+            # Ingestion runs as a job in a worker process (python -m biographrag.worker),
+            # so a browser refresh or session timeout does not kill it; re-uploading the
+            # same file while its job runs just resumes polling it
+            jobs = JobQueue()
+            job_id = jobs.submit(upload_path, uploaded_file.name, document_id(uploaded_file.name),
+                                 key=upload_key, owned=True)
+            shown_progress = [10]
+
+            def ingest_progress(state):
+                parsed = state['pages_done'] / max(state['pages'], 1)
+                written = state['written'] / state['new'] if state['new'] else parsed
+                shown_progress[0] = max(shown_progress[0], 10 + int(80 * (parsed + written) / 2))
+                progress_bar.progress(shown_progress[0])
+                status_text.markdown(
+                    f"<p style='color: #1e40af; font-weight: 600;'>📖 Page {state['pages_done']}/{state['pages']} · "
+                    f"🤖 Extracted {state['extracted']}/{state['new']} new chunks · "
+                    f"💾 Stored {state['written']} · ♻️ {state['kept']} unchanged</p>",
+                    unsafe_allow_html=True
+                )
+
+            started_worker = 0.0
+            while True:
+                job = jobs.get(job_id)
+                if job['status'] in (DONE, FAILED):
+                    break
+                # No worker service running: start a detached one that exits when the queue is empty
+                if not jobs.live_workers() and time.time() - started_worker > jobs.stale_seconds:
+                    start_worker()
+                    started_worker = time.time()
+                if job['progress']:
+                    ingest_progress(job['progress'])
+                elif job['status'] == 'queued':
+                    status_text.markdown("<p style='color: #1e40af; font-weight: 600;'>⏳ Waiting for an ingestion worker...</p>", unsafe_allow_html=True)
+                time.sleep(1)
+            jobs.close()
+
+            if job['status'] == FAILED:
+                st.session_state['failed_file'] = {'key': file_key, 'attempts': job['attempts'],
+                                                   'error': job['error']}
+                st.rerun()
+
+            result = job['result']
+            st.session_state['extraction_cache_stats'] = result['cache']
+            # The worker extended the stored schema; pick up its version
+            st.session_state['schema'].load()
 
             status_text.markdown("<p style='color: #1e40af; font-weight: 600;'>⚡ Finalizing knowledge graph...</p>", unsafe_allow_html=True)
             progress_bar.progress(95)
 
-            # Retrieve the graph schema
-            schema = graph.get_schema
-
-            # Set up the QA chain with improved prompt
-            template = """
-            Task: Generate a Cypher query to retrieve information from a Neo4j graph database.
-
-            Use ONLY the provided schema and relationship types.
-
-            Schema:
-            {schema}
-
-            Instructions:
-            1. Generate syntactically correct Cypher queries
-            2. Use only node labels and relationship types from the schema
-            3. For questions about entities, use MATCH patterns to find them
-            4. Use RETURN to specify what information to retrieve
-            5. Keep queries simple and focused
-
-            Examples:
-            - "What medications?" → MATCH (p:Patient)-[:TAKES_MEDICATION]->(m:Medication) RETURN m.id
-            - "What diseases?" → MATCH (d:Disease) RETURN d.id
-            - "What symptoms?" → MATCH (s:Symptom) RETURN s.id
-
-            Question: {question}
-
-            Cypher Query:"""
-
-            question_prompt = PromptTemplate(
-                template=template,
-                input_variables=["schema", "question"]
-            )
-
-            # Response generation prompt for natural answers
-            response_template = """Based on the question and database results, provide a natural, conversational answer.
-
-Question: {question}
-Database Results: {context}
-
-Instructions:
-1. Write in a natural, conversational tone
-2. If results show medications/diseases/symptoms, explain them clearly
-3. Provide context and relevant details from the data
-4. If no results, say "I couldn't find that information in the document"
-5. Keep it concise but informative
-
-Answer:"""
-
-            response_prompt = PromptTemplate(
-                template=response_template,
-                input_variables=["question", "context"]
-            )
-
-            qa = GraphCypherQAChain.from_llm(
-                llm=llm,
-                graph=graph,
-                cypher_prompt=question_prompt,
-                qa_prompt=response_prompt,
-                verbose=True,
-                return_intermediate_steps=True,
-                allow_dangerous_requests=True,
-                top_k=10
-            )
-            st.session_state['qa'] = qa
+            # Ingestion merged what it wrote into the cached schema; no re-introspection
+            st.session_state['schema'].apply(graph)
+            st.session_state['qa'] = qa_engine(graph, st.session_state['schema'],
+                                               st.session_state['schema'].version, settings['GROQ_API_KEY'])
+            st.sidebar.success("✅ AI Models Initialized")
+            st.session_state['ingested_file'] = file_key
 
             # Complete
             progress_bar.progress(100)
@@ -425,100 +406,200 @@ Answer:"""
             progress_bar.empty()
 
             # Success message with stats
+            from biographrag.tracing import stage_line
+
             st.markdown(f"""
                 <div class='success-box'>
                     <h3 style='color: white; margin: 0;'>✅ Knowledge Graph Ready!</h3>
                     <p style='color: white; margin: 0.5rem 0 0 0;'>
                         Successfully processed: <strong>{uploaded_file.name}</strong>
                     </p>
+                    <p style='color: white; margin: 0.3rem 0 0 0;'>
+                        Chunks: {result['new']} new, {result['kept']} unchanged, {result['removed']} removed
+                    </p>
+                    <p style='color: white; margin: 0.3rem 0 0 0;'>
+                        Graph write: {result['nodes']} nodes and {result['relationships']} relationships
+                        in {result['write_batches']} batches ({result['write_seconds']:.1f}s)
+                    </p>
+                    <p style='color: white; margin: 0.3rem 0 0 0;'>
+                        Embeddings: {result['embedding']['embedded']} new, {result['embedding']['memoised']} reused,
+                        {result['embedding']['nodes'] - result['embedding']['stale']} unchanged
+                    </p>
+                    <p style='color: white; margin: 0.3rem 0 0 0;'>
+                        Extraction cache: {st.session_state['extraction_cache_stats']['hits']} hits,
+                        {st.session_state['extraction_cache_stats']['misses']} misses
+                    </p>
+                    <p style='color: white; margin: 0.3rem 0 0 0;'>
+                        Stages: {stage_line(result.get('trace', {}))}
+                    </p>
                 </div>
             """, unsafe_allow_html=True)
 
     if 'qa' in st.session_state:
-        st.markdown("---")
+        query_panel()
+        batch_panel()
 
-        # Query interface
-        st.markdown("### 💬 Query Knowledge Graph")
-        st.markdown('<p style="color: #64748b;">Ask questions in natural language about the extracted <span style="color: #2563eb; font-weight: 600;">biomedical</span> information</p>', unsafe_allow_html=True)
 
-        col1, col2 = st.columns([3, 1])
+def current_qa():
+    """The QA engine for the stored schema version, which a worker or another session may have moved."""
+    schema = st.session_state['schema']
+    schema.load()
+    schema.apply(st.session_state['graph'])
+    # qa_engine is cached per version, so an unchanged schema returns the same engine
+    st.session_state['qa'] = qa_engine(st.session_state['graph'], schema, schema.version,
+                                       credentials()['GROQ_API_KEY'])
+    return st.session_state['qa']
 
-        with col1:
-            question = st.text_input(
-                "Your Question",
-                placeholder="e.g., What medications does the patient take? What genes are mutated?",
-                label_visibility="collapsed"
-            )
 
-        with col2:
-            submit_button = st.button("🔍 Search", use_container_width=True)
+@st.fragment
+def query_panel():
+    """The question box and answer; asking reruns only this, not the upload and ingestion above."""
+    from biographrag.tracing import span_rows
 
-        # Example questions
-        with st.expander("💡 Example Questions"):
-            st.markdown("""
-            <div style='color: #1e3a8a;'>
-                <p style='color: #2563eb; font-weight: 600; margin-bottom: 0.5rem;'>Clinical:</p>
-                <ul style='color: #475569; margin-top: 0;'>
-                    <li>What medications does the patient take?</li>
-                    <li>What symptoms does the patient have?</li>
-                    <li>Which doctor is treating the patient?</li>
-                </ul>
-
-                <p style='color: #2563eb; font-weight: 600; margin-bottom: 0.5rem; margin-top: 1rem;'>Research:</p>
-                <ul style='color: #475569; margin-top: 0;'>
-                    <li>What genes are mutated in this patient?</li>
-                    <li>What proteins does the disease affect?</li>
-                    <li>Is the patient enrolled in any clinical trials?</li>
-                </ul>
-
-                <p style='color: #2563eb; font-weight: 600; margin-bottom: 0.5rem; margin-top: 1rem;'>Complex:</p>
-                <ul style='color: #475569; margin-top: 0;'>
-                    <li>What medications target the expressed proteins?</li>
-                    <li>What procedures were performed on which anatomy?</li>
-                </ul>
-            </div>
-            """, unsafe_allow_html=True)
+    st.markdown("---")
 
-        if submit_button and question:
-            with st.spinner("🤖 AI is analyzing the knowledge graph..."):
-                try:
-                    res = st.session_state['qa'].invoke({"query": question})
-
-                    # Display answer with styling
-                    st.markdown("### 📊 Answer")
-                    st.markdown(f"""
-                        <div style='background: white; padding: 1.5rem; border-radius: 10px;
-                                    border-left: 4px solid #2563eb; box-shadow: 0 2px 6px rgba(0,0,0,0.08);'>
-                            <p style='font-size: 1.1rem; line-height: 1.6; margin: 0; color: #1e293b;'>
-                                {res['result']}
-                            </p>
-                        </div>
-                    """, unsafe_allow_html=True)
-
-                    # Show debug information
-                    with st.expander("🔧 Debug Information"):
-                        if 'intermediate_steps' in res and res['intermediate_steps']:
-                            st.write("**Generated Cypher Query:**")
-                            cypher_query = res['intermediate_steps'][0]['query'] if res['intermediate_steps'] else "No query generated"
-                            st.code(cypher_query, language='cypher')
-
-                            st.write("**Query Results:**")
-                            context = res['intermediate_steps'][0].get('context', 'No results')
-                            # Handle both string and dict/list results
-                            if isinstance(context, str):
-                                st.write(context)  # Display as text if string
-                            else:
-                                st.json(context)  # Display as JSON if dict/list
-                        else:
-                            st.warning("No intermediate steps available. Enable return_intermediate_steps=True")
+    # Query interface
+    st.markdown("### 💬 Query Knowledge Graph")
+    st.markdown('<p style="color: #64748b;">Ask questions in natural language about the extracted <span style="color: #2563eb; font-weight: 600;">biomedical</span> information</p>', unsafe_allow_html=True)
 
-                        st.write("**Full Response:**")
-                        st.json(res)
+    col1, col2 = st.columns([3, 1])
 
-                except Exception as e:
-                    st.error(f"❌ Error processing query: {str(e)}")
-                    st.write("**Error Details:**")
-                    st.exception(e)
+    with col1:
+        question = st.text_input(
+            "Your Question",
+            placeholder="e.g., What medications does the patient take? What genes are mutated?",
+            label_visibility="collapsed"
+        )
+
+    with col2:
+        submit_button = st.button("🔍 Search", use_container_width=True)
+
+    # Example questions
+    with st.expander("💡 Example Questions"):
+        st.markdown("""
+        <div style='color: #1e3a8a;'>
+            <p style='color: #2563eb; font-weight: 600; margin-bottom: 0.5rem;'>Clinical:</p>
+            <ul style='color: #475569; margin-top: 0;'>
+                <li>What medications does the patient take?</li>
+                <li>What symptoms does the patient have?</li>
+                <li>Which doctor is treating the patient?</li>
+            </ul>
+
+            <p style='color: #2563eb; font-weight: 600; margin-bottom: 0.5rem; margin-top: 1rem;'>Research:</p>
+            <ul style='color: #475569; margin-top: 0;'>
+                <li>What genes are mutated in this patient?</li>
+                <li>What proteins does the disease affect?</li>
+                <li>Is the patient enrolled in any clinical trials?</li>
+            </ul>
+
+            <p style='color: #2563eb; font-weight: 600; margin-bottom: 0.5rem; margin-top: 1rem;'>Complex:</p>
+            <ul style='color: #475569; margin-top: 0;'>
+                <li>What medications target the expressed proteins?</li>
+                <li>What procedures were performed on which anatomy?</li>
+            </ul>
+        </div>
+        """, unsafe_allow_html=True)
+
+    if submit_button and question:
+        with st.spinner("🤖 AI is analyzing the knowledge graph..."):
+            try:
+                res = current_qa().invoke({"query": question})
+
+                # Display answer with styling
+                st.markdown("### 📊 Answer")
+                st.markdown(f"""
+                    <div style='background: white; padding: 1.5rem; border-radius: 10px;
+                                border-left: 4px solid #2563eb; box-shadow: 0 2px 6px rgba(0,0,0,0.08);'>
+                        <p style='font-size: 1.1rem; line-height: 1.6; margin: 0; color: #1e293b;'>
+                            {res['result']}
+                        </p>
+                    </div>
+                """, unsafe_allow_html=True)
+
+                # Show debug information
+                with st.expander("🔧 Debug Information"):
+                    if 'intermediate_steps' in res and res['intermediate_steps']:
+                        st.write("**Generated Cypher Query:**")
+                        cypher_query = res['intermediate_steps'][0]['query'] if res['intermediate_steps'] else "No query generated"
+                        st.code(cypher_query, language='cypher')
+                        if res.get('cypher_cache', 'miss') != 'miss':
+                            st.caption(f"♻️ Cypher served from cache ({res['cypher_cache']} match)")
+                        elif res.get('route'):
+                            st.caption(f"⚡ Answered from a precompiled template ({res['route']}), no Cypher generation")
+                        if res.get('guard'):
+                            st.caption(f"🛡️ Query not run: {res['guard']}")
+                        if res.get('summaries'):
+                            st.caption(f"🧭 {res['summaries']} context rows came from precomputed entity neighbourhoods")
+                        if res.get('retrieved'):
+                            st.caption(f"🔎 Cypher found nothing; {res['retrieved']} context rows came from the local vector index")
+
+                        st.write("**Query Results:**")
+                        context = res['intermediate_steps'][0].get('context', 'No results')
+                        # Handle both string and dict/list results
+                        if isinstance(context, str):
+                            st.write(context)  # Display as text if string
+                        else:
+                            st.json(context)  # Display as JSON if dict/list
+                    else:
+                        st.warning("No intermediate steps available. Enable return_intermediate_steps=True")
+
+                    if res.get('trace'):
+                        st.write("**Trace:**")
+                        st.dataframe(span_rows(res['trace']), hide_index=True)
+
+                    st.write("**Full Response:**")
+                    st.json(res)
+
+            except Exception as e:
+                st.error(f"❌ Error processing query: {str(e)}")
+                st.write("**Error Details:**")
+                st.exception(e)
+
+
+@st.fragment
+def batch_panel():
+    """A question checklist answered in one run, with per-question timings to download."""
+    with st.expander("📋 Batch questions"):
+        st.markdown('<p style="color: #64748b;">Run a checklist of questions against the graph at once, one question per line</p>', unsafe_allow_html=True)
+        checklist = st.file_uploader("Question list (.txt or .json)", type=["txt", "json"], key="batch_file")
+        typed = st.text_area("Questions", height=150, key="batch_text", label_visibility="collapsed",
+                             placeholder="What medications does the patient take?\nWhat symptoms does the patient have?")
+        run_batch = st.button("▶️ Run batch", use_container_width=True)
+
+        if run_batch:
+            import json
+            import tempfile
+
+            from biographrag.batch_qa import BatchQA, read_questions
+
+            if checklist is not None:
+                suffix = os.path.splitext(checklist.name)[1]
+                with tempfile.NamedTemporaryFile("wb", suffix=suffix, delete=False) as f:
+                    f.write(checklist.getvalue())
+                questions = read_questions(f.name)
+                os.unlink(f.name)
+            else:
+                questions = [line.strip() for line in typed.splitlines() if line.strip()]
+            if not questions:
+                st.warning("Add at least one question")
+                return
+
+            bar = st.progress(0.0, text=f"Answering {len(questions)} questions...")
+            batch = BatchQA(current_qa())
+            results = batch.run(questions, progress=lambda done, total, row: bar.progress(
+                done / total, text=f"{done}/{total} answered"))
+            stats = batch.stats()
+            bar.empty()
+            st.success(f"✅ {stats['questions']} questions in {stats['seconds']:.1f}s · "
+                       f"{stats['executions']} query executions for {stats['queries']} queries · "
+                       f"{stats['errors']} errors")
+            st.dataframe([{"question": row["question"], "answer": row["answer"], "rows": row.get("rows"),
+                           "seconds": row["seconds"], "error": row["error"]} for row in results],
+                         hide_index=True)
+            st.download_button("⬇️ Download results (JSON lines)",
+                               "".join(json.dumps(row, default=str) + "\n" for row in results),
+                               file_name=f"batch-qa-{time.strftime('%Y%m%d-%H%M%S')}.jsonl",
+                               mime="application/json")
 
 if __name__ == "__main__":
     main()